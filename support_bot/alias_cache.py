@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+# noinspection PyPackageRequirements
+from nio import AsyncClient, MatrixRoom, RoomAliasEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600.0
+DEFAULT_NEGATIVE_TTL = 60.0
+
+
+class AliasCache(object):
+    def __init__(self, client: AsyncClient, ttl: float = DEFAULT_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL):
+        """Room aliases resolved to room IDs
+
+        Resolutions are kept for `ttl` seconds, and dropped early when the canonical alias
+        of the room changes. Aliases that failed to resolve, including requests that failed,
+        are remembered for `negative_ttl` seconds, so a bad alias in the configuration isn't
+        requested again for every message. Concurrent resolutions of the same alias share
+        one request.
+
+        Args:
+            client (nio.AsyncClient): nio client used to resolve aliases
+
+            ttl (float): Number of seconds a resolved alias is kept
+
+            negative_ttl (float): Number of seconds an alias that failed to resolve is kept
+        """
+        self.client = client
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+        self._resolving: Dict[str, asyncio.Future] = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    async def resolve(self, alias: str) -> Optional[str]:
+        """The room ID of an alias, None if it can't be resolved"""
+        entry = self._entries.get(alias)
+        if entry is not None:
+            room_id, expires_at = entry
+            if expires_at > time.monotonic():
+                self.hits += 1
+                return room_id
+            del self._entries[alias]
+
+        # Share an in flight resolution of the same alias
+        pending = self._resolving.get(alias)
+        if pending:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        pending = asyncio.get_event_loop().create_future()
+        self._resolving[alias] = pending
+        try:
+            room_id = await self._resolve(alias)
+            pending.set_result(room_id)
+            return room_id
+        finally:
+            del self._resolving[alias]
+            if not pending.done():
+                # Cancelled, the callers sharing the resolution must not wait forever
+                pending.set_result(None)
+
+    async def _resolve(self, alias: str) -> Optional[str]:
+        try:
+            response = await self.client.room_resolve_alias(alias)
+        except Exception as e:
+            # Transport errors are remembered too, so an unreachable homeserver isn't asked on every send
+            response = e
+        room_id = getattr(response, "room_id", None)
+        if room_id:
+            self._entries[alias] = (room_id, time.monotonic() + self.ttl)
+        else:
+            self.failures += 1
+            logger.warning(f"Could not resolve '{alias}' to a room ID: {response}")
+            self._entries[alias] = (None, time.monotonic() + self.negative_ttl)
+        return room_id
+
+    async def warm(self, rooms: Iterable[str]):
+        """Resolve the aliases among `rooms` ahead of their first use"""
+        for room in rooms:
+            if room and room.startswith("#"):
+                await self.resolve(room)
+
+    def invalidate(self, alias: str):
+        self._entries.pop(alias, None)
+
+    def invalidate_room(self, room_id: str):
+        for alias in [alias for alias, (resolved, _) in self._entries.items() if resolved == room_id]:
+            del self._entries[alias]
+
+    async def canonical_alias(self, room: MatrixRoom, event: RoomAliasEvent):
+        """Callback for m.room.canonical_alias events, forgetting the old and new aliases of the room"""
+        self.invalidate_room(room.room_id)
+        content = event.source.get("content", {})
+        for alias in [event.canonical_alias] + content.get("alt_aliases", []):
+            if alias:
+                self.invalidate(alias)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+        }
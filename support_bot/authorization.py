@@ -0,0 +1,65 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import logging
+from typing import FrozenSet
+
+if TYPE_CHECKING:
+    from support_bot.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class AuthorizationRegistry(object):
+    def __init__(self, storage: Storage):
+        """Staff and Support rosters, held in memory
+
+        Both rosters are loaded once at startup and updated by the repositories after
+        every successful insert or delete, so membership checks need no I/O. The sets are
+        replaced rather than modified, so a reader never sees a half applied change.
+
+        Until `load` has run, membership is checked in the database.
+
+        Args:
+            storage (Storage): Storage with the staff and support repositories set
+        """
+        self.storage = storage
+        self.loaded = False
+        self._staff: FrozenSet[str] = frozenset()
+        self._support: FrozenSet[str] = frozenset()
+
+    async def load(self):
+        staff = await self.storage.repositories.staffRep.get_all_staff()
+        support = await self.storage.repositories.supportRep.get_all_support()
+
+        self._staff = frozenset(staff)
+        self._support = frozenset(support)
+        self.loaded = True
+
+        logger.info(f"Authorization registry loaded {len(self._staff)} staff and {len(self._support)} support members")
+
+    @property
+    def staff(self) -> FrozenSet[str]:
+        return self._staff
+
+    @property
+    def support(self) -> FrozenSet[str]:
+        return self._support
+
+    def is_staff(self, user_id: str) -> bool:
+        return user_id in self._staff
+
+    def is_support(self, user_id: str) -> bool:
+        return user_id in self._support
+
+    def add_staff(self, user_id: str):
+        self._staff = self._staff | {user_id}
+
+    def remove_staff(self, user_id: str):
+        self._staff = self._staff - {user_id}
+
+    def add_support(self, user_id: str):
+        self._support = self._support | {user_id}
+
+    def remove_support(self, user_id: str):
+        self._support = self._support - {user_id}
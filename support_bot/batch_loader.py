@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Sequence, Tuple
+
+from support_bot.statements import Statement
+
+logger = logging.getLogger(__name__)
+
+# Sizes of the `IN (...)` lists of the batch statements. Batches are padded to the next
+# size, so every batch runs one of a few registered (and prepared) statements.
+BATCH_SIZES = (2, 4, 8, 16, 32, 64)
+MAX_BATCH = BATCH_SIZES[-1]
+
+
+def in_list_statements(name: str, sql: str) -> Dict[str, str]:
+    """Variants of a statement for every batch size, `{}` in `sql` is replaced by the placeholders"""
+    return {
+        f"{name}_{size}": sql.format(", ".join(["?"] * size)) for size in BATCH_SIZES
+    }
+
+
+def in_list_query(statements: Dict[str, Statement], name: str, keys: Sequence[Hashable]) -> Tuple[Statement, tuple]:
+    """Pick the smallest variant of a statement holding `keys`, returning it with the padded parameters"""
+    size = next((size for size in BATCH_SIZES if size >= len(keys)), None)
+    if size is None:
+        raise ValueError(f"Batch of {len(keys)} keys exceeds the maximum of {MAX_BATCH}")
+
+    params = tuple(keys) + (keys[-1],) * (size - len(keys))
+    return statements[f"{name}_{size}"], params
+
+
+class BatchLoader(object):
+    def __init__(self, load_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]], max_batch: int = MAX_BATCH):
+        """Coalesce lookups by key made within one event loop iteration into batches
+
+        Keys requested before the loop gets to run the scheduled dispatch are loaded
+        together, by one call of `load_many` per `max_batch` keys. Concurrent lookups of
+        the same key share one result.
+
+        Args:
+            load_many: Coroutine function taking a list of keys and returning the values
+                by key. Keys missing from the result load as None.
+
+            max_batch (int): Maximum number of keys passed to `load_many` at once
+        """
+        self.load_many = load_many
+        self.max_batch = max(1, min(int(max_batch), MAX_BATCH))
+
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._scheduled = False
+
+        # Counters
+        self.loads = 0
+        self.batches = 0
+        self.keys = 0
+
+    async def load(self, key: Hashable) -> Any:
+        self.loads += 1
+
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+
+        # A cancelled caller must not cancel the lookup of the others waiting for the key
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch):
+            batch = {key: pending[key] for key in keys[start:start + self.max_batch]}
+            asyncio.ensure_future(self._load_batch(batch))
+
+    async def _load_batch(self, batch: Dict[Hashable, asyncio.Future]):
+        self.batches += 1
+        self.keys += len(batch)
+        try:
+            values = await self.load_many(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
+
+    def stats(self) -> dict:
+        return {
+            "loads": self.loads,
+            "batches": self.batches,
+            "keys": self.keys,
+            "avg_batch": self.keys / self.batches if self.batches else 0.0,
+        }
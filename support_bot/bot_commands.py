@@ -1,7 +1,7 @@
 from __future__ import annotations
+import asyncio
 import json
 import logging
-import time
 from typing import Optional
 
 # noinspection PyPackageRequirements
@@ -9,14 +9,8 @@ from nio import (RoomSendResponse,
                  RoomCreateResponse, 
                  RoomInviteResponse,
                  RoomCreateError,
-                 RoomGetEventResponse,
                  AsyncClient,
-                 RoomMessageNotice,
-                 RoomMessageFormatted,
-                 RoomMessageMedia,
-                 RoomEncryptedMedia,
                  ErrorResponse,
-                 RoomKickError,
                  SyncResponse,
                  SyncError,
                  RoomLeaveError,
@@ -26,28 +20,30 @@ from nio.rooms import MatrixRoom
 from nio.events.room_events import RoomMessageText
 
 from support_bot import commands_help
-from support_bot.chat_functions import create_private_room, filtered_sync, get_room_messages, invite_to_room, send_text_to_room, kick_from_room, \
-    find_private_msg, send_shared_history_keys, delete_room
+from support_bot.chat_functions import create_private_room, filtered_sync, get_room_messages, send_text_to_room, \
+    find_private_msg, delete_room
 from support_bot.config import Config
+from support_bot.copy_jobs import CopyJobs
 from support_bot.errors import Errors, TicketNotFound, ChatNotFound
 from support_bot.handlers.EventStateHandler import EventStateHandler, LogLevel, RoomType
 from support_bot.handlers.MessagingHandler import MessagingHandler
+from support_bot.membership import invite_all_to_room, kick_all_from_room
 from support_bot.models.Chat import Chat
-from support_bot.models.EventPairs import EventPair
-from support_bot.models.IncomingEvent import IncomingEvent
 from support_bot.models.Repositories.ChatRepository import ChatStatus, ChatRepository
 from support_bot.models.Repositories.TicketRepository import TicketStatus, TicketRepository
 from support_bot.models.Staff import Staff
 from support_bot.models.Support import Support
 from support_bot.models.Ticket import Ticket
 from support_bot.models.User import User
+from support_bot.parsed_event import ParsedEvent
+from support_bot.pending_deliveries import KIND_MESSAGE
 from support_bot.storage import Storage
-from support_bot.utils import get_replaces, get_username
+from support_bot.utils import get_username
 
 logger = logging.getLogger(__name__)
 
 class Command(object):
-    def __init__(self, client: AsyncClient, store: Storage, config: Config, command: str, room: MatrixRoom, event: RoomMessageText):
+    def __init__(self, client: AsyncClient, store: Storage, config: Config, command: str, room: MatrixRoom, event: RoomMessageText, parsed: ParsedEvent = None):
         """A command made by a user
 
         Args:
@@ -62,6 +58,8 @@ class Command(object):
             room (nio.rooms.MatrixRoom): The room the command was sent in
 
             event (nio.events.room_events.RoomMessageText): The event describing the command
+
+            parsed (ParsedEvent): The already parsed event, if any
         """
         self.client: AsyncClient = client
         self.store: Storage = store
@@ -69,6 +67,7 @@ class Command(object):
         self.command: str = command
         self.room: MatrixRoom = room
         self.event: RoomMessageText = event
+        self.parsed: ParsedEvent = parsed if parsed is not None else ParsedEvent(event, config.command_prefix)
         self.args = self.command.split()[1:]
         self.handler = EventStateHandler(client, store, config, room, event)
         self.messageHandler = MessagingHandler(self.handler)
@@ -79,7 +78,7 @@ class Command(object):
         if not await self.handler.find_room_state():
             return
 
-        if not self.handler.find_state_staff():
+        if not await self.handler.find_state_staff():
             msg = f"{self.event.sender} in room {self.room.room_id} | {self.room.name} \
             is unauthorized to use {self.command}"
             await self.handler.message_management(msg, LogLevel.INFO)
@@ -213,10 +212,10 @@ class Command(object):
             await send_text_to_room(self.client, self.room.room_id, commands_help.COMMAND_WRITE)
             return
 
-        replaces = get_replaces(self.event)
+        replaces = self.parsed.replaces
         replaces_event_id = None
         if replaces:
-            message = self.store.get_message_by_management_event_id(replaces)
+            message = await self.store.get_message_by_management_event_id(replaces)
             if message:
                 replaces_event_id = message["event_id"]
 
@@ -231,7 +230,7 @@ class Command(object):
         response = await send_text_to_room(self.client, room, text, False, replaces_event_id=replaces_event_id)
 
         if type(response) == RoomSendResponse and response.event_id:
-            self.store.store_message(
+            await self.store.store_message(
                 event_id=response.event_id,
                 management_event_id=self.event.event_id,
                 room_id=room,
@@ -257,15 +256,15 @@ class Command(object):
         chat_rep: ChatRepository = self.store.repositories.chatRep
 
         if len(self.args) == 1:
-            staff = Staff.get_existing(self.store, self.args[0])
+            staff = await Staff.get_existing(self.store, self.args[0])
             if not staff:
                 await send_text_to_room(
                     self.client, self.room.room_id, f"{self.args[0]} is not a staff member.",
                 )
                 return
-            open_chats = chat_rep.get_open_chats_of_staff(staff.user_id)
+            open_chats = await chat_rep.get_open_chats_of_staff(staff.user_id)
         else:
-            open_chats = chat_rep.get_open_chats()
+            open_chats = await chat_rep.get_open_chats()
 
         # Construct response array
         resp = [f"<p>{chat['chat_room_id']} - {chat['user_id']}</p>" for chat in open_chats]
@@ -283,15 +282,15 @@ class Command(object):
         ticket_rep: TicketRepository = self.store.repositories.ticketRep
 
         if len(self.args) == 1:
-            staff = Staff.get_existing(self.store, self.args[0])
+            staff = await Staff.get_existing(self.store, self.args[0])
             if not staff:
                 await send_text_to_room(
                     self.client, self.room.room_id, f"{self.args[0]} is not a staff member.",
                 )
                 return
-            open_tickets = ticket_rep.get_open_tickets_of_staff(staff.user_id)
+            open_tickets = await ticket_rep.get_open_tickets_of_staff(staff.user_id)
         else:
-            open_tickets = ticket_rep.get_open_tickets()
+            open_tickets = await ticket_rep.get_open_tickets()
 
         # Construct response array
         resp = [f"<p>{ticket['id']} - {ticket['ticket_name']} - {ticket['user_id']}</p>" for ticket in open_tickets]
@@ -312,7 +311,7 @@ class Command(object):
 
         user_id = self.args[0]
 
-        user = User.get_existing(self.store, user_id)
+        user = await User.get_existing(self.store, user_id)
         if not user:
             await send_text_to_room(
                 self.client, self.room.room_id, f"User with ID {user_id} does not exist in DB",
@@ -334,7 +333,7 @@ class Command(object):
 
         user_id = self.args[0]
 
-        user = User.get_existing(self.store, user_id)
+        user = await User.get_existing(self.store, user_id)
         if not user:
             await send_text_to_room(
                 self.client, self.room.room_id, f"User with ID {user_id} does not exist in DB",
@@ -359,7 +358,7 @@ class Command(object):
 
         user_id = self.args[0]
 
-        Staff.create_new(self.store, user_id)
+        await Staff.create_new(self.store, user_id)
         await send_text_to_room(
             self.client, self.room.room_id, f"{user_id} is now staff.",
         )
@@ -375,15 +374,15 @@ class Command(object):
 
         user_id = self.args[0]
 
-        user = User.get_existing(self.store, user_id)
+        user = await User.get_existing(self.store, user_id)
         if not user:
             # If we don't have the user details yet - create new instance
-            user = User.create_new(self.store, user_id)
+            user = await User.create_new(self.store, user_id)
 
         room = find_private_msg(self.client, user_id)
 
         if room:
-            user.update_communications_room(room.room_id)
+            await user.update_communications_room(room.room_id)
             await send_text_to_room(
                 self.client, self.room.room_id, f"Existing room found with ID {room.room_id}",
             )
@@ -397,7 +396,7 @@ class Command(object):
 
         resp = await create_private_room(self.client, user_id, username)
         if isinstance(resp, RoomCreateResponse):
-            user.update_communications_room(resp.room_id)
+            await user.update_communications_room(resp.room_id)
             await send_text_to_room(
                 self.client, self.room.room_id,
                 f"Created a new DM for user {user_id} with roomID: {resp.room_id}",
@@ -495,9 +494,8 @@ class Command(object):
         msg = ""
         if not self.client.rooms.get(room_id, None):
             msg += f"Failed to retrieve room {room_id} details, creating task for awaiting room status and sending message later. \n"
-            task = (self.client.callbacks._message, room_id, self.event.room_id, self.event, int(time.time()))
-            # Add the task to the room queue to be sent when room is loaded
-            self.client.callbacks.rooms_pending[task[1]].append(task)
+            # Add the message to the room queue to be sent when room is loaded
+            await self.client.callbacks.pending.add(KIND_MESSAGE, room_id, self.room.room_id, self.event)
         else:
             response = await send_text_to_room(self.client,
                                        room_id, to_send,
@@ -555,37 +553,9 @@ class Command(object):
         
             
     async def _copy_incoming_events(self, ticket:Ticket):
-        incomingEvents = IncomingEvent.get_incoming_events(self.store, ticket.user_id)
-        for event in incomingEvents:
-            
-            # Delete old paired events to prevent original message being tied to different clones
-            EventPair.delete_event(self.store, event.room_id, event.event_id)
-            
-            resp = await self.client.room_get_event(event.room_id, event.event_id)
-            if isinstance(resp, RoomGetEventResponse):
-                if isinstance(resp.event, (RoomMessageText, RoomMessageNotice, RoomMessageFormatted)):
-                    task = (self.client.callbacks._message, ticket.ticket_room_id, event.room_id, resp.event, int(time.time()))
-                elif isinstance(resp.event, (RoomMessageMedia, RoomEncryptedMedia)):
-                    task = (self.client.callbacks._media, ticket.ticket_room_id, event.room_id, resp.event, int(time.time()))
-                else:
-                    continue
-                
-                # 0 - task method
-                # 1 - room that is blocking the task
-                # 2 - room the event originated from
-                # 3 - the event itself
-                
-                if task[1] in self.client.rooms:
-                    await task[0](self.client.rooms[task[2]], task[3])
-                else:
-                    self.client.callbacks.rooms_pending[task[1]].append(task)
-            else:
-                msg = f"Failed to get event {event.event_id} from user {event.user_id} in room {event.room_id}. Event was not copied to new room."
-                logger.warning(msg)
-                await send_text_to_room(self.client, self.room.room_id, msg,)
-        
-        # Delete the events
-        IncomingEvent.delete_user_incoming_events(self.store, ticket.user_id)
+        # Copied in the background, the job resumes after a restart
+        copy_jobs = getattr(self.client, "copy_jobs", None) or CopyJobs(self.client, self.store)
+        await copy_jobs.start(ticket.id, ticket.user_id, ticket.ticket_room_id, self.room.room_id)
 
     async def _raise_ticket(self):
         """
@@ -605,7 +575,7 @@ class Command(object):
         text = text.strip()
 
         # Find User by user_id
-        user = User.get_existing(self.store, user_id)
+        user = await User.get_existing(self.store, user_id)
 
         if not user:
             msg = f"Failed to raise Ticket: {user_id} has not texted the bot yet. \"" \
@@ -616,12 +586,12 @@ class Command(object):
 
         # Raise a new ticket
         if text:
-            ticket = Ticket.create_new(self.store, user.user_id, text)
+            ticket = await Ticket.create_new(self.store, user.user_id, text)
         else:
-            ticket = Ticket.create_new(self.store, user.user_id)
+            ticket = await Ticket.create_new(self.store, user.user_id)
 
         if ticket:
-            user.update_current_ticket_id(ticket.id)
+            await user.update_current_ticket_id(ticket.id)
 
             msg = f"Raised Ticket #{ticket.id} {ticket.ticket_name} for {ticket.user_id}"
             logger.info(msg)
@@ -645,7 +615,7 @@ class Command(object):
             return
           
         # Claim Ticket for the staff
-        ticket.claim_ticket(self.handler.staff.user_id)
+        await ticket.claim_ticket(self.handler.staff.user_id)
 
         # Invite staff to Ticket room
         # response = await ticket.invite_to_ticket_room(self.client, self.handler.staff.user_id)
@@ -675,7 +645,7 @@ class Command(object):
         user_id = self.args[0]
 
         # Find User by user_id
-        user = User.get_existing(self.store, user_id)
+        user = await User.get_existing(self.store, user_id)
 
         if not user:
             username = get_username(user_id)
@@ -685,11 +655,11 @@ class Command(object):
                 await send_text_to_room(self.client, self.room.room_id, msg,)
                 return
             else:
-                user = User.create_new(self.store, user_id)
+                user = await User.create_new(self.store, user_id)
 
         # Fetch existing or create new Chat for user:
         if user.current_chat_room_id:
-            chat = Chat.get_existing(self.store, user.current_chat_room_id)
+            chat = await Chat.get_existing(self.store, user.current_chat_room_id)
             if not chat:
                 msg = f"Unable to find chat with ID {user.current_chat_room_id} in DB of {user_id}"
                 logger.warning(msg)
@@ -709,7 +679,7 @@ class Command(object):
                 return
 
             chat = response
-            user.update_current_chat_room_id(chat.chat_room_id)
+            await user.update_current_chat_room_id(chat.chat_room_id)
 
             msg = f"Created Chat {chat.chat_room_id} for {chat.user_id}"
             logger.info(msg)
@@ -718,7 +688,7 @@ class Command(object):
                 await send_text_to_room(self.client, self.config.management_room_id, msg,)
 
         # Claim Chat for staff
-        chat.claim_chat(self.handler.staff.user_id)
+        await chat.claim_chat(self.handler.staff.user_id)
 
         # Invite staff to the Chat room
         response = await chat.invite_to_chat_room(self.client, self.handler.staff.user_id)
@@ -742,7 +712,7 @@ class Command(object):
         Staff close the current Chat.
         """
 
-        chat:Chat = Chat.find_chat_of_room(self.store, self.room)
+        chat:Chat = await Chat.find_chat_of_room(self.store, self.room)
         if not chat:
             msg = f"Could not find Chat of room {self.room.room_id} to close"
             logger.warning(msg)
@@ -770,7 +740,7 @@ class Command(object):
 
         ticket_id = int(ticket_id)
         
-        ticket:Ticket = Ticket.get_existing(self.store, ticket_id)
+        ticket:Ticket = await Ticket.get_existing(self.store, ticket_id)
         if not ticket:
             msg = f"Could not find Ticket with ticket id {ticket_id} to forcefully close"
             logger.warning(msg)
@@ -791,7 +761,7 @@ class Command(object):
         
         chat_room_id = self.args[0]
         
-        chat:Chat = Chat.get_existing(self.store, chat_room_id)
+        chat:Chat = await Chat.get_existing(self.store, chat_room_id)
         if not chat:
             msg = f"Could not find Chat with chat room id {chat_room_id} to forcefully close"
             logger.warning(msg)
@@ -809,7 +779,7 @@ class Command(object):
         Staff close the current ticket.
         """
 
-        ticket_id = Ticket.get_ticket_id_from_room_id(self.store, self.room.room_id)
+        ticket_id = await Ticket.get_ticket_id_from_room_id(self.store, self.room.room_id)
         if not ticket_id:
             err = f"Could not find Ticket with ticket room {self.room.room_id} to close"
             logger.warning(err)
@@ -838,7 +808,7 @@ class Command(object):
 
         ticket_id = int(ticket_id)
         
-        ticket:Ticket = Ticket.get_existing(self.store, ticket_id)
+        ticket:Ticket = await Ticket.get_existing(self.store, ticket_id)
         if not ticket:
             msg = f"Could not find Ticket with ticket id {ticket_id} to delete room of"
             logger.warning(msg)
@@ -858,7 +828,7 @@ class Command(object):
             return
         
         room_id = self.args[0]
-        chat_room_id = Chat.get_chat_room_id_from_room_id(self.store, room_id)
+        chat_room_id = await Chat.get_chat_room_id_from_room_id(self.store, room_id)
         
         if not chat_room_id:
             msg = f"Chat with room id {room_id} does not exist"
@@ -866,7 +836,7 @@ class Command(object):
             await send_text_to_room(
                 self.client, self.room.room_id, msg,)
             
-        chat:Chat = Chat.get_existing(self.store, chat_room_id)
+        chat:Chat = await Chat.get_existing(self.store, chat_room_id)
         if not chat:
             msg = f"Could not find Chat with chat room id {chat_room_id} to delete room of"
             logger.warning(msg)
@@ -887,12 +857,12 @@ class Command(object):
         
         room_id = self.args[0]
         
-        chat_room_id = Chat.get_chat_room_id_from_room_id(self.store, room_id)
-        ticket_id = Ticket.get_ticket_id_from_room_id(self.store, room_id)
+        chat_room_id = await Chat.get_chat_room_id_from_room_id(self.store, room_id)
+        ticket_id = await Ticket.get_ticket_id_from_room_id(self.store, room_id)
         
         if not chat_room_id and not ticket_id:
             msg = f"Room is neither a  not find Ticket with ticket id {ticket_id} to delete room of"
-        ticket:Ticket = Ticket.get_existing(self.store, ticket_id)
+        ticket:Ticket = await Ticket.get_existing(self.store, ticket_id)
         if not ticket:
             msg = f"Could not find Ticket with ticket id {ticket_id} to delete room of"
             logger.warning(msg)
@@ -918,7 +888,7 @@ class Command(object):
         ticket_id = None
         # Find ticket by room or provided ID
         if len(self.args) == 0:
-            ticket_id = Ticket.get_ticket_id_from_room_id(self.store, self.room.room_id)
+            ticket_id = await Ticket.get_ticket_id_from_room_id(self.store, self.room.room_id)
             if not ticket_id:
                 err = TicketNotFound(ticket_id)
                 logger.warning(err)
@@ -979,30 +949,26 @@ class Command(object):
     
 
 async def unassign_staff_from_ticket(client: AsyncClient, store: Storage, ticket_id: str, user_ids: [str]) -> Optional[ErrorResponse]:
-    ticket:Ticket = Ticket.get_existing(store, ticket_id)
+    ticket:Ticket = await Ticket.get_existing(store, ticket_id)
     if not ticket:
         return TicketNotFound(ticket_id)
     
     for user_id in user_ids:
-        ticket.unassign_staff(user_id)
-        resp = await kick_from_room(
-                    client, user_id, ticket.ticket_room_id
-                )
-        if isinstance(resp, RoomKickError):
-            logger.warning(f"Failed to kick user {user_id} from ticket ID: {ticket.id} in room {ticket.ticket_room_id}")
+        await ticket.unassign_staff(user_id)
+    results = await kick_all_from_room(client, user_ids, ticket.ticket_room_id)
+    for user_id in results.failed:
+        logger.warning(f"Failed to kick user {user_id} from ticket ID: {ticket.id} in room {ticket.ticket_room_id}")
 
 async def unassign_staff_from_chat(client: AsyncClient, store: Storage, chat_room_id: str, user_ids: [str]) -> Optional[ErrorResponse]:
-    chat:Chat = Chat.get_existing(store, chat_room_id)
+    chat:Chat = await Chat.get_existing(store, chat_room_id)
     if not chat:
         return ChatNotFound(chat_room_id)
     
     for user_id in user_ids:
-        chat.unassign_staff(user_id)
-        resp = await kick_from_room(
-                    client, user_id, chat.chat_room_id
-                )
-        if isinstance(resp, RoomKickError):
-            logger.warning(f"Failed to kick user {user_id} from chat {chat_room_id}")
+        await chat.unassign_staff(user_id)
+    results = await kick_all_from_room(client, user_ids, chat.chat_room_id)
+    for user_id in results.failed:
+        logger.warning(f"Failed to kick user {user_id} from chat {chat_room_id}")
     
     
 async def claim(client: AsyncClient, store: Storage, staff_user_id: str, ticket_id:str) -> Optional[ErrorResponse]:
@@ -1010,27 +976,24 @@ async def claim(client: AsyncClient, store: Storage, staff_user_id: str, ticket_
         Staff claim a ticket.
         """
         # Get ticket by id
-        ticket = Ticket.get_existing(store, int(ticket_id))
+        ticket = await Ticket.get_existing(store, int(ticket_id))
 
         if not ticket:
             return TicketNotFound(ticket_id)
 
         # Claim Ticket for the staff
-        ticket.claim_ticket(staff_user_id)
+        await ticket.claim_ticket(staff_user_id)
 
         logger.debug(f"Inviting user {staff_user_id} to ticket room {ticket.ticket_room_id}")
 
         # Invite staff to Ticket room
-        response = await ticket.invite_to_ticket_room(client, staff_user_id)
+        results = await invite_all_to_room(client, [staff_user_id], ticket.ticket_room_id, share_keys=True)
+        response = results[staff_user_id]
 
         if isinstance(response, RoomInviteResponse):
-            try:
-                resp = await send_shared_history_keys(client, ticket.ticket_room_id, [staff_user_id])
-                if isinstance(resp, ErrorResponse):
-                    return resp
-                logger.debug(f"Invited staff to Ticket room successfully")
-            except Exception as e:
-                return ErrorResponse(f"Failed to share keys with user {staff_user_id} {e}", Errors.EXCEPTION)
+            if results.keys_error:
+                return results.keys_error
+            logger.debug(f"Invited staff to Ticket room successfully")
         else:
             return ErrorResponse(f"Failed to invite {staff_user_id} to Ticket room {ticket.ticket_room_id}: {response.message}", Errors.ROOM_INVITE)
 
@@ -1039,27 +1002,24 @@ async def chat_claim(client: AsyncClient, store: Storage, staff_user_id: str, ch
         Staff claim a chat.
         """
         # Get chat by chat room id
-        chat = Chat.get_existing(store, chat_room_id)
+        chat = await Chat.get_existing(store, chat_room_id)
 
         if not chat:
             return ChatNotFound(chat_room_id)
 
         # Claim Chat for the staff
-        chat.claim_chat(staff_user_id)
+        await chat.claim_chat(staff_user_id)
 
         logger.debug(f"Inviting user {staff_user_id} to chat room {chat.chat_room_id}")
 
         # Invite staff to Chat room
-        response = await chat.invite_to_chat_room(client, staff_user_id)
+        results = await invite_all_to_room(client, [staff_user_id], chat.chat_room_id, share_keys=True)
+        response = results[staff_user_id]
 
         if isinstance(response, RoomInviteResponse):
-            try:
-                resp = await send_shared_history_keys(client, chat.chat_room_id, [staff_user_id])
-                if isinstance(resp, ErrorResponse):
-                    return resp
-                logger.debug(f"Invited staff to Chat room successfully")
-            except Exception as e:
-                return ErrorResponse(f"Failed to share keys with user {staff_user_id} {e}", Errors.EXCEPTION)
+            if results.keys_error:
+                return results.keys_error
+            logger.debug(f"Invited staff to Chat room successfully")
         else:
             return ErrorResponse(f"Failed to invite {staff_user_id} to chat room {chat.chat_room_id}: {response.message}", Errors.ROOM_INVITE)
 
@@ -1071,17 +1031,17 @@ async def reopen_ticket(client: AsyncClient, store: Storage, ticket_id: str, man
         if not isinstance(ticket_id, int):
             return ErrorResponse(f"Ticket id must be of type int", Errors.EXCEPTION)
         
-        ticket = Ticket.get_existing(store, ticket_id)
+        ticket = await Ticket.get_existing(store, ticket_id)
         
         if not ticket:
             return TicketNotFound(ticket_id)
 
-        current_user_ticket_id = ticket.find_user_current_ticket_id()
+        current_user_ticket_id = await ticket.find_user_current_ticket_id()
         if current_user_ticket_id is not None:
             return ErrorResponse(f"User already has Ticket open with ID {current_user_ticket_id} close it first to reopen this Ticket.", Errors.INVALID_ROOM_STATE)
         if ticket.status == TicketStatus.CLOSED:
-            ticket.set_status(TicketStatus.OPEN)
-            ticket.userRep.set_user_current_ticket_id(ticket.user_id, ticket.id)
+            await ticket.set_status(TicketStatus.OPEN)
+            await ticket.userRep.set_user_current_ticket_id(ticket.user_id, ticket.id)
 
             msg = f"Reopened Ticket {ticket.id}"
             logger.info(msg)
@@ -1090,20 +1050,10 @@ async def reopen_ticket(client: AsyncClient, store: Storage, ticket_id: str, man
 
             # Invite staff to the ticket room if not joined already
             # Invite all assigned support to the room
-            support_users = ticket.get_assigned_support() + ticket.get_assigned_staff()
-
-            for staff in support_users:
-                resp = await invite_to_room(client, staff, ticket.ticket_room_id)
-
-                if isinstance(resp, RoomInviteResponse):
-                    try:
-                        resp = await send_shared_history_keys(client, ticket.ticket_room_id, [staff])
-                        if isinstance(resp, ErrorResponse):
-                            logger.warning(f"Failed to share room keys of {ticket.ticket_room_id} with {staff}: {resp}")
-                    except Exception as e:
-                        logger.warning(e)
-                else:
-                    logger.warning(f"Failed to invite {staff} to room {ticket.ticket_room_id}: {resp}")
+            support, staff = await asyncio.gather(ticket.get_assigned_support(), ticket.get_assigned_staff())
+
+            # Failures are logged, the ticket is reopened regardless
+            await invite_all_to_room(client, support + staff, ticket.ticket_room_id, share_keys=True)
         else:
             return ErrorResponse(f"Ticket {ticket.id} is {ticket.status}, not in CLOSED state.", Errors.INVALID_ROOM_STATE)
 
@@ -1113,32 +1063,29 @@ async def claimfor(client: AsyncClient, store: Storage, user_id:str, ticket_id:s
         """
 
         # Get ticket by id
-        ticket = Ticket.get_existing(store, int(ticket_id))
+        ticket = await Ticket.get_existing(store, int(ticket_id))
 
         if not ticket:
             return TicketNotFound(ticket_id)
         
-        support = Support.get_existing(store, user_id)
+        support = await Support.get_existing(store, user_id)
         
         if not support:
             logger.info(f"Creating new support user for {user_id}.")
-            support = Support.create_new(store, user_id)
+            support = await Support.create_new(store, user_id)
 
         # Claim Ticket for the support user
-        ticket.claimfor_ticket(support.user_id)
+        await ticket.claimfor_ticket(support.user_id)
 
         logger.debug(f"Inviting user {support.user_id} to ticket room {ticket.ticket_room_id}")
 
         # Invite support to Ticket room
-        response = await ticket.invite_to_ticket_room(client, support.user_id)
+        results = await invite_all_to_room(client, [support.user_id], ticket.ticket_room_id, share_keys=True)
+        response = results[support.user_id]
 
         if isinstance(response, RoomInviteResponse):
-            try:
-                resp = await send_shared_history_keys(client, ticket.ticket_room_id, [support.user_id])
-                if isinstance(resp, ErrorResponse):
-                    return resp
-            except Exception as e:
-                return ErrorResponse(e, Errors.EXCEPTION)
+            if results.keys_error:
+                return results.keys_error
         else:
             return ErrorResponse(f"Failed to invite {support.user_id} to Ticket room {ticket.ticket_room_id}: {response.message}", Errors.ROOM_INVITE)
 
@@ -1148,32 +1095,29 @@ async def chat_claimfor(client: AsyncClient, store: Storage, user_id:str, chat_r
         """
 
         # Get ticket by id
-        chat = Chat.get_existing(store, chat_room_id)
+        chat = await Chat.get_existing(store, chat_room_id)
 
         if not chat:
             return ChatNotFound(chat_room_id)
         
-        support = Support.get_existing(store, user_id)
+        support = await Support.get_existing(store, user_id)
         
         if not support:
             logger.info(f"Creating new support user for {user_id}.")
-            support = Support.create_new(store, user_id)
+            support = await Support.create_new(store, user_id)
 
         # Claim Ticket for the support user
-        chat.claimfor_ticket(support.user_id)
+        await chat.claimfor_chat(support.user_id)
 
         logger.debug(f"Inviting user {support.user_id} to chat room {chat.chat_room_id}")
 
         # Invite support to Chat room
-        response = await chat.invite_to_chat_room(client, support.user_id)
+        results = await invite_all_to_room(client, [support.user_id], chat.chat_room_id, share_keys=True)
+        response = results[support.user_id]
 
         if isinstance(response, RoomInviteResponse):
-            try:
-                resp = await send_shared_history_keys(client, chat.chat_room_id, [support.user_id])
-                if isinstance(resp, ErrorResponse):
-                    return resp
-            except Exception as e:
-                return ErrorResponse(e, Errors.EXCEPTION)
+            if results.keys_error:
+                return results.keys_error
         else:
             return ErrorResponse(f"Failed to invite {support.user_id} to Chat room {chat.chat_room_id}: {response.message}", Errors.ROOM_INVITE)
 
@@ -1185,35 +1129,26 @@ async def close_ticket(client: AsyncClient, store: Storage, ticket_id:int, manag
         if not isinstance(ticket_id, int):
             return ErrorResponse(f"Ticket id must be of type int", Errors.EXCEPTION)
         
-        ticket:Ticket = Ticket.get_existing(store, ticket_id)
+        ticket:Ticket = await Ticket.get_existing(store, ticket_id)
         if not ticket:
             return TicketNotFound(ticket_id)
         else:
             if ticket.status == TicketStatus.OPEN:
-                ticket.set_status(TicketStatus.CLOSED)
+                await ticket.set_status(TicketStatus.CLOSED)
 
-                current_user_ticket_id = ticket.find_user_current_ticket_id()
+                current_user_ticket_id = await ticket.find_user_current_ticket_id()
                 if current_user_ticket_id == ticket.id:
-                    ticket.userRep.set_user_current_ticket_id(ticket.user_id, None)
+                    await ticket.userRep.set_user_current_ticket_id(ticket.user_id, None)
 
                 msg = f"Closed Ticket {ticket.id}"
                 logger.info(msg)
                 await send_text_to_room(client, ticket.ticket_room_id, msg,)
                 await send_text_to_room(client, management_room_id, msg,)
 
-                # Kick all support from the room
-                support_users = ticket.get_assigned_support()
-                for support in support_users:
-                    await kick_from_room(
-                    client, support, ticket.ticket_room_id
-                )
-                
-                # Kick staff from room after close
-                staff_users = ticket.get_assigned_staff()
-                for staff in staff_users:
-                    await kick_from_room(
-                        client, staff, ticket.ticket_room_id
-                    ) 
+                support_users, staff_users = await asyncio.gather(ticket.get_assigned_support(), ticket.get_assigned_staff())
+
+                # Kick all support and staff from the room after close
+                await kick_all_from_room(client, support_users + staff_users, ticket.ticket_room_id)
             else:
                 return ErrorResponse(f"Ticket {ticket.id} is already closed", Errors.INVALID_ROOM_STATE)
             
@@ -1222,34 +1157,25 @@ async def close_chat(client: AsyncClient, store: Storage, chat_room_id:str, mana
         Staff close the chat of provided chat room id.
         """
 
-        chat:Chat = Chat.get_existing(store, chat_room_id)
+        chat:Chat = await Chat.get_existing(store, chat_room_id)
         if not chat:
             return ChatNotFound(chat_room_id)
         else:
             if chat.status == ChatStatus.OPEN:
-                current_user_chat_room_id = chat.find_user_current_chat_room_id()
+                current_user_chat_room_id = await chat.find_user_current_chat_room_id()
                 if current_user_chat_room_id == chat.chat_room_id:
-                    chat.userRep.set_user_current_chat_room_id(chat.user_id, None)
+                    await chat.userRep.set_user_current_chat_room_id(chat.user_id, None)
 
-                chat.set_status(ChatStatus.CLOSED)
+                await chat.set_status(ChatStatus.CLOSED)
                 msg = f"Closed Chat {chat.chat_room_id}"
                 logger.info(msg)
                 await send_text_to_room(client, chat.chat_room_id, msg,)
                 await send_text_to_room(client, management_room_id, msg,)
 
-                # Kick all support from the room
-                support_users = chat.get_assigned_support()
-                for support in support_users:
-                    await kick_from_room(
-                    client, support, chat.chat_room_id
-                )
-                
-                # Kick staff from room after close
-                staff_users = chat.get_assigned_staff()
-                for staff in staff_users:
-                    await kick_from_room(
-                        client, staff, chat.chat_room_id
-                    ) 
+                support_users, staff_users = await asyncio.gather(chat.get_assigned_support(), chat.get_assigned_staff())
+
+                # Kick all support and staff from the room after close
+                await kick_all_from_room(client, support_users + staff_users, chat.chat_room_id)
                     
                 # Auto-delete room after close.
                 room:MatrixRoom = client.rooms.get(chat.chat_room_id, None)
@@ -1264,7 +1190,7 @@ async def close_chat(client: AsyncClient, store: Storage, chat_room_id:str, mana
                         logger.error(msg)
                         await send_text_to_room(client, management_room_id, msg,)
                     else:
-                        chat.set_status(ChatStatus.DELETED)
+                        await chat.set_status(ChatStatus.DELETED)
                         msg = f"Deleted Chat {room.room_id}."
                         logger.info(msg)
                         await send_text_to_room(client, management_room_id, msg,)
@@ -1282,7 +1208,7 @@ async def delete_ticket_room(client: AsyncClient, store: Storage, ticket_id:int,
         if not isinstance(ticket_id, int):
             return ErrorResponse(f"Ticket id must be of type int", Errors.EXCEPTION)
         
-        ticket:Ticket = Ticket.get_existing(store, ticket_id)
+        ticket:Ticket = await Ticket.get_existing(store, ticket_id)
         if not ticket:
             return TicketNotFound(ticket_id)
         else:
@@ -1308,7 +1234,7 @@ async def delete_ticket_room(client: AsyncClient, store: Storage, ticket_id:int,
                 logger.error(f"Failed to leave room: {response}")
                 return response
             else:
-                ticket.set_status(TicketStatus.DELETED)
+                await ticket.set_status(TicketStatus.DELETED)
 
                 msg = f"Deleted Ticket {ticket.id} room {ticket.ticket_room_id}"
                 logger.info(msg)
@@ -1319,11 +1245,11 @@ async def delete_chat_room(client: AsyncClient, store: Storage, chat_room_id:str
         Staff delete the Chat room.
         """
 
-        chat:Chat = Chat.get_existing(store, chat_room_id)
+        chat:Chat = await Chat.get_existing(store, chat_room_id)
         if not chat:
             return ChatNotFound(ticket_id)
         else:
-            current_user_chat_room_id = chat.find_user_current_chat_room_id()
+            current_user_chat_room_id = await chat.find_user_current_chat_room_id()
 
         if current_user_chat_room_id == chat.chat_room_id:
             return ErrorResponse(f"Chat room {chat.chat_room_id} still assigned to chat user {chat.user_id}", Errors.LOGIC_CHECK)
@@ -1344,26 +1270,24 @@ async def delete_chat_room(client: AsyncClient, store: Storage, chat_room_id:str
             logger.error(f"Failed to leave room: {response}")
             return response
         else:
-            chat.set_status(ChatStatus.DELETED)
+            await chat.set_status(ChatStatus.DELETED)
             msg = f"Deleted Chat {chat_room_id} room"
             logger.info(msg)
             await send_text_to_room(client, management_room_id, msg,)
 
 async def unassign_support_from_ticket(client: AsyncClient, store: Storage, ticket_id: str, user_ids: [str]) -> Optional[ErrorResponse]:
-        ticket:Ticket = Ticket.get_existing(store, ticket_id)
+        ticket:Ticket = await Ticket.get_existing(store, ticket_id)
         if not ticket:
             return TicketNotFound(ticket_id)
         
         for user_id in user_ids:
-            ticket.unassign_support(user_id)
-            resp = await kick_from_room(
-                        client, user_id, ticket.ticket_room_id
-                    )
-            if isinstance(resp, RoomKickError):
-                logger.warning(f"Failed to kick user {user_id} from ticket ID: {ticket.id} in room {ticket.room_id}")
+            await ticket.unassign_support(user_id)
+        results = await kick_all_from_room(client, user_ids, ticket.ticket_room_id)
+        for user_id in results.failed:
+            logger.warning(f"Failed to kick user {user_id} from ticket ID: {ticket.id} in room {ticket.ticket_room_id}")
 
 async def fetch_ticket_room_messages(client: AsyncClient, store: Storage, ticket_id: str, limit=10, start:str = '', end:str = '') -> Optional[ErrorResponse]:
-    ticket:Ticket = Ticket.get_existing(store, ticket_id)
+    ticket:Ticket = await Ticket.get_existing(store, ticket_id)
     if not ticket:
         return TicketNotFound(ticket_id)
     
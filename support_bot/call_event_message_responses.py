@@ -9,6 +9,8 @@ from support_bot.event_responses import Message
 from support_bot.chat_functions import send_text_to_room
 from support_bot.config import Config
 from support_bot.handlers.EventStateHandler import LogLevel
+from support_bot.outbound import Lane
+from support_bot.pending_deliveries import KIND_CALL_EVENT
 from support_bot.storage import Storage
 from support_bot.utils import with_ratelimit
 
@@ -48,8 +50,7 @@ class CallEventMessage(Message):
         
     async def send_notice_to_room(self, room_id:str):
         if not self.client.rooms.get(room_id, None):
-            task = (self.client.callbacks._redact, room_id, self.event.room_id, self.event)
-            self.client.callbacks.rooms_pending[task[1]].append(task)
+            await self.client.callbacks.pending.add(KIND_CALL_EVENT, room_id, self.room.room_id, self.event)
             return
         
         text = f"{self.event.sender} in {self.room.display_name} (`{self.room.room_id}`) " \
@@ -57,7 +58,7 @@ class CallEventMessage(Message):
         response = await send_text_to_room(self.client, room_id, text, False)
         
         if type(response) == RoomSendResponse and response.event_id:
-            self.store.store_message(
+            await self.store.store_message(
                 self.event.event_id,
                 response.event_id,
                 self.room.room_id,
@@ -73,7 +74,7 @@ class CallEventMessage(Message):
             if self.event_type == "m.call.invite":
                 await self.send_notice_to_room(room_id)
         else:
-            resp = await with_ratelimit(self.client.room_send)(
+            resp = await with_ratelimit(self.client.room_send, Lane.RELAY)(
                     room_id,
                     self.event.source.get("type", None),
                     self.event.source.get("content")
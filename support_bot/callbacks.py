@@ -1,8 +1,6 @@
-from collections import defaultdict
 import json
 import logging
 from datetime import datetime
-import time
 
 # noinspection PyPackageRequirements
 from nio import (
@@ -13,14 +11,18 @@ from nio import (
 
 from support_bot.bot_commands import Command
 from support_bot.call_event_message_responses import CallEventMessage
-from support_bot.chat_functions import send_text_to_room, send_shared_history_keys, delete_room
+from support_bot.chat_functions import send_text_to_room, send_status_notice, send_shared_history_keys, delete_room
 from support_bot.config import Config
+from support_bot.event_dedup import EventDeduplicator
 from support_bot.media_responses import Media
 from support_bot.message_responses import TextMessage
 from support_bot.models.Repositories.TicketRepository import TicketStatus
 from support_bot.models.Repositories.ChatRepository import ChatStatus
 from support_bot.models.Staff import Staff
+from support_bot.parsed_event import ParsedEvent
+from support_bot.pending_deliveries import KIND_TEXT, PendingDeliveries
 from support_bot.redact_responses import RedactMessage
+from support_bot.room_state_cache import RoomStateCache
 from support_bot.storage import Storage
 from support_bot.models.Support import Support
 from support_bot.utils import with_ratelimit
@@ -35,7 +37,7 @@ DUPLICATES_CACHE_SIZE = 1000
 
 
 class Callbacks(object):
-    def __init__(self, client: AsyncClient, store: Storage, config: Config):
+    def __init__(self, client: AsyncClient, store: Storage, config: Config, dedup: EventDeduplicator = None):
         """
         Args:
             client (nio.AsyncClient): nio client used to interact with matrix
@@ -43,19 +45,28 @@ class Callbacks(object):
             store (Storage): Bot storage
 
             config (Config): Bot configuration parameters
+
+            dedup (EventDeduplicator): Optional duplicate event filter, a non persisted one
+                of the default size is used if not provided
         """
         self.client: AsyncClient = client
         self.store = store
         self.config = config
         self.command_prefix = config.command_prefix
-        self.received_events = []
-        self.welcome_message_sent_to_room = []
-        self.rooms_pending = defaultdict(list)
+        self.received_events = dedup if dedup is not None else EventDeduplicator(DUPLICATES_CACHE_SIZE)
+        self.welcome_message_sent_to_room = EventDeduplicator(DUPLICATES_CACHE_SIZE)
+        self.room_state = RoomStateCache(client)
+        # Deliveries waiting for the state of their room
+        self.pending = PendingDeliveries(client, store, config)
         self.rooms_marked_for_deletion = {}
 
     async def decrypted_callback(self, room_id: str, event: RoomMessageText):
         if isinstance(event, RoomMessageText):
-            await self.message(self.client.rooms[room_id], event)
+            room = await self.room_state.ensure(room_id)
+            if not room:
+                logger.warning(f"Room {room_id} of decrypted event {event.event_id} not found, dropping event")
+                return
+            await self.message(room, event)
         else:
             logger.warning(f"Unknown event %s passed to decrypted_callback" % event)
 
@@ -73,9 +84,9 @@ class Callbacks(object):
         logger.warning(message)
 
         # Store for later
-        self.store.store_encrypted_event(event)
+        await self.store.store_encrypted_event(event)
 
-        waiting_for_keys = self.store.get_encrypted_events_for_user(event.sender)
+        waiting_for_keys = await self.store.get_encrypted_events_for_user(event.sender)
         logger.info(
             "Waiting to decrypt %s events from sender %s",
             len(waiting_for_keys), event.sender,
@@ -102,12 +113,6 @@ class Callbacks(object):
                 notice=True,
             )
 
-    def trim_duplicates_caches(self):
-        if len(self.received_events) > DUPLICATES_CACHE_SIZE:
-            self.received_events = self.received_events[:DUPLICATES_CACHE_SIZE]
-        if len(self.welcome_message_sent_to_room) > DUPLICATES_CACHE_SIZE:
-            self.welcome_message_sent_to_room = self.welcome_message_sent_to_room[:DUPLICATES_CACHE_SIZE]
-
     async def member(self, room: MatrixRoom, event: RoomMemberEvent) -> None:
         """Callback for when a room member event is received.
 
@@ -121,7 +126,6 @@ class Callbacks(object):
             # Don't react to anything in the logging room
             return
 
-        self.trim_duplicates_caches()
         if self.should_process(event.event_id) is False:
             return
         logger.debug(
@@ -135,18 +139,18 @@ class Callbacks(object):
         
         # If user left their primary communications room
         if event.membership == 'leave':
-            user = User.get_existing(self.store, event.sender)
+            user = await User.get_existing(self.store, event.sender)
             if user:
                 if user.room_id == room.room_id:
                     logger.info(f"User {user.user_id} left the primary communications channel room {room.room_id}. /"
                                 f"Unable to send messages to user until communications room is recreated.")
-                    user.update_communications_room(None)
+                    await user.update_communications_room(None)
             await self.check_marked_deletion()
             
         elif event.membership == 'join':
-            support = Support.get_existing(self.store, event.sender)
+            support = await Support.get_existing(self.store, event.sender)
             if not support:
-                support = Staff.get_existing(self.store, event.sender)
+                support = await Staff.get_existing(self.store, event.sender)
             if not support:
                 return
             
@@ -162,15 +166,15 @@ class Callbacks(object):
             if event.sender == self.client.user:
                 return
             # Get the user who invited the bot
-            room_creator = User.get_existing(self.store, room.creator)
+            room_creator = await User.get_existing(self.store, room.creator)
             if not room_creator:
                 # Create new User entry if doesn't exist yet
-                room_creator = User.create_new(self.store, room.creator)
+                room_creator = await User.create_new(self.store, room.creator)
 
             logger.info(f"Support bot invited by: {room_creator.user_id}")
 
             # Update User Communication room id
-            room_creator.update_communications_room(room.room_id)
+            await room_creator.update_communications_room(room.room_id)
             logger.debug(f"Set new communications room for user to: {room_creator.user_id}")
 
             # Send welcome message if configured
@@ -180,18 +184,17 @@ class Callbacks(object):
                 #    return
                 # Send welcome message
                 logger.info(f"Sending welcome message to room {room.room_id}")
-                self.welcome_message_sent_to_room.insert(0, room.room_id)
+                self.welcome_message_sent_to_room.add(room.room_id)
                 await send_text_to_room(self.client, room.room_id, self.config.welcome_message, True)
             else:
                 logger.info("Not sending welcome message - message not defined.")
 
             # Notify the management room for visibility
             logger.info(f"Notifying management room of room join to {room.room_id}")
-            await send_text_to_room(
+            await send_status_notice(
                 self.client,
                 self.config.management_room_id,
                 f"I have joined room {room.display_name} (`{room.room_id}`).",
-                True,
             )
         elif event.membership == 'join':
             # Only react to invites sent by us
@@ -199,7 +202,7 @@ class Callbacks(object):
                 logger.info(f"{event.sender} Membership join in room {room.room_id}")
                 return
             # Get the user who invited the bot
-            room_creator = User.get_existing(self.store, room.creator)
+            room_creator = await User.get_existing(self.store, room.creator)
             if not room_creator:
                 logger.info(f"Unknown user {room.creator} in room {room.room_id}")
                 return
@@ -217,18 +220,17 @@ class Callbacks(object):
                 #    return
                 # Send welcome message
                 logger.info(f"Sending welcome message to room {room.room_id}")
-                #self.welcome_message_sent_to_room.insert(0, room.room_id)
+                #self.welcome_message_sent_to_room.add(room.room_id)
                 await send_text_to_room(self.client, room.room_id, self.config.welcome_message, True)
             else:
                 logger.info("Not sending welcome message - message not defined.")
 
             # Notify the management room for visibility
             logger.info(f"Notifying management room of room join to {room.room_id}")
-            await send_text_to_room(
+            await send_status_notice(
                 self.client,
                 self.config.management_room_id,
                 f"I have received join event in room {room.display_name} (`{room.room_id}`).",
-                True,
             )
 
     async def check_marked_deletion(self) -> None:
@@ -243,8 +245,8 @@ class Callbacks(object):
                         logger.error(msg)
                         await send_text_to_room(self.client, self.config.matrix_logging_room, msg,)
                     else:
-                        chat:Chat = Chat.get_existing(self.store, room.room_id)
-                        chat.set_status(ChatStatus.DELETED)
+                        chat:Chat = await Chat.get_existing(self.store, room.room_id)
+                        await chat.set_status(ChatStatus.DELETED)
                         
                         msg = f"Deleted Chat {room.room_id}."
                         logger.info(msg)
@@ -260,45 +262,6 @@ class Callbacks(object):
             del self.rooms_marked_for_deletion[room_id]
 
 
-    async def check_awaited(self, response) -> None:
-        to_delete = []
-        for room_id in self.rooms_pending.keys():
-            if self.client.rooms.get(room_id, None) and room_id in self.client.encrypted_rooms:
-                for message_task in self.rooms_pending[room_id]:
-                    try:
-                        msg = f"Executing queued task for room {room_id}"
-                        logger.info(msg)
-                        if message_task[0] == send_text_to_room:
-                            await send_text_to_room(self.client, message_task[2], message_task[3])
-                        else:
-                            await message_task[0](self.client.rooms[message_task[2]], message_task[3])
-                    except Exception as e:
-                        logger.error(f"Error performing queued task after joining room: {e}")
-                to_delete.append(room_id)
-            else:
-                ts = int(time.time())
-                live_tasks = []
-                for message_task in self.rooms_pending[room_id]:
-                    # Check if room hasn't been fetched in the past 300 seconds
-                    if (ts-message_task[4]) >= 300:
-                        msg = (f"Task destined to room {message_task[2]} DROPPED due to not receiving encryption/room state for > 300s. DROPPING message from {message_task[3].sender} - {message_task[3].body}")
-                        try:
-                            logger.error(msg)
-                            await send_text_to_room(self.client, self.config.matrix_logging_room, msg)
-                        except Exception as e:
-                            logger.error(f"Exception thrown while sending error message: {room_id}")
-                    else:
-                        live_tasks.append(message_task)
-                        
-                if live_tasks == []:
-                    to_delete.append(room_id)
-                else:
-                    self.rooms_pending[room_id] = live_tasks
-        
-        for room_id in to_delete:
-            del self.rooms_pending[room_id]
-
-
     async def room_encryption(self, room: MatrixRoom, event: RoomEncryptionEvent) -> None:
         """Callback for when an event signaling that encryption has been enabled in a room is received
 
@@ -310,7 +273,7 @@ class Callbacks(object):
         ## Send all pending messages for the room when invited at least one user to the room (so encryption is initialized)
         logger.info(f"Room encryption enabled in room {room.room_id}")
         
-        await self.check_awaited(None)
+        await self.pending.wake(room.room_id)
     
     async def call_event(self, room: MatrixRoom, event: CallEvent):
         """Callback for when a m.call.invite event is received
@@ -332,7 +295,6 @@ class Callbacks(object):
             # Don't react to anything in the logging room
             return
 
-        self.trim_duplicates_caches()
         if self.should_process(event.event_id) is False:
             return
         
@@ -357,7 +319,6 @@ class Callbacks(object):
             # Don't react to anything in the logging room
             return
 
-        self.trim_duplicates_caches()
         if self.should_process(event.event_id) is False:
             return
         
@@ -395,7 +356,6 @@ class Callbacks(object):
             event (nio.events.room_events.RoomMessageText): The event defining the message
 
         """
-        await self.client.room_get_state(room.room_id)
         # If ignoring old messages, ignore messages older than 5 minutes
         if self.config.ignore_old_messages:
             if (
@@ -406,40 +366,30 @@ class Callbacks(object):
             # Don't react to anything in the logging room
             return
 
-        self.trim_duplicates_caches()
         if self.should_process(event.event_id) is False:
             return
-        
+
+        # Make sure the room state is known locally, only fetching it if sync has not delivered it yet
+        room = await self.room_state.ensure(room.room_id) or room
+
         await self._message(room, event)
 
     async def _message(self, room, event):
-        # Extract the message text
-        msg = event.body
-
         # Ignore messages from ourselves
         if event.sender == self.client.user:
             return
 
-        # If this looks like an edit, strip the edit prefix
-        if msg.startswith(" * "):
-            msg = msg[3:]
+        # Parsed once, shared by the message and command handlers
+        parsed = ParsedEvent(event, self.command_prefix)
 
         # Process as message if in a public room without command prefix
         # TODO Implement check of named commands using an array
-        has_command_prefix = msg.startswith(self.command_prefix) or msg.startswith("!message")
-
-        if has_command_prefix:
-            if msg.startswith("!message"):
-                msg = msg[1:]
-            else:
-                # Remove the command prefix
-                msg = msg[len(self.command_prefix):]
-
-            command = Command(self.client, self.store, self.config, msg, room, event)
+        if parsed.command is not None:
+            command = Command(self.client, self.store, self.config, parsed.command, room, event, parsed)
             await command.process()
         else:
             # General message listener
-            message = TextMessage(self.client, self.store, self.config, room, event, msg)
+            message = TextMessage(self.client, self.store, self.config, room, event, parsed.text, parsed)
             await message.process()
 
     async def media(self, room, event):
@@ -461,7 +411,6 @@ class Callbacks(object):
             # Don't react to anything in the logging room
             return
 
-        self.trim_duplicates_caches()
         if self.should_process(event.event_id) is False:
             return
 
@@ -472,24 +421,27 @@ class Callbacks(object):
         await self._media(room, event)
 
     async def _media(self, room, event):
+        parsed = ParsedEvent(event)
+        content = parsed.content
+
         # Extract media type
-        msgtype = event.source.get("content").get("msgtype")
+        msgtype = content.get("msgtype")
 
         # Extract media body
         body = event.body
 
         # Extract media url
-        media_url = event.source.get("content").get("url")
+        media_url = content.get("url")
 
         # Extract media file
-        media_file = event.source.get("content").get("file")
+        media_file = content.get("file")
 
         # Extract media info
-        media_info = event.source.get("content").get("info")
+        media_info = content.get("info")
 
         # General media listener
         media = Media(
-            self.client, self.store, self.config, room, event, msgtype, body, media_url, media_file, media_info
+            self.client, self.store, self.config, room, event, msgtype, body, media_url, media_file, media_info, parsed
         )
         await media.process()
 
@@ -513,20 +465,19 @@ class Callbacks(object):
             # Send welcome message
             try:
                 logger.info(f"Sending welcome message to room {room.room_id}")
-                task = (send_text_to_room, room.room_id, room.room_id, self.config.welcome_message, int(time.time()))
-                # Add the task to the room queue to be sent when room is loaded
-                self.client.callbacks.rooms_pending[task[1]] = [task]
+                # Queued to be sent when room is loaded
+                await self.pending.add(KIND_TEXT, room.room_id, room.room_id, text=self.config.welcome_message)
             except Exception as e:
                 logger.warning(f" Error while queueing welcome message: {e}")
-            #self.welcome_message_sent_to_room.insert(0, room.room_id)
+            #self.welcome_message_sent_to_room.add(room.room_id)
             #await send_text_to_room(self.client, room.room_id, self.config.welcome_message, True)
         else:
             logger.info("Not sending welcome message - message not defined.")
 
     async def room_key(self, event: RoomKeyEvent):
         """Callback for ToDevice events like room key events."""
-        events = self.store.get_encrypted_events(event.session_id)
-        waiting_for_keys = self.store.get_encrypted_events_for_user(event.sender)
+        events = await self.store.get_encrypted_events(event.session_id)
+        waiting_for_keys = await self.store.get_encrypted_events_for_user(event.sender)
         if len(events):
             log_func = logger.info
         else:
@@ -563,7 +514,7 @@ class Callbacks(object):
                 logger.info("Successfully decrypted stored event %s", decrypted.event_id)
                 parsed_event = Event.parse_event(decrypted.source)
                 logger.info("Parsed event: %s", parsed_event)
-                self.store.remove_encrypted_event(decrypted.event_id)
+                await self.store.remove_encrypted_event(decrypted.event_id)
                 # noinspection PyTypeChecker
                 await self.decrypted_callback(encrypted_event["room_id"], parsed_event)
             else:
@@ -583,8 +534,7 @@ class Callbacks(object):
 
     def should_process(self, event_id: str) -> bool:
         logger.debug("Callback received event: %s", event_id)
-        if event_id in self.received_events:
+        if not self.received_events.check_and_add(event_id):
             logger.debug("Skipping %s as it's already processed", event_id)
             return False
-        self.received_events.insert(0, event_id)
         return True
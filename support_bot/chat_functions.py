@@ -2,7 +2,6 @@ import logging
 from collections import defaultdict
 from typing import Any, List, Optional, Union, Dict, Iterator
 
-from commonmark import commonmark
 # noinspection PyPackageRequirements
 from nio import (
     ErrorResponse,
@@ -25,6 +24,8 @@ from nio import (
 )
 from nio.crypto import OlmDevice, InboundGroupSession, Session
 from support_bot.errors import RoomNotEncrypted, RoomNotFound, Errors
+from support_bot.markdown_renderer import renderer
+from support_bot.outbound import Lane
 #from support_bot.models.Ticket import Ticket
 
 #from support_bot.config import Config
@@ -37,7 +38,7 @@ _FilterT = Union[None, str, Dict[Any, Any]]
 
 async def send_text_to_room(
     client: AsyncClient, room: str, message: str, notice: bool = True, markdown_convert: bool = True,
-    reply_to_event_id: str = None, replaces_event_id: str = None,
+    reply_to_event_id: str = None, replaces_event_id: str = None, lane: Lane = None,
 ) -> Union[RoomSendResponse, RoomSendError, str]:
     """Send text to a matrix room
 
@@ -57,12 +58,18 @@ async def send_text_to_room(
         reply_to_event_id (str): Optional event ID that this message is a reply to.
 
         replaces_event_id (str): Optional event ID that this message replaces.
+
+        lane (Lane): Optional priority of the message, notices default to Lane.NOTICE and
+            other messages to Lane.RELAY
     """
     try:
         room_id = await get_room_id(client, room, logger)
     except ValueError as ex:
         return str(ex)
 
+    if lane is None:
+        lane = Lane.NOTICE if notice else Lane.RELAY
+
     # Determine whether to ping room members or not
     msgtype = "m.notice" if notice else "m.text"
 
@@ -72,8 +79,11 @@ async def send_text_to_room(
         "body": message,
     }
 
+    formatted_body = None
     if markdown_convert:
-        content["formatted_body"] = commonmark(message)
+        # Rendered once, an edit carries the same body twice
+        formatted_body = await renderer.render_async(message)
+        content["formatted_body"] = formatted_body
 
     if replaces_event_id:
         content["m.relates_to"] = {
@@ -86,7 +96,7 @@ async def send_text_to_room(
             "body": message,
         }
         if markdown_convert:
-            content["m.new_content"]["formatted_body"] = commonmark(message)
+            content["m.new_content"]["formatted_body"] = formatted_body
     # We don't store the original message content so cannot provide the fallback, unfortunately
     elif reply_to_event_id:
         content["m.relates_to"] = {
@@ -96,7 +106,7 @@ async def send_text_to_room(
         }
 
     try:
-        return await client.room_send(
+        response = await with_ratelimit(client.room_send, lane)(
             room_id,
             "m.room.message",
             content,
@@ -106,9 +116,29 @@ async def send_text_to_room(
         logger.exception(f"Unable to send message response to {room_id}")
         return f"Failed to send message: {ex}"
 
+    # Replies to the message are usually looked up before it comes back in a sync
+    event_cache = getattr(client, "event_cache", None)
+    if event_cache is not None and isinstance(response, RoomSendResponse):
+        event_cache.add_sent(room_id, response.event_id, "m.room.message", content)
+    return response
+
+
+async def send_status_notice(
+    client: AsyncClient, room: str, message: str,
+) -> Union[RoomSendResponse, RoomSendError, str, None]:
+    """Send a low value status notice, through the notice digest if enabled and the room is the management room
+
+    Returns None if the notice was queued for the digest.
+    """
+    digest = getattr(client, "notice_digest", None)
+    if digest and room == digest.config.management_room_id:
+        digest.add(message)
+        return None
+    return await send_text_to_room(client, room, message, True)
+
 
 async def send_room_redact(client: AsyncClient, room_id: str, redacts_event_id: str, reason:str):
-    return await client.room_redact(
+    return await with_ratelimit(client.room_redact, Lane.RELAY)(
             room_id,
             redacts_event_id,
             reason,
@@ -142,7 +172,7 @@ async def send_reaction(
     }
 
     try:
-        return await client.room_send(
+        return await with_ratelimit(client.room_send, Lane.NOTICE)(
             room_id,
             "m.reaction",
             content,
@@ -208,7 +238,7 @@ async def send_media_to_room(
         }
 
     try:
-        return await client.room_send(
+        return await with_ratelimit(client.room_send, Lane.RELAY)(
             room_id,
             "m.room.message",
             content,
@@ -258,11 +288,15 @@ def is_room_private_msg(room: MatrixRoom, mxid: str) -> bool:
 def find_private_msg(client:AsyncClient, mxid: str) -> MatrixRoom:
     # Find if we already have a common room with user (Which is not a ticket room):
     msg_room = None
-    for roomid in client.rooms:
-        room = client.rooms[roomid]
-        if is_room_private_msg(room, mxid):
-            msg_room = room
-            break
+    dm_index = getattr(client, "dm_index", None)
+    if dm_index is not None:
+        msg_room = dm_index.find(mxid)
+    else:
+        for roomid in client.rooms:
+            room = client.rooms[roomid]
+            if is_room_private_msg(room, mxid):
+                msg_room = room
+                break
 
     if msg_room:
         logger.debug(f"Found existing DM for user {mxid} with roomID: {msg_room.room_id}")
@@ -316,7 +350,7 @@ async def delete_room(client: AsyncClient, room_id:str) -> Optional[ErrorRespons
     if room.invited_count != 0:
         return ErrorResponse(f"Room {room_id} has pending invites: {', '.join(room.invited_users.keys())}", Errors.LOGIC_CHECK)
     
-    response = await client.room_leave(room_id)
+    response = await with_ratelimit(client.room_leave)(room_id)
     if isinstance(response, RoomLeaveError):
         logger.error(f"Failed to leave room: {response}")
         return ErrorResponse(f"Failed to leave Room {room_id}: {response}", Errors.EXCEPTION)
@@ -522,12 +556,19 @@ async def get_room_messages(client: AsyncClient, room_id:str, limit=10, start:st
     
     return resp
 
+async def get_event(client: AsyncClient, room_id: str, event_id: str) -> Union[RoomGetEventResponse, RoomGetEventError]:
+    """Get an event of a room, from the event cache if enabled, otherwise from the homeserver"""
+    event_cache = getattr(client, "event_cache", None)
+    if event_cache is not None:
+        return await event_cache.get_event(room_id, event_id)
+    return await client.room_get_event(room_id, event_id)
+
 async def get_rx_id_from_reply(client:AsyncClient, room_id:str, reply_to: str):
     if reply_to is None or room_id is None:
         return None
     
     # Fetch reply event
-    resp = await client.room_get_event(room_id, reply_to)
+    resp = await get_event(client, room_id, reply_to)
     if isinstance(resp, RoomGetEventError):
         logger.warning(f"Failed to fetch reply event for room {room_id} reply_to {reply_to}: {resp.status_code}, {resp.message}")
     elif isinstance(resp, RoomGetEventResponse):
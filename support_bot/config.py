@@ -7,6 +7,8 @@ from typing import Any, List
 import yaml
 
 from support_bot.errors import ConfigError
+from support_bot.retention import DEFAULT_POLICIES as DEFAULT_RETENTION_POLICIES
+from support_bot.storage import sqlite_profile
 
 # Prevent debug messages from peewee lib
 logger = logging.getLogger()
@@ -85,6 +87,37 @@ class Config(object):
         else:
             raise ConfigError("Invalid connection string for storage.database")
 
+        self.database["pool_size"] = self._get_cfg(["storage", "pool_size"], required=False, default=4)
+        self.database["prepared_statements"] = self._get_cfg(
+            ["storage", "prepared_statements"], required=False, default=True,
+        )
+        self.database["write_buffer"] = self._get_cfg(
+            ["storage", "write_buffer", "enabled"], required=False, default=True,
+        )
+        self.database["write_buffer_flush_interval"] = self._get_cfg(
+            ["storage", "write_buffer", "flush_interval_ms"], required=False, default=50,
+        ) / 1000
+        self.database["write_buffer_max_batch"] = self._get_cfg(
+            ["storage", "write_buffer", "max_batch"], required=False, default=100,
+        )
+        self.database["model_cache_size"] = self._get_cfg(
+            ["storage", "model_cache", "max_size"], required=False, default=10000,
+        )
+        self.database["model_cache_ttl"] = self._get_cfg(
+            ["storage", "model_cache", "ttl_seconds"], required=False, default=300,
+        )
+        self.database["model_cache_negative_ttl"] = self._get_cfg(
+            ["storage", "model_cache", "negative_ttl_seconds"], required=False, default=30,
+        )
+
+        # SQLite performance profile, any pragma left out keeps its default
+        sqlite_config = dict(self._get_cfg(["storage", "sqlite"], required=False, default={}))
+        self.database["maintenance_interval"] = sqlite_config.pop("maintenance_interval", 3600)
+        try:
+            self.database["sqlite"] = sqlite_profile(sqlite_config)
+        except ValueError as e:
+            raise ConfigError(f"storage.sqlite: {e}")
+
         # Matrix bot account setup
         self.user_id = self._get_cfg(["matrix", "user_id"], required=True)
         if not re.match("@.*:.*", self.user_id):
@@ -140,6 +173,51 @@ class Config(object):
         self.relay_management_media = self._get_cfg(["support_bot", "relay_management_media"], required=False, default=False)
         self.ignore_old_messages = self._get_cfg(["ignore_old_messages"], default=False)
 
+        # Duplicate event detection
+        self.event_dedup_capacity = self._get_cfg(["event_dedup", "capacity"], required=False, default=1000)
+        self.event_dedup_persist = self._get_cfg(["event_dedup", "persist"], required=False, default=True)
+
+        # Event dispatching
+        self.dispatcher_concurrency = self._get_cfg(["dispatcher", "concurrency"], required=False, default=8)
+        self.dispatcher_max_room_queue = self._get_cfg(["dispatcher", "max_room_queue"], required=False, default=1000)
+        self.dispatcher_max_queued = self._get_cfg(["dispatcher", "max_queued"], required=False, default=10000)
+        self.dispatcher_stats_interval = self._get_cfg(["dispatcher", "stats_interval_seconds"], required=False, default=300)
+
+        # Outbound request scheduler
+        self.outbound_rate = self._get_cfg(["outbound", "rate"], required=False, default=10)
+        self.outbound_burst = self._get_cfg(["outbound", "burst"], required=False, default=20)
+        self.outbound_concurrency = self._get_cfg(["outbound", "concurrency"], required=False, default=4)
+        self.outbound_max_queued = self._get_cfg(["outbound", "max_queued"], required=False, default=1000)
+
+        # Membership requests of bulk kicks and invites (closing, reopening, unassigning) in flight at the same time
+        self.membership_concurrency = self._get_cfg(["outbound", "membership_concurrency"], required=False, default=8)
+
+        # Recently synced and sent events, looked up instead of fetching them
+        self.event_cache_max_events = self._get_cfg(["event_cache", "max_events"], required=False, default=2048)
+        self.event_cache_max_bytes = self._get_cfg(["event_cache", "max_kilobytes"], required=False, default=8192) * 1024
+
+        # Management room notice digest
+        self.notice_digest_enabled = self._get_cfg(["notice_digest", "enabled"], required=False, default=False)
+        self.notice_digest_window = self._get_cfg(["notice_digest", "window_minutes"], required=False, default=60) * 60
+        self.notice_digest_interval = self._get_cfg(["notice_digest", "interval_seconds"], required=False, default=10)
+        self.notice_digest_max_lines = self._get_cfg(["notice_digest", "max_lines"], required=False, default=50)
+
+        # Retention of bookkeeping rows
+        self.retention_enabled = self._get_cfg(["retention", "enabled"], required=False, default=True)
+        self.retention_interval = self._get_cfg(["retention", "interval_minutes"], required=False, default=60) * 60
+        self.retention_batch_size = self._get_cfg(["retention", "batch_size"], required=False, default=500)
+        self.retention_batch_pause = self._get_cfg(["retention", "batch_pause_ms"], required=False, default=50) / 1000
+        self.retention_analyze = self._get_cfg(["retention", "analyze"], required=False, default=True)
+        self.retention_vacuum = self._get_cfg(["retention", "vacuum"], required=False, default=False)
+        self.retention_policies = self._get_cfg(["retention", "tables"], required=False, default={})
+        unknown_tables = set(self.retention_policies) - set(DEFAULT_RETENTION_POLICIES)
+        if unknown_tables:
+            raise ConfigError(f"Unknown retention.tables: {', '.join(sorted(unknown_tables))}")
+        # Also kept as incoming events are stored, not only by the retention job
+        self.incoming_events_max_per_user = {
+            **DEFAULT_RETENTION_POLICIES["incoming_events"], **(self.retention_policies.get("incoming_events") or {}),
+        }["max_per_user"] or 0
+
     def _get_cfg(
         self, path: List[str], default: Any = None, required: bool = True,
     ) -> Any:
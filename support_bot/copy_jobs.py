@@ -0,0 +1,261 @@
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import Deque, Dict, Set
+
+# noinspection PyPackageRequirements
+from nio import (
+    AsyncClient,
+    RoomEncryptedMedia,
+    RoomGetEventResponse,
+    RoomMessageFormatted,
+    RoomMessageMedia,
+    RoomMessageNotice,
+    RoomMessageText,
+    SyncResponse,
+)
+
+from support_bot.chat_functions import get_event, send_text_to_room
+from support_bot.models.EventPairs import EventPair
+from support_bot.models.IncomingEvent import IncomingEvent
+from support_bot.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Events read, and fetched from the homeserver ahead of being sent, at a time
+DEFAULT_PAGE_SIZE = 32
+DEFAULT_FETCH_CONCURRENCY = 4
+# Seconds a job waits for the ticket room to arrive in a sync
+DEFAULT_ROOM_TIMEOUT = 300.0
+
+
+class CopyJob(object):
+    __slots__ = ("id", "ticket_id", "user_id", "room_id", "report_room_id", "copied", "failed")
+
+    def __init__(self, id: int, ticket_id: int, user_id: str, room_id: str, report_room_id: str, copied: int = 0, failed: int = 0):
+        self.id = id
+        self.ticket_id = ticket_id
+        self.user_id = user_id
+        # The ticket room the events are copied to
+        self.room_id = room_id
+        # The room the ticket was raised from, told about events that couldn't be copied
+        self.report_room_id = report_room_id
+        self.copied = copied
+        self.failed = failed
+
+
+class CopyJobs(object):
+    def __init__(
+        self,
+        client: AsyncClient,
+        store: Storage,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY,
+        room_timeout: float = DEFAULT_ROOM_TIMEOUT,
+    ):
+        """Background jobs copying the messages a user sent before a ticket was raised to the ticket room
+
+        A job sends the incoming events of the user in the order they were received. Events
+        are rebuilt from their stored snapshot, those without one are fetched from the
+        homeserver in parallel, `fetch_concurrency` at a time, and all are sent one by one in
+        order as they become available. Each incoming event is deleted once sent, and the job
+        is stored in the database until done, so a job interrupted by a restart resumes with
+        the first event not sent yet after the first sync. A user has one job running at a
+        time, jobs started meanwhile wait for it to complete.
+
+        Args:
+            client (nio.AsyncClient): nio client used to fetch and send the events
+
+            store (Storage): Storage the jobs and incoming events are kept in
+
+            page_size (int): Number of incoming events read at a time
+
+            fetch_concurrency (int): Maximum number of events fetched at the same time
+
+            room_timeout (float): Number of seconds a job waits for its ticket room to be synced
+        """
+        self.client = client
+        self.store = store
+        self.page_size = max(1, int(page_size))
+        self.fetch_concurrency = max(1, int(fetch_concurrency))
+        self.room_timeout = room_timeout
+
+        self._running: Dict[str, asyncio.Task] = {}
+        self._waiting: Dict[str, Deque[CopyJob]] = defaultdict(deque)
+        self._known: Set[int] = set()
+        self._synced = asyncio.Event()
+        self._resumed = False
+
+        # Counters
+        self.started = 0
+        self.resumed = 0
+        self.completed = 0
+        self.restored = 0
+        self.fetched = 0
+
+    async def start(self, ticket_id: int, user_id: str, room_id: str, report_room_id: str) -> CopyJob:
+        """Store a job copying the incoming events of a user to a ticket room and start it
+
+        The job waits if a job is already copying the events of the user.
+        """
+        job_id = await self.store.repositories.copyJobsRep.create_job(ticket_id, user_id, room_id, report_room_id)
+        job = CopyJob(job_id, ticket_id, user_id, room_id, report_room_id)
+        self.started += 1
+        if user_id in self._running:
+            msg = f"Messages {user_id} sent before Ticket {ticket_id} was raised will be copied " \
+                  f"once the copy job running for the user is done"
+            logger.info(msg)
+            await send_text_to_room(self.client, room_id, msg)
+        self._schedule(job)
+        return job
+
+    def _schedule(self, job: CopyJob):
+        self._known.add(job.id)
+        if job.user_id in self._running:
+            self._waiting[job.user_id].append(job)
+        else:
+            self._running[job.user_id] = asyncio.ensure_future(self.run(job))
+
+    async def resume(self):
+        """Start the jobs stored by a previous run of the bot"""
+        for row in await self.store.repositories.copyJobsRep.get_jobs():
+            job = CopyJob(**row)
+            if job.id in self._known:
+                continue
+            logger.info(f"Resuming the copy of the messages of {job.user_id} to ticket {job.ticket_id}")
+            self.resumed += 1
+            self._schedule(job)
+
+    async def sync(self, response: SyncResponse):
+        """Callback for sync responses, resuming the stored jobs after the first sync"""
+        self._synced.set()
+        self._synced.clear()
+        if not self._resumed:
+            self._resumed = True
+            await self.resume()
+
+    async def _wait_for_room(self, room_id: str) -> bool:
+        async def synced():
+            while room_id not in self.client.rooms:
+                await self._synced.wait()
+
+        try:
+            await asyncio.wait_for(synced(), self.room_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self, job: CopyJob):
+        completed = False
+        try:
+            # Events are sent by processing them again, which needs the ticket room
+            if not await self._wait_for_room(job.room_id):
+                msg = f"Ticket room {job.room_id} of ticket {job.ticket_id} did not arrive in time, " \
+                      f"the messages of {job.user_id} will be copied after a restart"
+                logger.warning(msg)
+                await send_text_to_room(self.client, job.report_room_id, msg)
+                return
+
+            await self._copy(job)
+            await self.store.repositories.copyJobsRep.delete_job(job.id)
+            self.completed += 1
+            completed = True
+            await self._report(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Copy job {job.id} of ticket {job.ticket_id} failed, it resumes after a restart")
+        finally:
+            self._running.pop(job.user_id, None)
+            self._known.discard(job.id)
+            # Jobs waiting behind one that didn't complete run after a restart, keeping the order
+            waiting = self._waiting.get(job.user_id)
+            if waiting and completed:
+                self._schedule(waiting.popleft())
+            if not waiting:
+                self._waiting.pop(job.user_id, None)
+
+    async def _copy(self, job: CopyJob):
+        slots = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def fetch(incoming: IncomingEvent):
+            # Events stored with a snapshot need no request
+            event = incoming.restore()
+            if event is not None:
+                self.restored += 1
+                response = RoomGetEventResponse()
+                response.event = event
+                return response
+            async with slots:
+                self.fetched += 1
+                return await get_event(self.client, incoming.room_id, incoming.event_id)
+
+        while True:
+            page = await IncomingEvent.get_oldest_incoming_events(self.store, job.user_id, self.page_size)
+            if not page:
+                return
+
+            fetches = [asyncio.ensure_future(fetch(incoming)) for incoming in page]
+            try:
+                for incoming, fetched in zip(page, fetches):
+                    if await self._send(job, incoming, await fetched):
+                        job.copied += 1
+                    else:
+                        job.failed += 1
+                    # The checkpoint, a resumed job starts with the next event
+                    await incoming.delete()
+            finally:
+                for fetched in fetches:
+                    fetched.cancel()
+            await self.store.repositories.copyJobsRep.update_progress(job.id, job.copied, job.failed)
+
+    async def _send(self, job: CopyJob, incoming: IncomingEvent, response) -> bool:
+        # Delete old paired events to prevent original message being tied to different clones
+        await EventPair.delete_event(self.store, incoming.room_id, incoming.event_id)
+
+        if not isinstance(response, RoomGetEventResponse):
+            logger.warning(f"Failed to get event {incoming.event_id} from user {incoming.user_id} in room {incoming.room_id}. "
+                           f"Event was not copied to ticket {job.ticket_id}: {response}")
+            return False
+
+        if isinstance(response.event, (RoomMessageText, RoomMessageNotice, RoomMessageFormatted)):
+            process = self.client.callbacks._message
+        elif isinstance(response.event, (RoomMessageMedia, RoomEncryptedMedia)):
+            process = self.client.callbacks._media
+        else:
+            # Not a message, nothing to copy
+            return True
+
+        room = self.client.rooms.get(incoming.room_id)
+        if room is None:
+            logger.warning(f"Room {incoming.room_id} of event {incoming.event_id} is not known, "
+                           f"event was not copied to ticket {job.ticket_id}")
+            return False
+
+        await process(room, response.event)
+        return True
+
+    async def _report(self, job: CopyJob):
+        if not job.copied and not job.failed:
+            return
+        msg = f"Copied {job.copied} messages {job.user_id} sent before Ticket {job.ticket_id} was raised."
+        if job.failed:
+            msg += f" {job.failed} messages could not be copied."
+            await send_text_to_room(self.client, job.report_room_id, msg)
+        await send_text_to_room(self.client, job.room_id, msg)
+
+    async def join(self):
+        """Wait for the running jobs and the jobs waiting for them, e.g. in tests"""
+        while self._running:
+            await asyncio.gather(*list(self._running.values()), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "waiting": sum(len(waiting) for waiting in self._waiting.values()),
+            "started": self.started,
+            "resumed": self.resumed,
+            "completed": self.completed,
+            "restored": self.restored,
+            "fetched": self.fetched,
+        }
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Tuple
+
+# noinspection PyPackageRequirements
+from nio import MatrixRoom
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_ROOM_QUEUE = 1000
+DEFAULT_MAX_QUEUED = 10000
+
+_Task = Tuple[Callable[..., Awaitable], tuple, float]
+
+
+class EventDispatcher(object):
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_room_queue: int = DEFAULT_MAX_ROOM_QUEUE,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+    ):
+        """Runs event callbacks outside of the sync loop
+
+        Events are queued per room and every room queue is drained by its own worker, so
+        events of one room are processed in the order they were received, while
+        independent rooms progress in parallel. At most `concurrency` callbacks run at the
+        same time.
+
+        When a room queue, or all queues together, are full, enqueueing waits for space.
+        This pauses sync processing, pushing back on the homeserver.
+
+        Args:
+            concurrency (int): Maximum number of callbacks running at the same time
+
+            max_room_queue (int): Maximum number of queued events per room
+
+            max_queued (int): Maximum number of queued events over all rooms
+        """
+        self.concurrency = concurrency
+        self.max_room_queue = max_room_queue
+        self.max_queued = max_queued
+
+        self._queues: Dict[str, Deque[_Task]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._space = asyncio.Condition()
+        self._queued = 0
+
+        # Counters
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def wrap(self, callback: Callable[[MatrixRoom, object], Awaitable]) -> Callable[[MatrixRoom, object], Awaitable]:
+        """Turn a nio room event callback into an enqueue operation on the room's queue"""
+        async def enqueue_callback(room: MatrixRoom, event):
+            await self.enqueue(room.room_id, callback, room, event)
+
+        return enqueue_callback
+
+    def _has_space(self, room_id: str) -> bool:
+        queue = self._queues.get(room_id)
+        room_queued = len(queue) if queue else 0
+        return room_queued < self.max_room_queue and self._queued < self.max_queued
+
+    async def enqueue(self, room_id: str, callback: Callable[..., Awaitable], *args):
+        if not self._has_space(room_id):
+            self.backpressure_waits += 1
+            logger.warning(
+                f"Event queue full for room {room_id} ({self._queued} events queued in total), waiting for space"
+            )
+            async with self._space:
+                await self._space.wait_for(lambda: self._has_space(room_id))
+
+        queue = self._queues.setdefault(room_id, deque())
+        queue.append((callback, args, time.monotonic()))
+        self._queued += 1
+        self.enqueued += 1
+
+        if room_id not in self._workers:
+            self._workers[room_id] = asyncio.ensure_future(self._drain(room_id))
+
+    async def _drain(self, room_id: str):
+        queue = self._queues[room_id]
+        try:
+            while queue:
+                callback, args, enqueued_at = queue.popleft()
+                self._queued -= 1
+                async with self._space:
+                    self._space.notify_all()
+
+                async with self._semaphore:
+                    wait = time.monotonic() - enqueued_at
+                    self.total_wait += wait
+                    self.max_wait = max(self.max_wait, wait)
+                    try:
+                        await callback(*args)
+                    except Exception as e:
+                        self.failed += 1
+                        logger.exception(f"Error processing event callback {callback.__name__} in room {room_id}: {e}")
+                    finally:
+                        self.processed += 1
+        finally:
+            del self._workers[room_id]
+            if not queue:
+                del self._queues[room_id]
+
+    def queue_depths(self, limit: int = 5) -> Dict[str, int]:
+        """Number of queued events of the rooms with the most, at most `limit` rooms"""
+        deepest = sorted(self._queues.items(), key=lambda item: len(item[1]), reverse=True)[:limit]
+        return {room_id: len(queue) for room_id, queue in deepest if queue}
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queued,
+            "active_rooms": len(self._workers),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "backpressure_waits": self.backpressure_waits,
+            "avg_wait": self.total_wait / self.processed if self.processed else 0.0,
+            "max_wait": self.max_wait,
+            "deepest_rooms": self.queue_depths(),
+        }
+
+    async def log_stats(self, interval: float):
+        """Periodically log the stats, until cancelled"""
+        if not interval:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"Event dispatcher: {self.stats()}")
+
+    async def join(self):
+        """Wait until all queued events are processed"""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
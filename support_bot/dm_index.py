@@ -0,0 +1,115 @@
+import logging
+from typing import Dict, FrozenSet, Iterable, Optional
+
+# noinspection PyPackageRequirements
+from nio import AsyncClient, MatrixRoom, RoomMemberEvent, SyncResponse
+
+logger = logging.getLogger(__name__)
+
+
+def _is_private_msg(room: MatrixRoom, mxid: str) -> bool:
+    return room.member_count == 2 and (mxid in room.users or mxid in room.invited_users)
+
+
+class DirectRoomIndex(object):
+    def __init__(self, client: AsyncClient):
+        """Direct message rooms of the bot, by user id
+
+        A room is a direct message room of a user while it has two members (joined or
+        invited) and the user is one of them. Rooms are indexed again from the local state
+        in `client.rooms` whenever a sync delivers them or a member event arrives for them,
+        so finding the DM room of a user never scans all rooms.
+
+        Args:
+            client (nio.AsyncClient): nio client whose rooms are indexed
+        """
+        self.client = client
+        # Insertion ordered, the first room indexed for a user is returned first
+        self._rooms_of_user: Dict[str, Dict[str, None]] = {}
+        self._members_of_room: Dict[str, FrozenSet[str]] = {}
+
+        # Counters
+        self.lookups = 0
+        self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self._members_of_room)
+
+    def rebuild(self):
+        """Index all rooms in `client.rooms` from scratch"""
+        self._rooms_of_user.clear()
+        self._members_of_room.clear()
+        self.update_rooms(self.client.rooms.keys())
+        logger.info(f"Direct message index built, {len(self._members_of_room)} DM rooms of {len(self._rooms_of_user)} users")
+
+    def update_rooms(self, room_ids: Iterable[str]):
+        for room_id in room_ids:
+            room = self.client.rooms.get(room_id)
+            if room:
+                self.update_room(room)
+            else:
+                self.forget_room(room_id)
+
+    def update_room(self, room: MatrixRoom):
+        """Index a room again from its local state"""
+        self.updates += 1
+        members: FrozenSet[str] = frozenset()
+        if room.member_count == 2:
+            # The bot itself is a member of every DM room, leave it out
+            members = frozenset(room.users).union(room.invited_users) - {self.client.user_id}
+
+        previous = self._members_of_room.get(room.room_id, frozenset())
+        if members == previous:
+            return
+
+        self._remove(room.room_id, previous - members)
+        for user_id in members - previous:
+            self._rooms_of_user.setdefault(user_id, {})[room.room_id] = None
+
+        if members:
+            self._members_of_room[room.room_id] = members
+        else:
+            self._members_of_room.pop(room.room_id, None)
+
+    def forget_room(self, room_id: str):
+        self._remove(room_id, self._members_of_room.pop(room_id, frozenset()))
+
+    def _remove(self, room_id: str, user_ids: Iterable[str]):
+        for user_id in user_ids:
+            rooms = self._rooms_of_user.get(user_id)
+            if rooms is None:
+                continue
+            rooms.pop(room_id, None)
+            if not rooms:
+                del self._rooms_of_user[user_id]
+
+    def find(self, mxid: str) -> Optional[MatrixRoom]:
+        """The direct message room of a user, None if the bot has none"""
+        self.lookups += 1
+        for room_id in list(self._rooms_of_user.get(mxid, ())):
+            room = self.client.rooms.get(room_id)
+            if room and _is_private_msg(room, mxid):
+                return room
+            # Changed without the index noticing, e.g. a room left outside of sync
+            if room:
+                self.update_room(room)
+            else:
+                self.forget_room(room_id)
+        return None
+
+    async def member(self, room: MatrixRoom, event: RoomMemberEvent):
+        """Callback for member events, nio has applied the event to the room already"""
+        self.update_room(room)
+
+    async def sync(self, response: SyncResponse):
+        """Callback for sync responses, indexing the rooms the sync delivered"""
+        rooms = response.rooms
+        self.update_rooms(list(rooms.join) + list(rooms.invite) + list(rooms.leave))
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._members_of_room),
+            "users": len(self._rooms_of_user),
+            "lookups": self.lookups,
+            "updates": self.updates,
+        }
@@ -0,0 +1,133 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+
+# noinspection PyPackageRequirements
+from nio import (
+    AsyncClient,
+    BadEvent,
+    Event,
+    MegolmEvent,
+    RedactionEvent,
+    RoomGetEventError,
+    RoomGetEventResponse,
+    SyncResponse,
+    UnknownBadEvent,
+)
+
+DEFAULT_MAX_EVENTS = 2048
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+
+def _size(event: Event) -> int:
+    # Size of the source as JSON, close enough to the memory it takes
+    return len(json.dumps(event.source, separators=(",", ":")))
+
+
+class EventCache(object):
+    def __init__(self, client: AsyncClient, max_events: int = DEFAULT_MAX_EVENTS, max_bytes: int = DEFAULT_MAX_BYTES):
+        """Recent timeline events, so the bot doesn't fetch events it has already seen
+
+        Events are added from the timelines of every sync, already decrypted, and from the
+        messages the bot sends. The least recently used events are dropped when more than
+        `max_events` are kept or their sources take more than `max_bytes`. Redacted events
+        are dropped when their redaction arrives. Events not kept are fetched from the
+        homeserver by `get_event`, and kept.
+
+        Args:
+            client (nio.AsyncClient): nio client used to fetch the events not kept
+
+            max_events (int): Maximum number of events kept
+
+            max_bytes (int): Maximum total size of the sources of the events kept
+        """
+        self.client = client
+        self.max_events = max(1, int(max_events))
+        self.max_bytes = max_bytes
+
+        self._events: OrderedDict[str, Tuple[str, Event, int]] = OrderedDict()
+        self._bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def add(self, room_id: str, event: Event):
+        # Events that couldn't be decrypted or parsed are fetched again when needed
+        if isinstance(event, (MegolmEvent, BadEvent, UnknownBadEvent)) or not getattr(event, "event_id", None):
+            return
+        size = _size(event)
+        if size > self.max_bytes:
+            return
+
+        self.discard(event.event_id)
+        self._events[event.event_id] = (room_id, event, size)
+        self._bytes += size
+        while len(self._events) > self.max_events or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._events.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def get(self, room_id: str, event_id: str) -> Optional[Event]:
+        entry = self._events.get(event_id)
+        if entry is None or entry[0] != room_id:
+            self.misses += 1
+            return None
+        self._events.move_to_end(event_id)
+        self.hits += 1
+        return entry[1]
+
+    def add_sent(self, room_id: str, event_id: str, event_type: str, content: dict):
+        """Add an event the bot sent, before it comes back in a sync"""
+        event = Event.parse_event({
+            "type": event_type,
+            "event_id": event_id,
+            "sender": self.client.user_id,
+            "origin_server_ts": int(time.time() * 1000),
+            "room_id": room_id,
+            "content": content,
+        })
+        self.add(room_id, event)
+
+    async def get_event(self, room_id: str, event_id: str) -> Union[RoomGetEventResponse, RoomGetEventError]:
+        """Get an event of a room, from the homeserver only if it isn't kept
+
+        Returns the same responses as `AsyncClient.room_get_event`.
+        """
+        event = self.get(room_id, event_id)
+        if event is not None:
+            response = RoomGetEventResponse()
+            response.event = event
+            return response
+
+        response = await self.client.room_get_event(room_id, event_id)
+        if isinstance(response, RoomGetEventResponse):
+            self.add(room_id, response.event)
+        return response
+
+    def discard(self, event_id: str):
+        entry = self._events.pop(event_id, None)
+        if entry:
+            self._bytes -= entry[2]
+
+    async def sync(self, response: SyncResponse):
+        """Callback for sync responses, adding the timeline events of the joined rooms"""
+        for room_id, room_info in response.rooms.join.items():
+            for event in room_info.timeline.events:
+                if isinstance(event, RedactionEvent):
+                    self.discard(event.redacts)
+                else:
+                    self.add(room_id, event)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._events),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
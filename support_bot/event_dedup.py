@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 1000
+
+
+class EventDeduplicator(object):
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, persist_path: Optional[str] = None):
+        """Bounded set of recently seen event IDs
+
+        Membership checks and insertions are O(1). Once the capacity is reached the
+        oldest seen ID is evicted first.
+
+        Args:
+            capacity (int): Maximum number of event IDs to remember
+
+            persist_path (str): Optional file path the most recent IDs are saved to and
+                restored from, so a restart does not process the same events twice
+        """
+        self.capacity = max(1, int(capacity))
+        self.persist_path = persist_path
+        self._seen: OrderedDict = OrderedDict()
+        self._dirty = False
+
+        # Counters
+        self.hits = 0
+        self.evictions = 0
+
+    def __contains__(self, event_id: str) -> bool:
+        return event_id in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def add(self, event_id: str):
+        """Remember an event ID, evicting the oldest ones if over capacity"""
+        if event_id in self._seen:
+            return
+        self._seen[event_id] = None
+        self._dirty = True
+        while len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+            self.evictions += 1
+
+    def check_and_add(self, event_id: str) -> bool:
+        """Returns True if the event ID was not seen before, remembering it."""
+        if event_id in self._seen:
+            self.hits += 1
+            return False
+        self.add(event_id)
+        return True
+
+    def extend(self, event_ids: Iterable[str]):
+        for event_id in event_ids:
+            self.add(event_id)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._seen),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "evictions": self.evictions,
+        }
+
+    def load(self):
+        """Restore the persisted event IDs, if any"""
+        if not self.persist_path or not os.path.isfile(self.persist_path):
+            return
+        try:
+            with open(self.persist_path) as f:
+                event_ids = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to load persisted event IDs from {self.persist_path}: {e}")
+            return
+        self.extend(event_ids)
+        self._dirty = False
+        logger.info(f"Restored {len(self._seen)} processed event IDs from {self.persist_path}")
+
+    def save(self):
+        """Persist the event IDs, oldest first. Does nothing if nothing changed."""
+        if not self.persist_path or not self._dirty:
+            return
+        tmp_path = f"{self.persist_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(list(self._seen.keys()), f)
+            os.replace(tmp_path, self.persist_path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"Failed to persist processed event IDs to {self.persist_path}: {e}")
+
+    async def save_on_sync(self, response):
+        """Response callback persisting the event IDs after every sync, next to the sync token"""
+        self.save()
+        logger.debug("Event deduplication stats: %s", self.stats())
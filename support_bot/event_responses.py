@@ -1,9 +1,8 @@
 import logging
-import time
 from typing import Tuple, Union
 
 # noinspection PyPackageRequirements
-from nio import AsyncClient, RoomMessage, RoomGetEventResponse
+from nio import AsyncClient, RoomMessage
 from nio.rooms import MatrixRoom
 
 from support_bot.config import Config
@@ -12,13 +11,14 @@ from support_bot.handlers.MessagingHandler import MessagingHandler
 from support_bot.models.EventPairs import EventPair
 from support_bot.models.IncomingEvent import IncomingEvent
 from support_bot.storage import Storage
-from support_bot.utils import _get_reply_msg, get_in_reply_to, get_replaces
+from support_bot.parsed_event import ParsedEvent
+from support_bot.pending_deliveries import KIND_MESSAGE
 
 logger = logging.getLogger(__name__)
 
 
 class Message(object):
-    def __init__(self, client: AsyncClient, store: Storage, config: Config, room: MatrixRoom, event: RoomMessage):
+    def __init__(self, client: AsyncClient, store: Storage, config: Config, room: MatrixRoom, event: RoomMessage, parsed: ParsedEvent = None):
         """Initialize a new Message
 
         Args:
@@ -31,12 +31,15 @@ class Message(object):
             room (nio.rooms.MatrixRoom): The room the event came from
 
             event (nio.events.room_events.RoomMessage): The event defining the message
+
+            parsed (ParsedEvent): The already parsed event, if any
         """
         self.client: AsyncClient = client
         self.store: Storage = store
         self.config: Config = config
         self.room:MatrixRoom  = room
         self.event: RoomMessage = event
+        self.parsed: ParsedEvent = parsed if parsed is not None else ParsedEvent(event, config.command_prefix)
         
         self.handler = EventStateHandler(client, store, config, room, event)
         self.messageHandler = MessagingHandler(self.handler)
@@ -74,45 +77,38 @@ class Message(object):
             # Default - message from user
             await self.relay_from_user()
 
-    def save_incoming_event(self):
-        incoming_event = IncomingEvent(self.store, self.handler.user.user_id, self.room.room_id, self.event.event_id)
-        incoming_event.store_incoming_event()
+    async def save_incoming_event(self):
+        incoming_event = IncomingEvent(
+            self.store, self.handler.user.user_id, self.room.room_id, self.event.event_id,
+            payload=IncomingEvent.snapshot(self.event),
+        )
+        await incoming_event.store_incoming_event()
 
     async def get_related(self, related_event_id: str) -> Union[str, None]:
-        resp = await self.client.room_get_event(self.room.room_id, related_event_id)
-        if isinstance(resp, RoomGetEventResponse):
-            related_event_is_clone = resp.event.sender == self.client.user_id
-        else:
-            return None
-        
-        if related_event_is_clone:
-            event_pair =  EventPair.get_clone_event_pair(self.store, self.room.room_id, related_event_id)
-            if event_pair:
-                return event_pair.event_id
-        else:
-            event_pair =  EventPair.get_event_pair(self.store, self.room.room_id, related_event_id)
-            if event_pair:
-                return event_pair.clone_event_id
+        # The bot's clones and the events they were cloned from are all paired, no need to fetch the event
+        counterpart = await EventPair.get_counterpart(self.store, self.room.room_id, related_event_id)
+        if counterpart:
+            return counterpart.event_id
 
     async def put_related_clone_event(self, clone_room_id: str, clone_event_id: str):
         event_pair = EventPair(self.store, self.room.room_id, self.event.event_id, clone_room_id, clone_event_id)
-        event_pair.store_event_pair()
+        await event_pair.store_event_pair()
         
     async def transform_reply(self, text:str, room_id:str) -> Tuple[str, str]:
-        reply_to_event_id = get_in_reply_to(self.event)
+        reply_to_event_id = self.parsed.in_reply_to
         if reply_to_event_id:
             reply_to_event_id = await self.get_related(reply_to_event_id)
             if reply_to_event_id:
-                text = _get_reply_msg(self.event)
+                text = self.parsed.reply_section
                 
         return [reply_to_event_id, text]
     
     async def transform_replaces(self, text:str, room_id:str) -> Tuple[str, str]:
-        replaces_event_id = get_replaces(self.event)
+        replaces_event_id = self.parsed.replaces
         if replaces_event_id:
             replaces_event_id = await self.get_related(replaces_event_id)
             if replaces_event_id:
-                text = _get_reply_msg(self.event)
+                text = self.parsed.reply_section
                 
         return (replaces_event_id, text)
 
@@ -132,9 +128,8 @@ class Message(object):
                 await self.handler.message_logging_room(f"Failed to retrieve room {room_id} details to forward message from user {self.handler.user.user_id} in room {self.room.room_id}, putting message task in queue to be sent when state arrives: {self.construct_received_message(room_id)}", level=LogLevel.INFO)
             except Exception as e:
                 logger.error(f"Exception thrown while sending error message: {room_id} {self.handler.user.user_id} in room {self.room.room_id}, dropping message: {self.construct_received_message(room_id)}")
-            task = (self.client.callbacks._message, room_id, self.event.room_id, self.event, int(time.time()))
-            # Add the task to the room queue to be sent when room is loaded
-            self.client.callbacks.rooms_pending[task[1]].append(task)
+            # Add the message to the room queue to be sent when room is loaded
+            await self.client.callbacks.pending.add(KIND_MESSAGE, room_id, self.room.room_id, self.event)
             return
         
         # Otherwise, send immediately
@@ -174,5 +169,5 @@ class Message(object):
         # Handle different relaying scenarios
         if not self.handler.ticket and not self.handler.user.current_chat_room_id:
             # Save the message event id into storage, to be copied to a ticket room later when one is raised
-            self.save_incoming_event()
+            await self.save_incoming_event()
         await self.forward_message_to_room(room_id)
@@ -4,12 +4,14 @@ from typing import List, Optional
 
 from nio import AsyncClient, MatrixRoom, RoomMessage
 
-from support_bot.chat_functions import send_text_to_room
+from support_bot.chat_functions import send_status_notice, send_text_to_room
 from support_bot.config import Config
 from support_bot.models.Chat import chat_room_name_pattern, Chat
 from support_bot.models.Staff import Staff
 from support_bot.models.Ticket import ticket_name_pattern, Ticket
 from support_bot.models.User import User
+from support_bot.outbound import Lane
+from support_bot.room_index import CHAT_ROOM, TICKET_ROOM
 from support_bot.storage import Storage
 
 class RoomType(Enum):
@@ -40,8 +42,8 @@ class EventStateHandler(object):
         
         self.meta = {}
 
-        # Determine room event is in
-        self.room_type = self.determine_room_type(self.room)
+        # Room event is in, determined by find_room_state
+        self.room_type: Optional[RoomType] = None
 
         # Variables for holding Event State
         self.user: Optional[User] = None
@@ -56,26 +58,26 @@ class EventStateHandler(object):
 
     # State fetchers, return True on successfully finding state
 
-    def find_state_user(self) -> bool:
+    async def find_state_user(self) -> bool:
         if self.room_type == RoomType.UserRoom:
-            self.user = User.get_existing(self.store, self.event.sender)
+            self.user = await User.get_existing(self.store, self.event.sender)
 
         return self.user is not None
-    def find_state_staff(self) -> bool:
-        self.staff = Staff.get_existing(self.store, self.event.sender)
+    async def find_state_staff(self) -> bool:
+        self.staff = await Staff.get_existing(self.store, self.event.sender)
 
         return self.staff is not None
-    def find_state_ticket(self) -> bool:
+    async def find_state_ticket(self) -> bool:
         if self.room_type == RoomType.TicketRoom:
-            self.ticket = Ticket.find_ticket_of_room_id(self.store, self.room.room_id)
+            self.ticket = await Ticket.find_ticket_of_room_id(self.store, self.room.room_id)
 
         # Update logging format
         if self.ticket:
             self.for_room = f"Ticket #{self.ticket.id} in room {self.room.display_name}"
         return self.ticket is not None
-    def find_state_chat(self) -> bool:
+    async def find_state_chat(self) -> bool:
         if self.room_type == RoomType.ChatRoom:
-            self.chat = Chat.find_chat_of_room(self.store, self.room)
+            self.chat = await Chat.find_chat_of_room(self.store, self.room)
 
         # Update logging format
         if self.chat:
@@ -97,28 +99,30 @@ class EventStateHandler(object):
         return True
 
     # Creation of new state
-    def create_state_user(self):
-        self.user = User.create_new(self.store, self.event.sender)
+    async def create_state_user(self):
+        self.user = await User.create_new(self.store, self.event.sender)
 
-    def update_state_user(self, user_id:str):
-        self.user = User.get_existing(self.store, user_id)
+    async def update_state_user(self, user_id:str):
+        self.user = await User.get_existing(self.store, user_id)
 
-    def update_state_ticket(self, ticket_id:int):
-        self.ticket = Ticket.get_existing(self.store, ticket_id)
+    async def update_state_ticket(self, ticket_id:int):
+        self.ticket = await Ticket.get_existing(self.store, ticket_id)
 
-    def update_state_chat(self, chat_room_id:str):
-        self.chat = Chat.get_existing(self.store, chat_room_id)
+    async def update_state_chat(self, chat_room_id:str):
+        self.chat = await Chat.get_existing(self.store, chat_room_id)
 
     async def find_room_state(self) -> bool:
+        # Determine room event is in
+        await self.determine_room_type(self.room)
 
         if self.room_type == RoomType.TicketRoom:
             # Try to find existing ticket
-            if not self.find_state_ticket():
+            if not await self.find_state_ticket():
                 await self.message_room(f"Error: Failed to find ticket of this room")
                 return False
         elif self.room_type == RoomType.ChatRoom:
             # Try to find existing chat
-            if not self.find_state_chat():
+            if not await self.find_state_chat():
                 await self.message_room(f"Error: Failed to find chat of this room")
                 return False
         elif self.room_type == RoomType.ManagementRoom:
@@ -127,7 +131,7 @@ class EventStateHandler(object):
                 return False
         elif self.room_type == RoomType.UserRoom:
             if not self.find_state_user_room():
-                await self.message_management(f"Error: failed to set state for {self.room.room_id}")
+                await self.message_management(f"Error: failed to set state for {self.room.room_id}", LogLevel.ERROR)
                 return False
         else:
             return False
@@ -147,7 +151,7 @@ class EventStateHandler(object):
 
 
     # Room type determined by the room name in most cases
-    def determine_room_type(self, room: MatrixRoom) -> RoomType:
+    async def determine_room_type(self, room: MatrixRoom) -> RoomType:
 
         if room.room_id == self.config.management_room_id:
             self.room_type = RoomType.ManagementRoom
@@ -156,16 +160,15 @@ class EventStateHandler(object):
             self.room_type = RoomType.LoggingRoom
             return self.room_type
         
-        ticket_id = Ticket.get_ticket_id_from_room_id(self.store, self.room.room_id)
-        if ticket_id:
+        room_kind, room_ref = await self.store.room_index.lookup(room.room_id)
+        if room_kind == TICKET_ROOM:
             self.room_type = RoomType.TicketRoom
-            self.meta['ticket_id'] = ticket_id
+            self.meta['ticket_id'] = room_ref
             return self.room_type
 
-        chat_room_id = Chat.get_chat_room_id_from_room_id(self.store, self.room.room_id)
-        if chat_room_id:
+        if room_kind == CHAT_ROOM:
             self.room_type = RoomType.ChatRoom
-            self.meta['chat_room_id'] = chat_room_id
+            self.meta['chat_room_id'] = room_ref
             return self.room_type
         
         self.room_type = RoomType.UserRoom
@@ -188,20 +191,27 @@ class EventStateHandler(object):
 
         await send_text_to_room(self.client, self.room.room_id, msg)
 
-    async def message_management(self, msg:str, level=LogLevel.DEBUG):
+    async def message_management(self, msg:str, level=LogLevel.DEBUG, digest:bool=False):
         self.log_console(msg, level)
 
-        await send_text_to_room(self.client, self.config.management_room_id, msg)
+        await self._notify_management(msg, digest)
 
     async def message_logging_room(self, msg:str, level=LogLevel.DEBUG):
         self.log_console(msg, level)
 
-        await send_text_to_room(self.client, self.config.matrix_logging_room, msg)
+        await send_text_to_room(self.client, self.config.matrix_logging_room, msg, lane=Lane.LOGGING)
 
-    async def message_all(self, msg:str, level=LogLevel.DEBUG):
+    async def message_all(self, msg:str, level=LogLevel.DEBUG, digest:bool=False):
         self.log_console(msg, level)
 
         if self.room.room_id != self.config.management_room_id:
             await send_text_to_room(self.client, self.room.room_id, msg)
 
-        await send_text_to_room(self.client, self.config.management_room_id, msg)
+        await self._notify_management(msg, digest)
+
+    async def _notify_management(self, msg:str, digest:bool):
+        # Only notices the caller marked as low value may go to the notice digest, staff are alerted of anything else
+        if digest:
+            await send_status_notice(self.client, self.config.management_room_id, msg)
+        else:
+            await send_text_to_room(self.client, self.config.management_room_id, msg)
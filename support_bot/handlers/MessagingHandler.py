@@ -43,7 +43,7 @@ class MessagingHandler(object):
                 msg = f"Received Unknown response for room {resp.room_id}: {resp} after Creation"
                 logger.error(msg)
                 
-            user.update_communications_room(resp.room_id)
+            await user.update_communications_room(resp.room_id)
             await send_text_to_room(
                 self.client, self.room.room_id,
                 f"Created a new DM for user {user.user_id} with roomID: {resp.room_id}",
@@ -70,7 +70,7 @@ class MessagingHandler(object):
             return False
 
         # Find user related to ticket
-        self.handler.update_state_user(self.handler.ticket.user_id)
+        await self.handler.update_state_user(self.handler.ticket.user_id)
 
         # Check if this is the active ticket
         if self.handler.user.current_ticket_id != self.handler.ticket.id:
@@ -112,7 +112,7 @@ class MessagingHandler(object):
             return False
         
         # Find user related to chat
-        self.handler.update_state_user(self.handler.chat.user_id)
+        await self.handler.update_state_user(self.handler.chat.user_id)
 
         # Check if a Ticket for user does not exist
         if self.handler.user.current_ticket_id:
@@ -133,20 +133,20 @@ class MessagingHandler(object):
 
     async def setup_relay(self) -> str:
         # Find user from event
-        if not self.handler.find_state_user():
+        if not await self.handler.find_state_user():
             # If we don't have the user details yet - create new instance
-            self.handler.create_state_user()
+            await self.handler.create_state_user()
 
         # Update the communications channel to this room
         if self.handler.user.room_id != self.room.room_id:
-            self.handler.user.update_communications_room(self.room.room_id)
+            await self.handler.user.update_communications_room(self.room.room_id)
 
         # Handle different relaying scenarios
         if self.handler.user.current_ticket_id:
-            self.handler.update_state_ticket(self.handler.user.current_ticket_id)
+            await self.handler.update_state_ticket(self.handler.user.current_ticket_id)
             return self.handler.ticket.ticket_room_id
         elif self.handler.user.current_chat_room_id:
-            self.handler.update_state_chat(self.handler.user.current_chat_room_id)
+            await self.handler.update_state_chat(self.handler.user.current_chat_room_id)
             return self.handler.chat.chat_room_id
         else:
             return self.config.management_room
@@ -157,5 +157,5 @@ class MessagingHandler(object):
             if not room:
                 return False
             else:
-                self.handler.user.update_communications_room(room.room_id)
+                await self.handler.user.update_communications_room(room.room_id)
         return True
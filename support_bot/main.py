@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import asyncio
+import os
 from threading import Thread
 import logging
 from time import sleep
@@ -24,7 +25,8 @@ from nio import (
     RoomMessageNotice,
     RoomMessageText,
     RoomMessageMedia,
-    RoomResolveAliasResponse, RoomKeyRequest,
+    RoomAliasEvent,
+    RoomKeyRequest,
     RedactionEvent,
     CallInviteEvent,
     CallCandidatesEvent,
@@ -33,9 +35,18 @@ from nio import (
     SyncResponse,
 )
 
+from support_bot.alias_cache import AliasCache
 from support_bot.callbacks import Callbacks
 from support_bot.config import Config
+from support_bot.copy_jobs import CopyJobs
+from support_bot.event_cache import EventCache
+from support_bot.dispatcher import EventDispatcher
+from support_bot.dm_index import DirectRoomIndex
+from support_bot.event_dedup import EventDeduplicator
 from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.notice_digest import NoticeDigest
+from support_bot.outbound import OutboundScheduler
+from support_bot.retention import Retention
 from support_bot.storage import Storage
 from support_bot.utils import sleep_ms
 import grpc_server.server
@@ -50,6 +61,16 @@ async def main(config: Config, main_loop:asyncio.AbstractEventLoop, grpc_loop:as
     # Initialise global model repositories:
     repositories = Repositories(store)
     store.set_repositories(repositories)
+    repositories.incomingEventsRep.max_per_user = config.incoming_events_max_per_user
+    await store.room_index.load()
+    await store.authorization.load()
+    maintenance = asyncio.ensure_future(store.run_maintenance())
+    retention = None
+    if config.retention_enabled:
+        retention = asyncio.ensure_future(Retention(
+            store, config.retention_interval, config.retention_batch_size, config.retention_batch_pause,
+            config.retention_policies, config.retention_analyze, config.retention_vacuum,
+        ).run())
     
     # Configuration options for the AsyncClient
     client_config = AsyncClientConfig(
@@ -77,26 +98,75 @@ async def main(config: Config, main_loop:asyncio.AbstractEventLoop, grpc_loop:as
         client.access_token = config.user_token
         client.user_id = config.user_id
 
+    # Set up duplicate event detection, restoring already processed events if persisted
+    dedup = EventDeduplicator(
+        config.event_dedup_capacity,
+        os.path.join(config.store_path, "processed_events.json") if config.event_dedup_persist else None,
+    )
+    dedup.load()
+
+    # Direct message rooms by user, kept current from the synced room state
+    client.dm_index = DirectRoomIndex(client)
+    # noinspection PyTypeChecker
+    client.add_response_callback(client.dm_index.sync, (SyncResponse,))
+    # noinspection PyTypeChecker
+    client.add_event_callback(client.dm_index.member, (RoomMemberEvent,))
+
+    # Room IDs of aliases, dropped when the canonical alias of a room changes
+    client.alias_cache = AliasCache(client)
+    # noinspection PyTypeChecker
+    client.add_event_callback(client.alias_cache.canonical_alias, (RoomAliasEvent,))
+
+    # Events seen in syncs or sent by the bot, looked up before fetching them from the homeserver
+    client.event_cache = EventCache(client, config.event_cache_max_events, config.event_cache_max_bytes)
+    # noinspection PyTypeChecker
+    client.add_response_callback(client.event_cache.sync, (SyncResponse,))
+
+    # Requests to the homeserver, sent in priority order under a shared rate limit
+    client.outbound = OutboundScheduler(
+        config.outbound_rate, config.outbound_burst, config.outbound_concurrency, config.outbound_max_queued,
+    )
+    client.membership_concurrency = config.membership_concurrency
+
+    # Status notices coalesced into one management room message per time window
+    if config.notice_digest_enabled:
+        client.notice_digest = NoticeDigest(
+            client, config, config.notice_digest_window, config.notice_digest_interval, config.notice_digest_max_lines,
+        )
+
+    # Messages sent before a ticket was raised, copied to the ticket room in the background
+    client.copy_jobs = CopyJobs(client, store)
+    # noinspection PyTypeChecker
+    client.add_response_callback(client.copy_jobs.sync, (SyncResponse,))
+
     # Set up event callbacks
-    callbacks = Callbacks(client, store, config)
+    callbacks = Callbacks(client, store, config, dedup)
     # noinspection PyTypeChecker
-    client.add_response_callback(callbacks.check_awaited, (SyncResponse,))
+    client.add_response_callback(callbacks.pending.sync, (SyncResponse,))
     # noinspection PyTypeChecker
-    client.add_event_callback(callbacks.member, (RoomMemberEvent,))
+    client.add_response_callback(dedup.save_on_sync, (SyncResponse,))
+
+    # Room events are queued per room and processed outside of the sync loop
+    dispatcher = EventDispatcher(
+        config.dispatcher_concurrency, config.dispatcher_max_room_queue, config.dispatcher_max_queued,
+    )
     # noinspection PyTypeChecker
-    client.add_event_callback(callbacks.room_encryption, (RoomEncryptionEvent, ))
+    client.add_event_callback(dispatcher.wrap(callbacks.member), (RoomMemberEvent,))
     # noinspection PyTypeChecker
-    client.add_event_callback(callbacks.message, (RoomMessageText, RoomMessageNotice, RoomMessageFormatted))
+    client.add_event_callback(dispatcher.wrap(callbacks.room_encryption), (RoomEncryptionEvent, ))
     # noinspection PyTypeChecker
-    client.add_event_callback(callbacks.media, (RoomMessageMedia, RoomEncryptedMedia))
+    client.add_event_callback(dispatcher.wrap(callbacks.message), (RoomMessageText, RoomMessageNotice, RoomMessageFormatted))
     # noinspection PyTypeChecker
-    client.add_event_callback(callbacks.call_event, (CallInviteEvent, CallCandidatesEvent, CallHangupEvent, CallAnswerEvent,))
+    client.add_event_callback(dispatcher.wrap(callbacks.media), (RoomMessageMedia, RoomEncryptedMedia))
     # noinspection PyTypeChecker
-    client.add_event_callback(callbacks.redact, (RedactionEvent,))
+    client.add_event_callback(dispatcher.wrap(callbacks.call_event), (CallInviteEvent, CallCandidatesEvent, CallHangupEvent, CallAnswerEvent,))
     # noinspection PyTypeChecker
-    client.add_event_callback(callbacks.invite, (InviteMemberEvent,))
+    client.add_event_callback(dispatcher.wrap(callbacks.redact), (RedactionEvent,))
     # noinspection PyTypeChecker
-    client.add_event_callback(callbacks.decryption_failure, (MegolmEvent,))
+    client.add_event_callback(dispatcher.wrap(callbacks.invite), (InviteMemberEvent,))
+    # noinspection PyTypeChecker
+    client.add_event_callback(dispatcher.wrap(callbacks.decryption_failure), (MegolmEvent,))
+    dispatcher_stats = asyncio.ensure_future(dispatcher.log_stats(config.dispatcher_stats_interval))
     # noinspection PyTypeChecker
     client.add_to_device_callback(callbacks.room_key, (ForwardedRoomKeyEvent, RoomKeyEvent))
     # noinspection PyTypeChecker
@@ -158,9 +228,9 @@ async def main(config: Config, main_loop:asyncio.AbstractEventLoop, grpc_loop:as
             # Resolve management room ID if not known
             if config.management_room.startswith('#'):
                 # Resolve the room ID
-                response = await client.room_resolve_alias(config.management_room)
-                if type(response) == RoomResolveAliasResponse:
-                    config.management_room_id = response.room_id
+                room_id = await client.alias_cache.resolve(config.management_room)
+                if room_id:
+                    config.management_room_id = room_id
                 else:
                     logger.fatal("Could not resolve the management room ID from alias, aborting")
                     break
@@ -172,6 +242,8 @@ async def main(config: Config, main_loop:asyncio.AbstractEventLoop, grpc_loop:as
                     logger.warning("Could not join the logging room")
                 else:
                     logger.info(f"Logging room membership is good")
+                # Resolved ahead of the first log message
+                await client.alias_cache.warm([config.matrix_logging_room])
 
             logger.info(f"Logged in as {config.user_id}")
             await client.sync_forever(timeout=120000, full_state=True)
@@ -182,5 +254,23 @@ async def main(config: Config, main_loop:asyncio.AbstractEventLoop, grpc_loop:as
             # Sleep so we don't bombard the server with login requests
             sleep(15)
         finally:
+            # Finish processing the already received events before disconnecting
+            logger.info(f"Event dispatcher: {dispatcher.stats()}")
+            await dispatcher.join()
+            await store.flush_writes()
+            if config.notice_digest_enabled:
+                await client.notice_digest.flush()
+            logger.info(f"Outbound requests: {client.outbound.stats()}")
+            logger.info(f"Event cache: {client.event_cache.stats()}")
+            logger.info(f"Pending deliveries: {callbacks.pending.stats()}")
             # Make sure to close the client connection on disconnect
             await client.close()
+            dedup.save()
+
+    # Wait for running queries, commit buffered writes and close the database connections
+    maintenance.cancel()
+    dispatcher_stats.cancel()
+    callbacks.pending.close()
+    if retention:
+        retention.cancel()
+    store.close()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+
+from commonmark import commonmark
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 512
+# Longest text kept in the cache
+DEFAULT_MAX_CACHED_LENGTH = 4096
+# Longer texts are rendered on a worker thread, the parser is pure python
+DEFAULT_MAX_INLINE_LENGTH = 16384
+
+# Characters with a meaning anywhere in a line: emphasis, code, links, html, entities, escapes
+_inline_syntax = re.compile(r"[\\`*_\[\]<>&]")
+# Line starts opening a block: headings, quotes, lists, breaks, fences, ordered lists
+_block_start = re.compile(r"[#>+\-=~]|\d{1,9}[.)]")
+
+
+def is_plain_text(text: str) -> bool:
+    """Whether commonmark would render the text as a single paragraph of itself"""
+    return (
+        bool(text)
+        and "\n" not in text
+        and text == text.strip()
+        and not _inline_syntax.search(text)
+        and not _block_start.match(text)
+    )
+
+
+def render_plain_text(text: str) -> str:
+    # The output of commonmark for plain text, which escapes only quotes here
+    return "<p>" + text.replace('"', "&quot;") + "</p>\n"
+
+
+class MarkdownRenderer(object):
+    def __init__(
+        self,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        max_cached_length: int = DEFAULT_MAX_CACHED_LENGTH,
+        max_inline_length: int = DEFAULT_MAX_INLINE_LENGTH,
+    ):
+        """Markdown to HTML rendering for outgoing messages
+
+        Plain text is wrapped without running the parser. Rendered texts are kept in a
+        least recently used cache, so fixed texts (help, notices, the welcome message) are
+        rendered once. Texts longer than `max_inline_length` are rendered on a worker
+        thread, so a very large message doesn't hold up the event loop.
+
+        Args:
+            cache_size (int): Maximum number of cached renders
+
+            max_cached_length (int): Length of the longest text that is cached
+
+            max_inline_length (int): Length of the longest text rendered on the event loop
+        """
+        self.cache_size = max(1, int(cache_size))
+        self.max_cached_length = max_cached_length
+        self.max_inline_length = max_inline_length
+
+        self._cache: OrderedDict[str, str] = OrderedDict()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.plain = 0
+        self.offloaded = 0
+
+    def render(self, text: str) -> str:
+        """Render text on the calling thread"""
+        if is_plain_text(text):
+            self.plain += 1
+            return render_plain_text(text)
+
+        html = self._cache.get(text)
+        if html is not None:
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return html
+
+        self.misses += 1
+        html = commonmark(text)
+        self._store(text, html)
+        return html
+
+    async def render_async(self, text: str) -> str:
+        """Render text, on a worker thread if it is too long to render on the event loop"""
+        if len(text) <= self.max_inline_length:
+            return self.render(text)
+
+        self.offloaded += 1
+        return await asyncio.get_running_loop().run_in_executor(None, commonmark, text)
+
+    def _store(self, text: str, html: str):
+        if len(text) > self.max_cached_length:
+            return
+        self._cache[text] = html
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "plain": self.plain,
+            "offloaded": self.offloaded,
+        }
+
+
+# Shared by all senders
+renderer = MarkdownRenderer()
@@ -4,7 +4,7 @@ from typing import List
 # noinspection PyPackageRequirements
 from nio import RoomSendResponse, RoomSendError, SyncResponse, Api
 
-from support_bot.chat_functions import send_media_to_room, send_reaction, send_text_to_room, find_private_msg
+from support_bot.chat_functions import send_media_to_room, send_reaction, send_status_notice, send_text_to_room, find_private_msg
 from support_bot.event_responses import Message
 from support_bot.handlers.EventStateHandler import EventStateHandler, RoomType, LogLevel
 from support_bot.handlers.MessagingHandler import MessagingHandler
@@ -13,7 +13,7 @@ from support_bot.models.IncomingEvent import IncomingEvent
 from support_bot.models.Repositories.TicketRepository import TicketStatus
 from support_bot.models.Ticket import Ticket
 from support_bot.models.User import User
-from support_bot.utils import get_in_reply_to
+from support_bot.parsed_event import ParsedEvent
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +26,7 @@ media_name = {
 
 
 class Media(Message):
-    def __init__(self, client, store, config, room, event, media_type, body, media_url, media_file, media_info):
+    def __init__(self, client, store, config, room, event, media_type, body, media_url, media_file, media_info, parsed: ParsedEvent = None):
         """Initialize a new Media
 
         Args:
@@ -49,8 +49,10 @@ class Media(Message):
             media_file (str): The url of the encrypted media
 
             media_info (str): The metadata of the media
+
+            parsed (ParsedEvent): The already parsed event, if any
         """
-        super().__init__(client, store, config, room, event)
+        super().__init__(client, store, config, room, event, parsed)
         
         self.media_type = media_type
         self.body = body
@@ -62,11 +64,11 @@ class Media(Message):
         return
     
     async def handle_management_room_media(self):
-        reply_to = get_in_reply_to(self.event)
+        reply_to = self.parsed.in_reply_to
 
         if reply_to and self.config.relay_management_media:
             # Send back to original sender
-            message = self.store.get_message_by_management_event_id(reply_to)
+            message = await self.store.get_message_by_management_event_id(reply_to)
             if message:
                 # Relay back to original sender
                 response = await send_media_to_room(
@@ -80,7 +82,7 @@ class Media(Message):
                 )
                 if isinstance(response, RoomSendResponse):
                     # Store our outbound reply so we can reference it later
-                    self.store.store_message(
+                    await self.store.store_message(
                         event_id=response.event_id,
                         management_event_id=self.event.event_id,
                         room_id=message["room_id"],
@@ -110,6 +112,8 @@ class Media(Message):
                         self.event.event_id,
                         management_room_text
                     )
+                elif isinstance(response, RoomSendResponse):
+                    await send_status_notice(self.client, self.room.room_id, management_room_text)
                 else:
                     await send_text_to_room(
                         self.client,
@@ -160,7 +164,7 @@ class Media(Message):
         if type(response) == RoomSendResponse and response.event_id:
             try:
                 await self.put_related_clone_event(room_id, response.event_id)
-                self.store.store_message(
+                await self.store.store_message(
                     self.event.event_id,
                     response.event_id,
                     room_id,
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+# noinspection PyPackageRequirements
+from nio import AsyncClient, ErrorResponse
+
+from support_bot.chat_functions import invite_to_room, kick_from_room, send_shared_history_keys
+from support_bot.errors import Errors
+
+logger = logging.getLogger(__name__)
+
+# Membership requests of one bulk operation in flight at the same time
+DEFAULT_CONCURRENCY = 8
+
+
+class MembershipResults(Dict[str, object]):
+    """Responses of a bulk membership operation, by user id"""
+    def __init__(self):
+        super().__init__()
+        # Set if sharing the room keys with the invited users failed
+        self.keys_error: Optional[ErrorResponse] = None
+
+    @property
+    def succeeded(self) -> List[str]:
+        return [user_id for user_id, response in self.items() if not isinstance(response, ErrorResponse)]
+
+    @property
+    def failed(self) -> Dict[str, ErrorResponse]:
+        return {user_id: response for user_id, response in self.items() if isinstance(response, ErrorResponse)}
+
+
+async def _bulk(
+    client: AsyncClient, user_ids: Iterable[str], operation: Callable[[str], Awaitable], limit: Optional[int],
+) -> MembershipResults:
+    if limit is None:
+        limit = getattr(client, "membership_concurrency", DEFAULT_CONCURRENCY)
+    slots = asyncio.Semaphore(max(1, int(limit)))
+
+    async def run(user_id: str):
+        async with slots:
+            try:
+                return await operation(user_id)
+            except Exception as e:
+                logger.exception(f"Membership operation for {user_id} failed")
+                return ErrorResponse(f"{e}", Errors.EXCEPTION)
+
+    # Each user once, in the given order
+    user_ids = list(dict.fromkeys(user_ids))
+    results = MembershipResults()
+    for user_id, response in zip(user_ids, await asyncio.gather(*(run(user_id) for user_id in user_ids))):
+        results[user_id] = response
+    return results
+
+
+async def kick_all_from_room(
+    client: AsyncClient, user_ids: Iterable[str], room_id: str, limit: Optional[int] = None,
+) -> MembershipResults:
+    """Kick users from a room, at most `limit` at a time
+
+    Returns the RoomKickResponse or ErrorResponse of each user.
+    """
+    return await _bulk(client, user_ids, lambda user_id: kick_from_room(client, user_id, room_id), limit)
+
+
+async def invite_all_to_room(
+    client: AsyncClient, user_ids: Iterable[str], room_id: str, share_keys: bool = False, limit: Optional[int] = None,
+) -> MembershipResults:
+    """Invite users to a room, at most `limit` at a time
+
+    Returns the RoomInviteResponse or ErrorResponse of each user. With `share_keys`, the room
+    keys are then shared with all invited users at once, a failure is set as `keys_error`.
+    """
+    results = await _bulk(client, user_ids, lambda user_id: invite_to_room(client, user_id, room_id), limit)
+    for user_id, response in results.failed.items():
+        logger.warning(f"Failed to invite {user_id} to room {room_id}: {response}")
+
+    invited = results.succeeded
+    if share_keys and invited:
+        try:
+            response = await send_shared_history_keys(client, room_id, invited)
+            if isinstance(response, ErrorResponse):
+                results.keys_error = response
+        except Exception as e:
+            results.keys_error = ErrorResponse(f"Failed to share keys with users {', '.join(invited)} {e}", Errors.EXCEPTION)
+        if results.keys_error:
+            logger.warning(f"Failed to share room keys of {room_id} with {invited}: {results.keys_error}")
+    return results
@@ -8,17 +8,17 @@ from nio.rooms import MatrixRoom
 
 from support_bot.event_responses import Message
 from support_bot.bot_commands import Command
-from support_bot.chat_functions import get_rx_id_from_reply, send_reaction, send_text_to_room
+from support_bot.chat_functions import get_rx_id_from_reply, send_reaction, send_status_notice, send_text_to_room
 from support_bot.config import Config
 from support_bot.handlers.EventStateHandler import LogLevel
 from support_bot.storage import Storage
-from support_bot.utils import USER_ID_REGEX, get_in_reply_to, get_mentions, get_replaces, get_reply_msg, get_raise_msg
+from support_bot.parsed_event import ParsedEvent
 
 logger = logging.getLogger(__name__)
 
 
 class TextMessage(Message):
-    def __init__(self, client: AsyncClient, store: Storage, config: Config, room: MatrixRoom, event: RoomMessage, message_content: str):
+    def __init__(self, client: AsyncClient, store: Storage, config: Config, room: MatrixRoom, event: RoomMessage, message_content: str, parsed: ParsedEvent = None):
         """Initialize a new Text Message
 
         Args:
@@ -33,18 +33,19 @@ class TextMessage(Message):
             event (nio.events.room_events.RoomMessageText): The event defining the message
             
             message_content (str): The body of the message
+
+            parsed (ParsedEvent): The already parsed event, if any
         """
-        super().__init__(client, store, config, room, event)
+        super().__init__(client, store, config, room, event, parsed)
         
         self.message_content: str = message_content
 
     async def handle_management_room_message(self):
-        reply_to = get_in_reply_to(self.event)
-        replaces = get_replaces(self.event)
-
+        reply_to = self.parsed.in_reply_to
+        replaces = self.parsed.replaces
 
-        reply_section = get_reply_msg(self.event, reply_to, replaces)
-        raise_section = get_raise_msg(self.event, reply_to, replaces)
+        reply_section = self.parsed.reply_msg
+        raise_section = self.parsed.raise_msg
         rx_id = await get_rx_id_from_reply(self.client, self.room.room_id, reply_to)
         
         if not reply_section:
@@ -63,12 +64,12 @@ class TextMessage(Message):
                             True,
                         )
                         return
-                    command = Command(self.client, self.store, self.config, raise_section[1:7]+rx_id+raise_section[6:], self.room, self.event)
+                    command = Command(self.client, self.store, self.config, raise_section[1:7]+rx_id+raise_section[6:], self.room, self.event, self.parsed)
                     await command.process()
 
         elif reply_to:
             # Send back to original sender
-            message = self.store.get_message_by_management_event_id(reply_to)
+            message = await self.store.get_message_by_management_event_id(reply_to)
             if not message:
                 logger.debug(
                     f"Skipping message {self.event.event_id} which is not a reply to one of our relay messages",
@@ -86,7 +87,7 @@ class TextMessage(Message):
             )
             if isinstance(response, RoomSendResponse):
                 # Store our outbound reply so we can reference it later
-                self.store.store_message(
+                await self.store.store_message(
                     event_id=response.event_id,
                     management_event_id=self.event.event_id,
                     room_id=message["room_id"],
@@ -118,6 +119,8 @@ class TextMessage(Message):
                     self.event.event_id,
                     management_room_text
                 )
+            elif isinstance(response, RoomSendResponse):
+                await send_status_notice(self.client, self.room.room_id, management_room_text)
             else:
                 await send_text_to_room(
                     self.client,
@@ -127,7 +130,7 @@ class TextMessage(Message):
                 )
         elif replaces:
             # Edit the already sent reply event
-            message = self.store.get_message_by_management_event_id(replaces)
+            message = await self.store.get_message_by_management_event_id(replaces)
             if not message:
                 logger.debug(
                     f"Skipping message {self.event.event_id} which is not an edit to one of our reply messages",
@@ -145,7 +148,7 @@ class TextMessage(Message):
             )
             if isinstance(response, RoomSendResponse):
                 # Store our outbound reply so we can reference it later
-                self.store.store_message(
+                await self.store.store_message(
                     event_id=response.event_id,
                     management_event_id=self.event.event_id,
                     room_id=message["room_id"],
@@ -163,12 +166,15 @@ class TextMessage(Message):
                 management_room_text = f"Failed to send edit back to sender: {response}"
                 logger.warning(management_room_text)
             # Confirm in management room
-            await send_text_to_room(
-                self.client,
-                self.room.room_id,
-                management_room_text,
-                True,
-            )
+            if isinstance(response, RoomSendResponse):
+                await send_status_notice(self.client, self.room.room_id, management_room_text)
+            else:
+                await send_text_to_room(
+                    self.client,
+                    self.room.room_id,
+                    management_room_text,
+                    True,
+                )
 
     def construct_received_message(self, for_room:str) -> str:
         return f"Bot message received for {for_room} | "\
@@ -198,7 +204,7 @@ class TextMessage(Message):
         if type(response) == RoomSendResponse and response.event_id:
             try:
                 await self.put_related_clone_event(room_id, response.event_id)
-                self.store.store_message(
+                await self.store.store_message(
                     self.event.event_id,
                     response.event_id,
                     self.room.room_id,
@@ -214,7 +220,7 @@ class TextMessage(Message):
     def relay_based_on_mention_room(self) -> bool:
         if self.handler.is_mention_only_room([self.room.canonical_alias, self.room.room_id], self.room.is_named):
             # Did we get mentioned?
-            mentioned = self.config.user_id in get_mentions(self.message_content) or \
+            mentioned = self.parsed.mentions_user(self.config.user_id) or \
                         self.message_content.lower().find(self.config.user_localpart.lower()) > -1
             if not mentioned:
                 logger.debug("Skipping message %s in room %s as it's set to only relay on mention and we were not "
@@ -108,7 +108,7 @@ def migrate(store):
 
         store._execute("""
                   CREATE TABLE IF NOT EXISTS `Tickets` (
-        `id` INT NOT NULL,
+        `id` INTEGER NOT NULL,
         `user_id` VARCHAR(80) NOT NULL,
         `user_room_id` VARCHAR(80) NULL,
         `status` VARCHAR(100) NULL DEFAULT 'open',
@@ -140,7 +140,7 @@ def migrate(store):
 
         store._execute("""
                   CREATE TABLE IF NOT EXISTS `TimelineEvents` (
-        `id` INT NOT NULL,
+        `id` INTEGER NOT NULL,
         `device_id` VARCHAR(80) NULL,
         `event_id` VARCHAR(80) NULL,
         `room_id` VARCHAR(80) NULL,
@@ -1,9 +1,15 @@
 # noinspection PyProtectedMember
 def migrate(store):
-    store._execute("""
-        ALTER TABLE Users ADD current_ticket_id INT NULL
-    """)
-    store._execute("""
-        ALTER TABLE Users ADD CONSTRAINT fk_Users_Tickets_ticket_id FOREIGN KEY(current_ticket_id) REFERENCES Tickets(id)
-    """)
+    if store.db_type == "postgres":
+        store._execute("""
+            ALTER TABLE Users ADD current_ticket_id INT NULL
+        """)
+        store._execute("""
+            ALTER TABLE Users ADD CONSTRAINT fk_Users_Tickets_ticket_id FOREIGN KEY(current_ticket_id) REFERENCES Tickets(id)
+        """)
+    else:
+        # SQLite can't add constraints to an existing table, only columns referencing one
+        store._execute("""
+            ALTER TABLE Users ADD current_ticket_id INT NULL REFERENCES Tickets(id)
+        """)
 
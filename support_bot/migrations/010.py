@@ -15,7 +15,7 @@ def migrate(store):
     else:
         store._execute("""
         CREATE TABLE IF NOT EXISTS `EventPairs` (
-            `id` INT NOT NULL,
+            `id` INTEGER NOT NULL,
             `room_id` VARCHAR(80) NOT NULL,
             `event_id` VARCHAR(80) NOT NULL,
             `clone_room_id` VARCHAR(80) NOT NULL,
@@ -28,8 +28,8 @@ def migrate(store):
     else:
         store._execute("""
         CREATE TABLE IF NOT EXISTS `Support` (
-            PRIMARY KEY (`user_id`))
             `user_id` VARCHAR(80) NOT NULL,
+            PRIMARY KEY (`user_id`))
         """)
 
         store._execute("""
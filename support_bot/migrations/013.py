@@ -31,11 +31,11 @@ def migrate(store):
     else:
         store._execute("""
         CREATE TABLE IF NOT EXISTS `TicketLabels` (
-            PRIMARY KEY (`id`))
-            `id` INT NOT NULL AUTO_INCREMENT,
+            `id` INTEGER NOT NULL,
             `name` VARCHAR(63) NOT NULL,
             `description` VARCHAR(255),
             `hex_color` VARCHAR(7) NOT NULL,
+            PRIMARY KEY (`id`))
         """)
 
         store._execute("""
@@ -31,7 +31,7 @@ def migrate(store):
               ON UPDATE CASCADE,
             CONSTRAINT `fk_ChatsSupportRelation_Chats_id`
               FOREIGN KEY (`chat_room_id`)
-              REFERENCES `Chats` (`id`)
+              REFERENCES `Chats` (`chat_room_id`)
               ON DELETE CASCADE
               ON UPDATE CASCADE)
         """)
@@ -0,0 +1,44 @@
+# noinspection PyProtectedMember
+def migrate(store):
+    """
+    Index the columns every repository query filters on.
+    """
+    # Event pair lookups, from either side of the pair. The room_id prefixes also serve the room deletes
+    store._execute("""
+        CREATE INDEX event_pairs_room_event_idx ON EventPairs (room_id, event_id);
+    """)
+    store._execute("""
+        CREATE INDEX event_pairs_clone_room_event_idx ON EventPairs (clone_room_id, clone_event_id);
+    """)
+    # Superseded by event_pairs_room_event_idx
+    store._execute("""
+        DROP INDEX event_pairs_room_ids_idx;
+    """)
+
+    store._execute("""
+        CREATE INDEX incoming_events_user_id_idx ON IncomingEvents (user_id);
+    """)
+
+    store._execute("""
+        CREATE INDEX tickets_user_room_id_idx ON Tickets (user_room_id);
+    """)
+    store._execute("""
+        CREATE INDEX tickets_status_idx ON Tickets (status);
+    """)
+    store._execute("""
+        CREATE INDEX chats_status_idx ON Chats (status);
+    """)
+
+    # Lookups by the second primary key column of the relation tables
+    store._execute("""
+        CREATE INDEX fk_TicketsSupportRelation_Tickets_id_idx ON TicketsSupportRelation (ticket_id);
+    """)
+    store._execute("""
+        CREATE INDEX fk_ChatsStaffRelation_Chats_id_idx ON ChatsStaffRelation (chat_room_id);
+    """)
+    store._execute("""
+        CREATE INDEX fk_ChatsSupportRelation_Chats_id_idx ON ChatsSupportRelation (chat_room_id);
+    """)
+    store._execute("""
+        CREATE INDEX fk_TicketsTicketLabelsRelation_Tickets_id_idx ON TicketsTicketLabelsRelation (ticket_id);
+    """)
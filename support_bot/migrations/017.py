@@ -0,0 +1,26 @@
+from datetime import datetime
+
+
+# noinspection PyProtectedMember
+def migrate(store):
+    """
+    Timestamp the bookkeeping rows, so the retention job can expire them by age.
+    """
+    # Existing rows start aging from now
+    migrated_at = datetime.now()
+
+    for table in ("messages", "EventPairs", "IncomingEvents", "encrypted_events"):
+        store._execute(f"""
+            ALTER TABLE {table} ADD COLUMN created_at TIMESTAMP;
+        """)
+        store._execute(f"""
+            UPDATE {table} SET created_at = ?;
+        """, (migrated_at,))
+        store._execute(f"""
+            CREATE INDEX {table.lower()}_created_at_idx ON {table} (created_at);
+        """)
+
+    # Expiring the messages of deleted ticket and chat rooms
+    store._execute("""
+        CREATE INDEX messages_room_id_idx ON messages (room_id);
+    """)
@@ -0,0 +1,40 @@
+# noinspection PyProtectedMember
+def migrate(store):
+    """
+    Persist the jobs copying the messages users sent before a ticket was raised, so they resume after a restart.
+    """
+    if store.db_type == "postgres":
+        store._execute("""
+        CREATE TABLE IF NOT EXISTS CopyJobs (
+            id SERIAL NOT NULL,
+            ticket_id INTEGER NOT NULL,
+            user_id VARCHAR(80) NOT NULL,
+            room_id VARCHAR(80) NOT NULL,
+            report_room_id VARCHAR(80) NOT NULL,
+            copied INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP,
+            PRIMARY KEY (id))
+        """)
+    else:
+        store._execute("""
+        CREATE TABLE IF NOT EXISTS `CopyJobs` (
+            `id` INTEGER NOT NULL,
+            `ticket_id` INTEGER NOT NULL,
+            `user_id` VARCHAR(80) NOT NULL,
+            `room_id` VARCHAR(80) NOT NULL,
+            `report_room_id` VARCHAR(80) NOT NULL,
+            `copied` INTEGER NOT NULL DEFAULT 0,
+            `failed` INTEGER NOT NULL DEFAULT 0,
+            `created_at` TIMESTAMP,
+            PRIMARY KEY (`id`))
+        """)
+
+    # Copied in the order the events were received
+    store._execute("""
+        CREATE INDEX incoming_events_user_created_at_idx ON IncomingEvents (user_id, created_at, id);
+    """)
+    # Superseded by incoming_events_user_created_at_idx
+    store._execute("""
+        DROP INDEX incoming_events_user_id_idx;
+    """)
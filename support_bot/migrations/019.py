@@ -0,0 +1,13 @@
+# noinspection PyProtectedMember
+def migrate(store):
+    """
+    Keep a compressed snapshot of the events users send before a ticket is raised, so raising it needs no fetches.
+    """
+    if store.db_type == "postgres":
+        store._execute("""
+            ALTER TABLE IncomingEvents ADD COLUMN payload BYTEA;
+        """)
+    else:
+        store._execute("""
+            ALTER TABLE IncomingEvents ADD COLUMN payload BLOB;
+        """)
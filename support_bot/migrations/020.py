@@ -0,0 +1,29 @@
+# noinspection PyProtectedMember
+def migrate(store):
+    """
+    Persist the deliveries waiting for the state of their room, so they are not lost on a restart.
+    """
+    if store.db_type == "postgres":
+        store._execute("""
+        CREATE TABLE IF NOT EXISTS PendingDeliveries (
+            id SERIAL NOT NULL,
+            kind VARCHAR(16) NOT NULL,
+            room_id VARCHAR(80) NOT NULL,
+            source_room_id VARCHAR(80) NOT NULL,
+            text TEXT,
+            payload BYTEA,
+            queued_at INTEGER NOT NULL,
+            PRIMARY KEY (id))
+        """)
+    else:
+        store._execute("""
+        CREATE TABLE IF NOT EXISTS `PendingDeliveries` (
+            `id` INTEGER NOT NULL,
+            `kind` VARCHAR(16) NOT NULL,
+            `room_id` VARCHAR(80) NOT NULL,
+            `source_room_id` VARCHAR(80) NOT NULL,
+            `text` TEXT,
+            `payload` BLOB,
+            `queued_at` INTEGER NOT NULL,
+            PRIMARY KEY (`id`))
+        """)
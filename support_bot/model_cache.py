@@ -0,0 +1,105 @@
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_TTL = 300.0
+DEFAULT_NEGATIVE_TTL = 30.0
+
+
+class ModelCache(object):
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: float = DEFAULT_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+    ):
+        """Identity map of the loaded models, shared by all model types
+
+        Entries are keyed by model kind ("Ticket", "User", ...) and id. The least recently
+        used entry is evicted once `max_size` entries are cached, and entries expire `ttl`
+        seconds after they were stored, so changes made outside of the bot are picked up.
+
+        A None value records that a model doesn't exist, and expires after `negative_ttl`.
+
+        Repositories invalidate the entries of the rows they write, models store
+        themselves again after updating their fields (write-through).
+
+        Args:
+            max_size (int): Maximum number of cached entries over all kinds
+
+            ttl (float): Number of seconds a model stays cached
+
+            negative_ttl (float): Number of seconds a missing model stays cached
+        """
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries: OrderedDict[Tuple[str, Hashable], Tuple[Any, float]] = OrderedDict()
+
+        # Counters
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.negative_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, kind: str, key: Hashable) -> Tuple[bool, Any]:
+        """Look up a model, returning whether it was cached and the model, None if it doesn't exist"""
+        entry = self._entries.get((kind, key))
+        if entry is None:
+            self.misses[kind] += 1
+            return False, None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[(kind, key)]
+            self.expirations += 1
+            self.misses[kind] += 1
+            return False, None
+
+        self._entries.move_to_end((kind, key))
+        self.hits[kind] += 1
+        if value is None:
+            self.negative_hits += 1
+        return True, value
+
+    def put(self, kind: str, key: Hashable, value: Any):
+        """Cache a model, or None to record that it doesn't exist"""
+        if key is None:
+            return
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self._entries[(kind, key)] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end((kind, key))
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, kind: str, key: Hashable):
+        self._entries.pop((kind, key), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            "size": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "negative_hits": self.negative_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hits_by_kind": dict(self.hits),
+            "misses_by_kind": dict(self.misses),
+        }
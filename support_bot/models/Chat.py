@@ -5,6 +5,8 @@ from nio import AsyncClient, RoomCreateResponse, RoomInviteResponse, MatrixRoom,
 from support_bot.chat_functions import invite_to_room, create_room, send_text_to_room
 from support_bot.models.Repositories.ChatRepository import ChatRepository, ChatStatus
 from support_bot.models.Repositories.UserRepository import UserRepository
+from support_bot.models.User import User
+from support_bot.room_index import CHAT_ROOM
 from support_bot.storage import Storage
 import logging
 import re
@@ -15,18 +17,13 @@ logger = logging.getLogger(__name__)
 chat_room_name_pattern = re.compile(r"^Chat:")
 
 class Chat(object):
-
-    chat_cache = {}
-
-    def __init__(self, storage:Storage, chat_room_id:str):
+    def __init__(self, storage:Storage, fields:dict):
         # Setup Storage bindings
         self.storage = storage
         self.chatRep:ChatRepository = self.storage.repositories.chatRep
         self.userRep: UserRepository = self.storage.repositories.userRep
 
-        # Fetch existing fields of Ticket
-        fields = self.chatRep.get_all_fields(chat_room_id)
-
+        # Existing fields of Chat, fetched by Chat.load
         self.chat_room_id =     fields['chat_room_id']
         self.user_id =          fields['user_id']
         self.status =           ChatStatus(fields['status'])
@@ -34,21 +31,34 @@ class Chat(object):
         self.closed_at =        fields['closed_at']
 
     @staticmethod
-    def get_existing(storage: Storage, chat_room_id: str):
+    async def load(storage: Storage, chat_room_id: str):
+        # Fetch existing fields of Chat, None if it doesn't exist
+        fields = await storage.repositories.chatRep.get_all_fields(chat_room_id)
+        return Chat(storage, fields) if fields else None
+
+    @staticmethod
+    async def load_many(storage: Storage, chat_room_ids: List[str]):
+        # Fetch existing fields of a batch of Chats
+        rows = await storage.repositories.chatRep.get_all_fields_many(chat_room_ids)
+
+        chats = {}
+        for chat_room_id in chat_room_ids:
+            fields = rows.get(chat_room_id)
+            chats[chat_room_id] = Chat(storage, fields) if fields else None
+            # Add chat to cache, or remember that the room is not a chat
+            storage.model_cache.put("Chat", chat_room_id, chats[chat_room_id])
+        return chats
+
+    @staticmethod
+    async def get_existing(storage: Storage, chat_room_id: str):
         # Check cache first
-        chat = Chat.chat_cache.get(chat_room_id, None)
-        if chat:
+        cached, chat = storage.model_cache.lookup("Chat", chat_room_id)
+        if cached:
             return chat
 
-        # Find existing Chat in Database
-        exists = storage.repositories.chatRep.get_chat(chat_room_id)
-        if exists:
-            chat = Chat(storage, chat_room_id)
-            # Add chat to cache
-            Chat.chat_cache[chat_room_id] = chat
-            return chat
-        else:
-            return None
+        # Find existing Chat in Database, batched with concurrent lookups
+        loader = storage.loader("Chat", lambda chat_room_ids: Chat.load_many(storage, chat_room_ids))
+        return await loader.load(chat_room_id)
 
     @staticmethod
     async def create_new(storage: Storage, client:AsyncClient, user_id:str):
@@ -63,38 +73,27 @@ class Chat(object):
 
         # Create Chat entry
         try:
-            storage.repositories.chatRep.create_chat(user_id, chat_room_id, created_at)
+            await storage.repositories.chatRep.create_chat(user_id, chat_room_id, created_at)
         except Exception as e:
             return e
 
-        chat = Chat(storage, chat_room_id)
+        chat = await Chat.load(storage, chat_room_id)
         # Add chat to cache
-        Chat.chat_cache[chat_room_id] = chat
+        chat._cache()
         return chat
 
     @staticmethod
-    def get_chat_room_id_from_room_id(store:Storage, room_id:str):
-        return store.repositories.chatRep.get_chat(room_id)
+    async def get_chat_room_id_from_room_id(store:Storage, room_id:str):
+        room_kind, chat_room_id = await store.room_index.lookup(room_id)
+        return chat_room_id if room_kind == CHAT_ROOM else None
     
     @staticmethod
-    def find_chat_of_room(store, room:MatrixRoom):
+    async def find_chat_of_room(store, room:MatrixRoom):
+        return await Chat.get_existing(store, room.room_id)
 
-        chat_room_id = room.room_id
-
-        should_add_to_cache = False
-        chat = Chat.chat_cache.get(chat_room_id, None)
-        # Cache hit
-        if chat:
-            return chat
-
-        # Cache miss
-        chat = Chat.get_existing(store, chat_room_id)
-
-        if chat:
-            Chat.chat_cache[chat.chat_room_id] = chat
-            return chat
-        else:
-            return None
+    def _cache(self):
+        # Write-through, the repository setters invalidate the cached Chat
+        self.storage.model_cache.put("Chat", self.chat_room_id, self)
 
     @staticmethod
     async def create_chat_room(client:AsyncClient, user_id:str, invite:List[str] = []):
@@ -111,71 +110,66 @@ class Chat(object):
         response = await invite_to_room(client, user_id, self.chat_room_id)
         return response
 
-    def claim_chat(self, staff_id:str):
+    async def claim_chat(self, staff_id:str):
         # Claim the chat for staff member
 
-        staff = self.chatRep.get_assigned_staff(self.chat_room_id)
+        staff = await self.chatRep.get_assigned_staff(self.chat_room_id)
 
         # Check if staff not assigned to chat already
         if staff_id in [s['user_id'] for s in staff]:
             return
 
         # Assign staff member to the chat
-        self.chatRep.assign_staff_to_chat(self.chat_room_id, staff_id)
+        await self.chatRep.assign_staff_to_chat(self.chat_room_id, staff_id)
         
-    def claimfor_chat(self, support_id:str):
+    async def claimfor_chat(self, support_id:str):
         # Claim the chat for support member
 
-        support = self.chatRep.get_assigned_support(self.chat_room_id)
+        support = await self.chatRep.get_assigned_support(self.chat_room_id)
 
         # Check if support not assigned to ticket already
         if support_id in [s['user_id'] for s in support]:
             return
 
         # Assign support member to the ticket
-        self.chatRep.assign_support_to_chat(self.chat_room_id, support_id)
+        await self.chatRep.assign_support_to_chat(self.chat_room_id, support_id)
         
-    def get_assigned_support(self):
-        support = self.chatRep.get_assigned_support(self.chat_room_id)
+    async def get_assigned_support(self):
+        support = await self.chatRep.get_assigned_support(self.chat_room_id)
 
         return [s['user_id'] for s in support]
     
-    def unassign_support(self, support_id:str):
-        self.chatRep.remove_support_from_chat(self.chat_room_id, support_id)
+    async def unassign_support(self, support_id:str):
+        await self.chatRep.remove_support_from_chat(self.chat_room_id, support_id)
         
-    def unassign_staff(self, staff_id:str):
-        self.chatRep.remove_staff_from_chat(self.chat_room_id, staff_id)
+    async def unassign_staff(self, staff_id:str):
+        await self.chatRep.remove_staff_from_chat(self.chat_room_id, staff_id)
     
-    def get_assigned_staff(self):
-        staff = self.chatRep.get_assigned_staff(self.chat_room_id)
+    async def get_assigned_staff(self):
+        staff = await self.chatRep.get_assigned_staff(self.chat_room_id)
 
         return [s['user_id'] for s in staff]
         
-    def _close_chat(self):
-        self.chatRep.set_chat_closed_at(self.chat_room_id, datetime.now())
-        
-        # Remove from cache if closing chat
-        if Chat.chat_cache.get(self.chat_room_id):
-            Chat.chat_cache.pop(self.chat_room_id)
+    async def _close_chat(self):
+        self.closed_at = datetime.now()
+        await self.chatRep.set_chat_closed_at(self.chat_room_id, self.closed_at)
     
-    def _open_chat(self):
-        self.chatRep.set_chat_closed_at(self.chat_room_id, None)
-        
-        # Remove from cache if closing chat
-        if Chat.chat_cache.get(self.chat_room_id):
-            Chat.chat_cache.pop(self.chat_room_id)
+    async def _open_chat(self):
+        self.closed_at = None
+        await self.chatRep.set_chat_closed_at(self.chat_room_id, None)
             
-    def set_status(self, status:ChatStatus):
-        self.chatRep.set_chat_status(self.chat_room_id, status.value)
+    async def set_status(self, status:ChatStatus):
+        await self.chatRep.set_chat_status(self.chat_room_id, status.value)
         self.status = status
 
         if status == ChatStatus.CLOSED:
-            self._close_chat()
+            await self._close_chat()
         elif status == ChatStatus.OPEN:
-            self._open_chat()
-        elif status == ChatStatus.DELETED:
-            if Chat.chat_cache.get(self.chat_room_id):
-                Chat.chat_cache.pop(self.chat_room_id)
+            await self._open_chat()
+
+        self._cache()
 
-    def find_user_current_chat_room_id(self):
-        return self.userRep.get_user_current_chat_room_id(self.user_id)
+    async def find_user_current_chat_room_id(self):
+        # Through the loaded User, shared with the other lookups of the user
+        user = await User.get_existing(self.storage, self.user_id)
+        return user.current_chat_room_id if user else None
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List
+from typing import List, Optional
 from support_bot.models.Repositories.EventPairsRepository import EventPairsRepository
 from support_bot.storage import Storage
 
@@ -22,9 +22,9 @@ class EventPair(object):
         self.clone_event_id = clone_event_id
 
     @staticmethod
-    def get_event_pair(storage:Storage, room_id:str, event_id:str) -> EventPair:
+    async def get_event_pair(storage:Storage, room_id:str, event_id:str) -> EventPair:
         # Fetch event pair for that particular room/event combination
-        result = storage.repositories.eventPairsRep.get_room_event(room_id, event_id)
+        result = await storage.repositories.eventPairsRep.get_room_event(room_id, event_id)
         
         if result:
             result = EventPair(storage, room_id, event_id, result['clone_room_id'], result['clone_event_id'])
@@ -32,9 +32,9 @@ class EventPair(object):
         return result
     
     @staticmethod
-    def get_clone_event_pair(storage:Storage, clone_room_id:str, clone_event_id:str) -> EventPair:
+    async def get_clone_event_pair(storage:Storage, clone_room_id:str, clone_event_id:str) -> EventPair:
         # Fetch event pair for that particular room/event clone combination
-        result = storage.repositories.eventPairsRep.get_room_clone_event(clone_room_id, clone_event_id)
+        result = await storage.repositories.eventPairsRep.get_room_clone_event(clone_room_id, clone_event_id)
         
         if result:
             result = EventPair(storage, result['room_id'], result['event_id'], clone_room_id, clone_event_id)
@@ -42,20 +42,28 @@ class EventPair(object):
         return result
 
     @staticmethod
-    def delete_room_events(storage:Storage, room_id:str):
-        storage.repositories.eventPairsRep.delete_room_events(room_id)
+    async def get_counterpart(storage:Storage, room_id:str, event_id:str) -> Optional[SingleEvent]:
+        # The other event of the pair an event is part of, be it the original or the clone
+        result = await storage.repositories.eventPairsRep.get_counterpart(room_id, event_id)
+        if result:
+            return SingleEvent(*result)
+        return None
+
+    @staticmethod
+    async def delete_room_events(storage:Storage, room_id:str):
+        await storage.repositories.eventPairsRep.delete_room_events(room_id)
     
     @staticmethod
-    def delete_event(storage:Storage, room_id:str, event_id:str):
-        storage.repositories.eventPairsRep.delete_event(room_id, event_id)
+    async def delete_event(storage:Storage, room_id:str, event_id:str):
+        await storage.repositories.eventPairsRep.delete_event(room_id, event_id)
     
     @staticmethod
-    def delete_room_clone_events(storage:Storage, clone_room_id:str):
-        storage.repositories.eventPairsRep.delete_room_clone_events(clone_room_id)
+    async def delete_room_clone_events(storage:Storage, clone_room_id:str):
+        await storage.repositories.eventPairsRep.delete_room_clone_events(clone_room_id)
         
-    def store_event_pair(self):
+    async def store_event_pair(self):
         # Store event pair to associate ticket room messages with real rooms and vice versa.
-        self.eventPairsRep.put_clone_event(self.room_id, self.event_id, self.clone_room_id, self.clone_event_id)
+        await self.eventPairsRep.put_clone_event(self.room_id, self.event_id, self.clone_room_id, self.clone_event_id)
         
     def get_single_event(self):
         return SingleEvent(self.room_id, self.event_id)
@@ -1,23 +1,40 @@
 from __future__ import annotations
-from typing import List
+import json
+import logging
+import zlib
+from typing import List, Optional
+
+# noinspection PyPackageRequirements
+from nio import BadEvent, Event, UnknownBadEvent
+
 from support_bot.models.Repositories.IncomingEventsRepository import IncomingEventsRepository
 from support_bot.storage import Storage
 
+logger = logging.getLogger(__name__)
+
+# Largest compressed snapshot stored, events over it are fetched from the homeserver when copied
+MAX_SNAPSHOT_SIZE = 16384
+# Fields of the event kept in a snapshot
+SNAPSHOT_FIELDS = ("type", "event_id", "sender", "origin_server_ts", "content", "redacts")
+
 # Controller (External data)-> Service (Logic) -> Repository (sql queries)
 class IncomingEvent(object):
-    def __init__(self, storage:Storage, user_id:str, room_id:str, event_id:str):
+    def __init__(self, storage:Storage, user_id:str, room_id:str, event_id:str, id:int = None, payload:bytes = None):
         # Setup Storage bindings
         self.storage = storage
         self.incomingEventsRep:IncomingEventsRepository = self.storage.repositories.incomingEventsRep
         
+        self.id = id
         self.user_id = user_id
         self.room_id = room_id
         self.event_id = event_id
+        # Compressed snapshot of the (decrypted) event, None if not stored
+        self.payload = payload
 
     @staticmethod
-    def get_incoming_events(storage:Storage, user_id:str) -> List[IncomingEvent]:
+    async def get_incoming_events(storage:Storage, user_id:str) -> List[IncomingEvent]:
         # Fetch all incoming events from user that have not been sent to a ticket room
-        result = storage.repositories.incomingEventsRep.get_incoming_events(user_id)
+        result = await storage.repositories.incomingEventsRep.get_incoming_events(user_id)
         incoming_events = []
         
         for row in result:
@@ -27,11 +44,48 @@ class IncomingEvent(object):
         return incoming_events
 
     @staticmethod
-    def delete_user_incoming_events(storage:Storage, user_id:str):
-        storage.repositories.incomingEventsRep.delete_user_incoming_events(user_id)
+    async def get_oldest_incoming_events(storage:Storage, user_id:str, limit:int) -> List[IncomingEvent]:
+        # Fetch the oldest incoming events from user, in the order they were received
+        result = await storage.repositories.incomingEventsRep.get_oldest_incoming_events(user_id, limit)
+        return [
+            IncomingEvent(storage, user_id, row['room_id'], row['event_id'], row['id'], row['payload']) for row in result
+        ]
+
+    @staticmethod
+    async def delete_user_incoming_events(storage:Storage, user_id:str):
+        await storage.repositories.incomingEventsRep.delete_user_incoming_events(user_id)
         
-    def store_incoming_event(self):
+    async def store_incoming_event(self):
         # Store incoming event from user to be sent to a ticket room when created
-        self.incomingEventsRep.put_incoming_event(self.user_id, self.room_id, self.event_id)
-        
-    
\ No newline at end of file
+        await self.incomingEventsRep.put_incoming_event(self.user_id, self.room_id, self.event_id, self.payload)
+
+    @staticmethod
+    def snapshot(event: Event) -> Optional[bytes]:
+        """Compressed snapshot of the source of an event, None if it is too large to store"""
+        source = {field: event.source[field] for field in SNAPSHOT_FIELDS if field in event.source}
+        payload = zlib.compress(json.dumps(source, separators=(",", ":")).encode())
+        if len(payload) > MAX_SNAPSHOT_SIZE:
+            return None
+        return payload
+
+    @staticmethod
+    def load_snapshot(payload: bytes, event_id: str) -> Optional[Event]:
+        """The event rebuilt from a snapshot, None if it can't be"""
+        try:
+            event = Event.parse_event(json.loads(zlib.decompress(payload)))
+        except (zlib.error, ValueError) as e:
+            event = e
+        if isinstance(event, (Exception, BadEvent, UnknownBadEvent)):
+            logger.warning(f"Failed to restore the snapshot of event {event_id}: {event}")
+            return None
+        return event
+
+    def restore(self) -> Optional[Event]:
+        """The event rebuilt from its snapshot, None if there is none"""
+        if self.payload is None:
+            return None
+        return IncomingEvent.load_snapshot(self.payload, self.event_id)
+
+    async def delete(self):
+        # Delete the incoming event once it has been sent to a ticket room
+        await self.incomingEventsRep.delete_incoming_event(self.id)
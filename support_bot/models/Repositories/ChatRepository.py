@@ -1,6 +1,8 @@
+from support_bot.batch_loader import in_list_query, in_list_statements
 from support_bot.storage import Storage
 from enum import Enum
 from datetime import datetime
+from typing import Dict, List
 
 class ChatStatus(Enum):
     OPEN = "open"
@@ -8,84 +10,132 @@ class ChatStatus(Enum):
     DELETED = "deleted"
 
 class ChatRepository(object):
+    statements = {
+        "create_chat": """
+            INSERT INTO Chats (user_id, chat_room_id, created_at) values (?, ?, ?);
+        """,
+        "get_chat": """
+            SELECT chat_room_id FROM Chats WHERE chat_room_id= ?;
+        """,
+        "assign_staff_to_chat": """
+            insert into ChatsStaffRelation (chat_room_id, staff_id) values (?, ?);
+        """,
+        "get_assigned_staff": """
+            SELECT staff_id FROM ChatsStaffRelation WHERE chat_room_id = ?;
+        """,
+        "assign_support_to_chat": """
+            insert into ChatsSupportRelation (chat_room_id, support_id) values (?, ?);
+        """,
+        "get_assigned_support": """
+            SELECT support_id FROM ChatsSupportRelation WHERE chat_room_id = ?;
+        """,
+        "remove_support_from_chat": """
+            DELETE FROM ChatsSupportRelation WHERE chat_room_id= ? AND support_id= ?
+        """,
+        "set_chat_status": """
+            UPDATE Chats SET status= ? WHERE chat_room_id=?
+        """,
+        "get_chat_status": """
+            SELECT status FROM Chats WHERE chat_room_id=?
+        """,
+        "set_chat_closed_at": """
+            UPDATE Chats SET closed_at= ? WHERE chat_room_id=?
+        """,
+        "remove_staff_from_chat": """
+            DELETE FROM ChatsStaffRelation WHERE chat_room_id= ? AND staff_id= ?
+        """,
+        "get_all_fields": """
+            select chat_room_id, user_id, status, created_at, closed_at from Chats where chat_room_id = ?;
+        """,
+        **in_list_statements("get_all_fields_many", """
+            select chat_room_id, user_id, status, created_at, closed_at from Chats where chat_room_id IN ({});
+        """),
+        "get_chat_rooms": """
+            SELECT chat_room_id FROM Chats
+        """,
+        "get_open_chats": """
+            SELECT chat_room_id, user_id FROM Chats WHERE status=?
+        """,
+        "get_open_chats_of_staff": """
+            SELECT t.chat_room_id, user_id FROM Chats t JOIN ChatsStaffRelation ts ON t.chat_room_id=ts.chat_room_id WHERE status=? AND staff_id=?
+        """,
+    }
+
     def __init__(self, storage: Storage) -> None:
         self.storage = storage
+        self.sql = storage.statements.register("Chat", self.statements)
 
-    def create_chat(self, user_id: str, chat_room_id: str, created_at:datetime):
-        self.storage._execute("""
-            INSERT INTO Chats (user_id, chat_room_id, created_at) values (?, ?, ?);
-        """, (user_id, chat_room_id, created_at,))
+    async def create_chat(self, user_id: str, chat_room_id: str, created_at:datetime):
+        await self.storage.execute(self.sql["create_chat"], (user_id, chat_room_id, created_at,))
+        self.storage.model_cache.invalidate("Chat", chat_room_id)
+        self.storage.room_index.add_chat(chat_room_id)
 
-    def get_chat(self, chat_room_id: str):
-        self.storage._execute("SELECT chat_room_id FROM Chats WHERE chat_room_id= ?;", (chat_room_id,))
-        chat_room_id = self.storage.cursor.fetchone()
+    async def get_chat(self, chat_room_id: str):
+        chat_room_id = await self.storage.fetchone(self.sql["get_chat"], (chat_room_id,))
         if chat_room_id:
             return chat_room_id[0]
         return chat_room_id
 
-    def assign_staff_to_chat(self, chat_room_id: str, staff_id: str):
-        self.storage._execute("""
-            insert into ChatsStaffRelation (chat_room_id, staff_id) values (?, ?);
-        """, (chat_room_id, staff_id,))
+    async def assign_staff_to_chat(self, chat_room_id: str, staff_id: str):
+        await self.storage.execute(self.sql["assign_staff_to_chat"], (chat_room_id, staff_id,))
 
-    def get_assigned_staff(self, chat_room_id: str):
-        self.storage._execute("""
-            SELECT staff_id FROM ChatsStaffRelation WHERE chat_room_id = ?;
-        """, (chat_room_id,))
-        staff = self.storage.cursor.fetchall()
+    async def get_assigned_staff(self, chat_room_id: str):
+        staff = await self.storage.fetchall(self.sql["get_assigned_staff"], (chat_room_id,))
         return [
             {
                 "user_id": row[0],
             } for row in staff
         ]
 
-    def assign_support_to_chat(self, chat_room_id: int, support_id:str):
-        self.storage._execute("""
-            insert into ChatsSupportRelation (chat_room_id, support_id) values (?, ?);
-        """, (chat_room_id, support_id,))
+    async def assign_support_to_chat(self, chat_room_id: int, support_id:str):
+        await self.storage.execute(self.sql["assign_support_to_chat"], (chat_room_id, support_id,))
 
-    def get_assigned_support(self, chat_room_id:int):
-        self.storage._execute("""
-            SELECT support_id FROM ChatsSupportRelation WHERE chat_room_id = ?;
-        """, (chat_room_id,))
-        support = self.storage.cursor.fetchall()
+    async def get_assigned_support(self, chat_room_id:int):
+        support = await self.storage.fetchall(self.sql["get_assigned_support"], (chat_room_id,))
         return [
             {
                 "user_id": row[0],
             } for row in support
         ]
 
-    def remove_support_from_chat(self, chat_room_id: int, support_id:str):
-        self.storage._execute("""
-            DELETE FROM ChatsSupportRelation WHERE chat_room_id= ? AND support_id= ?
-        """, (chat_room_id, support_id))
+    async def remove_support_from_chat(self, chat_room_id: int, support_id:str):
+        await self.storage.execute(self.sql["remove_support_from_chat"], (chat_room_id, support_id))
         
-    def set_chat_status(self, chat_room_id:int, status:str):
-        self.storage._execute("""
-            UPDATE Chats SET status= ? WHERE chat_room_id=?
-        """, (status, chat_room_id))
+    async def set_chat_status(self, chat_room_id:int, status:str):
+        await self.storage.execute(self.sql["set_chat_status"], (status, chat_room_id))
+        self.storage.model_cache.invalidate("Chat", chat_room_id)
     
-    def get_chat_status(self, chat_room_id: int):
-        self.storage._execute("""
-            SELECT status FROM Chats WHERE chat_room_id=?
-        """, (chat_room_id,))
+    async def get_chat_status(self, chat_room_id: int):
+        status = await self.storage.fetchone(self.sql["get_chat_status"], (chat_room_id,))
+        if status:
+            return status[0]
+        return status
         
-    def set_chat_closed_at(self, chat_room_id:int, closed_at:datetime):
-        self.storage._execute("""
-            UPDATE Chats SET closed_at= ? WHERE chat_room_id=?
-        """, (closed_at, chat_room_id))
+    async def set_chat_closed_at(self, chat_room_id:int, closed_at:datetime):
+        await self.storage.execute(self.sql["set_chat_closed_at"], (closed_at, chat_room_id))
+        self.storage.model_cache.invalidate("Chat", chat_room_id)
         
-    def remove_staff_from_chat(self, chat_room_id: str, staff_id: str):
-        self.storage._execute("""
-            DELETE FROM ChatsStaffRelation WHERE chat_room_id= ? AND staff_id= ?
-        """, (chat_room_id, staff_id))
+    async def remove_staff_from_chat(self, chat_room_id: str, staff_id: str):
+        await self.storage.execute(self.sql["remove_staff_from_chat"], (chat_room_id, staff_id))
 
-    def get_all_fields(self, chat_room_id: str):
-        self.storage._execute("""
-            select chat_room_id, user_id, status, created_at, closed_at from Chats where chat_room_id = ?;
-        """, (chat_room_id,))
-        row = self.storage.cursor.fetchone()
+    async def get_all_fields(self, chat_room_id: str):
+        row = await self.storage.fetchone(self.sql["get_all_fields"], (chat_room_id,))
+        if row is None:
+            return None
+        return self._fields(row)
+
+    async def get_all_fields_many(self, chat_room_ids: List[str]) -> Dict[str, dict]:
+        """Fields of up to MAX_BATCH chats by chat_room_id, missing chats are left out"""
+        if len(chat_room_ids) == 1:
+            fields = await self.get_all_fields(chat_room_ids[0])
+            return {chat_room_ids[0]: fields} if fields else {}
 
+        statement, params = in_list_query(self.sql, "get_all_fields_many", chat_room_ids)
+        rows = await self.storage.fetchall(statement, params)
+        return {row[0]: self._fields(row) for row in rows}
+
+    @staticmethod
+    def _fields(row) -> dict:
         return {
             "chat_room_id": row[0],
             "user_id": row[1],
@@ -94,12 +144,11 @@ class ChatRepository(object):
             "closed_at": row[4],
         }
         
-    def get_open_chats(self):
-        self.storage._execute("""
-            SELECT chat_room_id, user_id FROM Chats WHERE status=?
-        """, (ChatStatus.OPEN.value,))
+    async def get_chat_rooms(self):
+        return [row[0] for row in await self.storage.fetchall(self.sql["get_chat_rooms"])]
 
-        chats = self.storage.cursor.fetchall()
+    async def get_open_chats(self):
+        chats = await self.storage.fetchall(self.sql["get_open_chats"], (ChatStatus.OPEN.value,))
         return [
             {
                 'chat_room_id':chat[0],
@@ -107,12 +156,8 @@ class ChatRepository(object):
             } for chat in chats
         ]
 
-    def get_open_chats_of_staff(self, staff_id:str):
-        self.storage._execute("""
-            SELECT chat_room_id, user_id FROM Chats t JOIN ChatsStaffRelation ts ON t.chat_room_id=ts.chat_room_id WHERE status=? AND staff_id=?
-        """, (ChatStatus.OPEN.value, staff_id, ))
-
-        chats = self.storage.cursor.fetchall()
+    async def get_open_chats_of_staff(self, staff_id:str):
+        chats = await self.storage.fetchall(self.sql["get_open_chats_of_staff"], (ChatStatus.OPEN.value, staff_id, ))
         return [
             {
                 'chat_room_id':chat[0],
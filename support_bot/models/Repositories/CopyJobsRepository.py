@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import List, Optional
+
+from support_bot.storage import Storage
+
+class CopyJobsRepository(object):
+    statements = {
+        "create_job": """
+            INSERT INTO CopyJobs (ticket_id, user_id, room_id, report_room_id, created_at) VALUES (?, ?, ?, ?, ?) RETURNING id;
+        """,
+        "get_jobs": """
+            SELECT id, ticket_id, user_id, room_id, report_room_id, copied, failed FROM CopyJobs ORDER BY id;
+        """,
+        "update_progress": """
+            UPDATE CopyJobs SET copied = ?, failed = ? WHERE id = ?;
+        """,
+        "delete_job": """
+            DELETE FROM CopyJobs WHERE id = ?;
+        """,
+    }
+
+    def __init__(self, storage:Storage) -> None:
+        self.storage = storage
+        self.sql = storage.statements.register("CopyJobs", self.statements)
+
+    async def create_job(self, ticket_id:int, user_id:str, room_id:str, report_room_id:str) -> Optional[int]:
+        inserted_id = await self.storage.fetchone(
+            self.sql["create_job"], (ticket_id, user_id, room_id, report_room_id, datetime.now(),)
+        )
+        if inserted_id:
+            return inserted_id[0]
+        return None
+
+    async def get_jobs(self) -> List[dict]:
+        jobs = await self.storage.fetchall(self.sql["get_jobs"])
+        return [
+            {
+                "id": row[0],
+                "ticket_id": row[1],
+                "user_id": row[2],
+                "room_id": row[3],
+                "report_room_id": row[4],
+                "copied": row[5],
+                "failed": row[6],
+            } for row in jobs
+        ]
+
+    async def update_progress(self, job_id:int, copied:int, failed:int):
+        await self.storage.execute(self.sql["update_progress"], (copied, failed, job_id,))
+
+    async def delete_job(self, job_id:int):
+        await self.storage.execute(self.sql["delete_job"], (job_id,))
@@ -1,14 +1,89 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
 from support_bot.storage import Storage
 
 class EventPairsRepository(object):
+    # Most recently used pairs kept, by either of their events
+    cache_size = 4096
+
+    statements = {
+        "get_room_event": """
+            SELECT clone_room_id, clone_event_id FROM EventPairs WHERE room_id = ? AND event_id = ?;
+        """,
+        "get_room_clone_event": """
+            SELECT room_id, event_id FROM EventPairs WHERE clone_room_id = ? AND clone_event_id = ?;
+        """,
+        "get_counterpart": """
+            SELECT clone_room_id, clone_event_id FROM EventPairs WHERE room_id = ? AND event_id = ?
+            UNION ALL
+            SELECT room_id, event_id FROM EventPairs WHERE clone_room_id = ? AND clone_event_id = ?
+            LIMIT 1;
+        """,
+        "put_clone_event": """
+            INSERT INTO EventPairs (room_id, event_id, clone_room_id, clone_event_id, created_at) values (?, ?, ?, ?, ?);
+        """,
+        "delete_room_events": """
+            DELETE FROM EventPairs WHERE room_id= ?;
+        """,
+        "delete_room_clone_events": """
+            DELETE FROM EventPairs WHERE clone_room_id= ?;
+        """,
+        "delete_event": """
+            DELETE FROM EventPairs WHERE room_id= ? AND event_id= ?;
+        """,
+    }
+
     def __init__(self, storage:Storage) -> None:
         self.storage = storage
+        self.sql = storage.statements.register("EventPairs", self.statements)
+        self._counterparts: OrderedDict[Tuple[str, str], Tuple[str, str]] = OrderedDict()
 
-    def get_room_event(self, room_id:str, event_id:str):
-        self.storage._execute("""
-            SELECT clone_room_id, clone_event_id FROM EventPairs WHERE room_id = ? AND event_id = ?;
-        """, (room_id, event_id,))
-        clone_event = self.storage.cursor.fetchone()
+        # Counters
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _remember(self, room_id:str, event_id:str, clone_room_id:str, clone_event_id:str):
+        for key, counterpart in (((room_id, event_id), (clone_room_id, clone_event_id)),
+                                 ((clone_room_id, clone_event_id), (room_id, event_id))):
+            self._counterparts[key] = counterpart
+            self._counterparts.move_to_end(key)
+        while len(self._counterparts) > self.cache_size:
+            self._counterparts.popitem(last=False)
+
+    def _forget(self, matches):
+        for key in [key for key, counterpart in self._counterparts.items() if matches(key) or matches(counterpart)]:
+            del self._counterparts[key]
+
+    async def get_counterpart(self, room_id:str, event_id:str) -> Optional[Tuple[str, str]]:
+        """The (room_id, event_id) paired with an event, whether it is the original or the clone"""
+        counterpart = self._counterparts.get((room_id, event_id))
+        if counterpart:
+            self._counterparts.move_to_end((room_id, event_id))
+            self.cache_hits += 1
+            return counterpart
+
+        self.cache_misses += 1
+        for pending in self.storage.pending_writes(self.sql["put_clone_event"]):
+            if (pending[0], pending[1]) == (room_id, event_id) or (pending[2], pending[3]) == (room_id, event_id):
+                self._remember(*pending[:4])
+                return self._counterparts[(room_id, event_id)]
+
+        row = await self.storage.fetchone(self.sql["get_counterpart"], (room_id, event_id, room_id, event_id,))
+        if row:
+            self._remember(room_id, event_id, row[0], row[1])
+            return row[0], row[1]
+        return None
+
+    async def get_room_event(self, room_id:str, event_id:str):
+        for pending in self.storage.pending_writes(self.sql["put_clone_event"]):
+            if pending[0] == room_id and pending[1] == event_id:
+                return {
+                        "clone_room_id": pending[2],
+                        "clone_event_id": pending[3],
+                    }
+        clone_event = await self.storage.fetchone(self.sql["get_room_event"], (room_id, event_id,))
         if clone_event:
             return {
                     "clone_room_id": clone_event[0],
@@ -16,11 +91,14 @@ class EventPairsRepository(object):
                 }
         return None
     
-    def get_room_clone_event(self, clone_room_id:str, clone_event_id:str):
-        self.storage._execute("""
-            SELECT room_id, event_id FROM EventPairs WHERE clone_room_id = ? AND clone_event_id = ?;
-        """, (clone_room_id, clone_event_id,))
-        event = self.storage.cursor.fetchone()
+    async def get_room_clone_event(self, clone_room_id:str, clone_event_id:str):
+        for pending in self.storage.pending_writes(self.sql["put_clone_event"]):
+            if pending[2] == clone_room_id and pending[3] == clone_event_id:
+                return {
+                        "room_id": pending[0],
+                        "event_id": pending[1],
+                    }
+        event = await self.storage.fetchone(self.sql["get_room_clone_event"], (clone_room_id, clone_event_id,))
         if event:
             return {
                     "room_id": event[0],
@@ -28,22 +106,23 @@ class EventPairsRepository(object):
                 }
         return None
     
-    def put_clone_event(self, room_id:str, event_id:str, clone_room_id:str, clone_event_id:str):
-        self.storage._execute("""
-            INSERT INTO EventPairs (room_id, event_id, clone_room_id, clone_event_id) values (?, ?, ?, ?);
-        """, (room_id, event_id, clone_room_id, clone_event_id,))
+    async def put_clone_event(self, room_id:str, event_id:str, clone_room_id:str, clone_event_id:str):
+        await self.storage.write(self.sql["put_clone_event"], (room_id, event_id, clone_room_id, clone_event_id, datetime.now(),))
+        self._remember(room_id, event_id, clone_room_id, clone_event_id)
     
-    def delete_room_events(self, room_id:str):
-        self.storage._execute("""
-            DELETE FROM EventPairs WHERE room_id= ?;
-        """, (room_id,))
+    async def delete_room_events(self, room_id:str):
+        await self.storage.flush_writes()
+        await self.storage.execute(self.sql["delete_room_events"], (room_id,))
+        self._forget(lambda event: event[0] == room_id)
     
-    def delete_room_clone_events(self, clone_room_id:str):
-        self.storage._execute("""
-            DELETE FROM EventPairs WHERE clone_room_id= ?;
-        """, (clone_room_id,))
+    async def delete_room_clone_events(self, clone_room_id:str):
+        await self.storage.flush_writes()
+        await self.storage.execute(self.sql["delete_room_clone_events"], (clone_room_id,))
+        self._forget(lambda event: event[0] == clone_room_id)
     
-    def delete_event(self, room_id:str, event_id:str):
-        self.storage._execute("""
-            DELETE FROM EventPairs WHERE room_id= ? AND event_id= ?;
-        """, (room_id, event_id,))
\ No newline at end of file
+    async def delete_event(self, room_id:str, event_id:str):
+        await self.storage.flush_writes()
+        await self.storage.execute(self.sql["delete_event"], (room_id, event_id,))
+        counterpart = self._counterparts.pop((room_id, event_id), None)
+        if counterpart:
+            self._counterparts.pop(counterpart, None)
@@ -1,14 +1,49 @@
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from support_bot.retention import DEFAULT_POLICIES
 from support_bot.storage import Storage
 
 class IncomingEventsRepository(object):
+    # Newest incoming events kept per user, older ones are dropped as new ones arrive. Set from
+    # retention.tables.incoming_events.max_per_user, which the retention job also enforces, 0 keeps all
+    max_per_user = DEFAULT_POLICIES["incoming_events"]["max_per_user"]
+    # Inserts of a user between trims of the older events
+    trim_every = 16
+
+    statements = {
+        "get_incoming_events": """
+            SELECT room_id, event_id FROM IncomingEvents WHERE user_id = ?;
+        """,
+        "get_oldest_incoming_events": """
+            SELECT id, room_id, event_id, payload FROM IncomingEvents WHERE user_id = ? ORDER BY created_at, id LIMIT ?;
+        """,
+        "put_incoming_event": """
+            INSERT INTO IncomingEvents (user_id, room_id, event_id, created_at, payload) values (?, ?, ?, ?, ?);
+        """,
+        "trim_user_incoming_events": """
+            DELETE FROM IncomingEvents WHERE id IN (
+                SELECT id FROM IncomingEvents WHERE user_id = ? ORDER BY id DESC LIMIT ? OFFSET ?
+            );
+        """,
+        "delete_user_incoming_events": """
+            DELETE FROM IncomingEvents WHERE user_id= ?;
+        """,
+        "delete_incoming_event": """
+            DELETE FROM IncomingEvents WHERE id = ?;
+        """,
+    }
+
     def __init__(self, storage:Storage) -> None:
         self.storage = storage
+        self.sql = storage.statements.register("IncomingEvents", self.statements)
+        self._puts_since_trim = Counter()
 
-    def get_incoming_events(self, user_id:str):
-        self.storage._execute("""
-            SELECT room_id, event_id FROM IncomingEvents WHERE user_id = ?;
-        """, (user_id,))
-        incoming_events = self.storage.cursor.fetchall()
+    async def get_incoming_events(self, user_id:str):
+        # Buffered events are flushed rather than merged, a batch committing in between would duplicate them
+        await self.storage.flush_writes()
+        incoming_events = await self.storage.fetchall(self.sql["get_incoming_events"], (user_id,))
         return [
             {
                 "room_id": row[0],
@@ -16,12 +51,33 @@ class IncomingEventsRepository(object):
             } for row in incoming_events
         ]
     
-    def put_incoming_event(self, user_id:str, room_id:str, event_id:str):
-        self.storage._execute("""
-            INSERT INTO IncomingEvents (user_id, room_id, event_id) values (?, ?, ?);
-        """, (user_id, room_id, event_id,))
+    async def put_incoming_event(self, user_id:str, room_id:str, event_id:str, payload:Optional[bytes] = None):
+        await self.storage.write(self.sql["put_incoming_event"], (user_id, room_id, event_id, datetime.now(), payload,))
+
+        # Ring buffer of the newest events, trimmed every few inserts rather than on each one
+        if self.max_per_user <= 0:
+            return
+        self._puts_since_trim[user_id] += 1
+        if self._puts_since_trim[user_id] >= self.trim_every:
+            del self._puts_since_trim[user_id]
+            await self.storage.write(self.sql["trim_user_incoming_events"], (user_id, self.max_per_user, self.max_per_user,))
     
-    def delete_user_incoming_events(self, user_id:str):
-        self.storage._execute("""
-            DELETE FROM IncomingEvents WHERE user_id= ?;
-        """, (user_id,))
\ No newline at end of file
+    async def delete_user_incoming_events(self, user_id:str):
+        self._puts_since_trim.pop(user_id, None)
+        await self.storage.flush_writes()
+        await self.storage.execute(self.sql["delete_user_incoming_events"], (user_id,))
+
+    async def get_oldest_incoming_events(self, user_id:str, limit:int):
+        await self.storage.flush_writes()
+        incoming_events = await self.storage.fetchall(self.sql["get_oldest_incoming_events"], (user_id, limit,))
+        return [
+            {
+                "id": row[0],
+                "room_id": row[1],
+                "event_id": row[2],
+                "payload": bytes(row[3]) if row[3] is not None else None,
+            } for row in incoming_events
+        ]
+
+    async def delete_incoming_event(self, id:int):
+        await self.storage.execute(self.sql["delete_incoming_event"], (id,))
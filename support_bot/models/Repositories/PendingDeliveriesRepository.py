@@ -0,0 +1,47 @@
+from typing import List, Optional
+
+from support_bot.storage import Storage
+
+class PendingDeliveriesRepository(object):
+    statements = {
+        "put_delivery": """
+            INSERT INTO PendingDeliveries (kind, room_id, source_room_id, text, payload, queued_at) VALUES (?, ?, ?, ?, ?, ?) RETURNING id;
+        """,
+        "get_deliveries": """
+            SELECT id, kind, room_id, source_room_id, text, payload, queued_at FROM PendingDeliveries ORDER BY id;
+        """,
+        "delete_delivery": """
+            DELETE FROM PendingDeliveries WHERE id = ?;
+        """,
+    }
+
+    def __init__(self, storage:Storage) -> None:
+        self.storage = storage
+        self.sql = storage.statements.register("PendingDeliveries", self.statements)
+
+    async def put_delivery(
+        self, kind:str, room_id:str, source_room_id:str, text:Optional[str], payload:Optional[bytes], queued_at:int,
+    ) -> Optional[int]:
+        inserted_id = await self.storage.fetchone(
+            self.sql["put_delivery"], (kind, room_id, source_room_id, text, payload, queued_at,)
+        )
+        if inserted_id:
+            return inserted_id[0]
+        return None
+
+    async def get_deliveries(self) -> List[dict]:
+        deliveries = await self.storage.fetchall(self.sql["get_deliveries"])
+        return [
+            {
+                "id": row[0],
+                "kind": row[1],
+                "room_id": row[2],
+                "source_room_id": row[3],
+                "text": row[4],
+                "payload": bytes(row[5]) if row[5] is not None else None,
+                "queued_at": row[6],
+            } for row in deliveries
+        ]
+
+    async def delete_delivery(self, delivery_id:int):
+        await self.storage.execute(self.sql["delete_delivery"], (delivery_id,))
@@ -1,6 +1,8 @@
 from support_bot.models.Repositories.ChatRepository import ChatRepository
+from support_bot.models.Repositories.CopyJobsRepository import CopyJobsRepository
 from support_bot.models.Repositories.EventPairsRepository import EventPairsRepository
 from support_bot.models.Repositories.IncomingEventsRepository import IncomingEventsRepository
+from support_bot.models.Repositories.PendingDeliveriesRepository import PendingDeliveriesRepository
 from support_bot.models.Repositories.StaffRepository import StaffRepository
 from support_bot.models.Repositories.SupportRepository import SupportRepository
 from support_bot.models.Repositories.TicketLabelsRepository import TicketLabelsRepository
@@ -20,4 +22,6 @@ class Repositories(object):
         self.chatRep = ChatRepository(self.storage)
         self.incomingEventsRep = IncomingEventsRepository(self.storage)
         self.eventPairsRep = EventPairsRepository(self.storage)
-        self.ticketLabelsRep = TicketLabelsRepository(self.storage)
\ No newline at end of file
+        self.ticketLabelsRep = TicketLabelsRepository(self.storage)
+        self.copyJobsRep = CopyJobsRepository(self.storage)
+        self.pendingDeliveriesRep = PendingDeliveriesRepository(self.storage)
\ No newline at end of file
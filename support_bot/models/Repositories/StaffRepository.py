@@ -1,27 +1,39 @@
 from support_bot.storage import Storage
 
 class StaffRepository(object):
+    statements = {
+        "create_staff": """
+            insert into Staff (user_id) values (?);
+        """,
+        "get_staff": """
+            SELECT user_id FROM Staff WHERE user_id= ?;
+        """,
+        "get_all_staff": """
+            SELECT user_id FROM Staff;
+        """,
+        "delete_staff": """
+            DELETE FROM Staff WHERE user_id= ?;
+        """,
+    }
+
     def __init__(self, storage:Storage) -> None:
         self.storage = storage
+        self.sql = storage.statements.register("Staff", self.statements)
         
-    def create_staff(self, user_id:str):
-        self.storage._execute("""
-            insert into Staff (user_id) values (?);
-        """, (user_id,))
+    async def create_staff(self, user_id:str):
+        await self.storage.execute(self.sql["create_staff"], (user_id,))
+        self.storage.authorization.add_staff(user_id)
         
-    def get_staff(self, user_id:str):
-        self.storage._execute("SELECT user_id FROM Staff WHERE user_id= ?;", (user_id,))
-        id = self.storage.cursor.fetchone()
+    async def get_staff(self, user_id:str):
+        id = await self.storage.fetchone(self.sql["get_staff"], (user_id,))
         if id:
             return id[0]
         return id
     
-    def get_all_staff(self):
-        self.storage._execute("SELECT user_id FROM Staff;")
-        staff = self.storage.cursor.fetchall()
+    async def get_all_staff(self):
+        staff = await self.storage.fetchall(self.sql["get_all_staff"])
         return [row[0] for row in staff ]
     
-    def delete_staff(self, user_id:str):
-        self.storage._execute("""
-            DELETE FROM Staff WHERE user_id= ?;
-        """, (user_id,))
\ No newline at end of file
+    async def delete_staff(self, user_id:str):
+        await self.storage.execute(self.sql["delete_staff"], (user_id,))
+        self.storage.authorization.remove_staff(user_id)
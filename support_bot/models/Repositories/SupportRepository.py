@@ -1,22 +1,39 @@
 from support_bot.storage import Storage
 
 class SupportRepository(object):
+    statements = {
+        "create_support": """
+            insert into Support (user_id) values (?);
+        """,
+        "get_support": """
+            SELECT user_id FROM Support WHERE user_id= ?;
+        """,
+        "get_all_support": """
+            SELECT user_id FROM Support;
+        """,
+        "delete_support": """
+            DELETE FROM Support WHERE user_id= ?;
+        """,
+    }
+
     def __init__(self, storage:Storage) -> None:
         self.storage = storage
+        self.sql = storage.statements.register("Support", self.statements)
         
-    def create_support(self, user_id:str):
-        self.storage._execute("""
-            insert into Support (user_id) values (?);
-        """, (user_id,))
+    async def create_support(self, user_id:str):
+        await self.storage.execute(self.sql["create_support"], (user_id,))
+        self.storage.authorization.add_support(user_id)
         
-    def get_support(self, user_id:str):
-        self.storage._execute("SELECT user_id FROM Support WHERE user_id= ?;", (user_id,))
-        id = self.storage.cursor.fetchone()
+    async def get_support(self, user_id:str):
+        id = await self.storage.fetchone(self.sql["get_support"], (user_id,))
         if id:
             return id[0]
         return id
     
-    def delete_support(self, user_id:str):
-        self.storage._execute("""
-            DELETE FROM Support WHERE user_id= ?;
-        """, (user_id,))
\ No newline at end of file
+    async def get_all_support(self):
+        support = await self.storage.fetchall(self.sql["get_all_support"])
+        return [row[0] for row in support ]
+    
+    async def delete_support(self, user_id:str):
+        await self.storage.execute(self.sql["delete_support"], (user_id,))
+        self.storage.authorization.remove_support(user_id)
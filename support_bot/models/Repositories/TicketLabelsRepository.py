@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Union
+from typing import Optional, Union
 from support_bot.storage import Storage
 
 @dataclass
@@ -16,74 +16,86 @@ class TicketLabelData():
         self.hex_color = hex_color
 
 class TicketLabelsRepository(object):
+    statements = {
+        "create_label": """
+            insert into TicketLabels (name, description, hex_color) values (?,?,?) RETURNING id;
+        """,
+        "get_label": """
+            SELECT id FROM TicketLabels WHERE id= ?;
+        """,
+        "delete_label": """
+            DELETE FROM TicketLabels WHERE id= ?;
+        """,
+        "get_all_fields": """
+            select id, name, description, hex_color from TicketLabels where id = ?;
+        """,
+        "set_label_name": """
+            UPDATE TicketLabels SET name= ? WHERE id=?
+        """,
+        "set_label_description": """
+            UPDATE TicketLabels SET description= ? WHERE id=?
+        """,
+        "set_label_color": """
+            UPDATE TicketLabels SET hex_color= ? WHERE id=?
+        """,
+        "assign_label_to_ticket": """
+            insert into TicketsTicketLabelsRelation (ticket_label_id, ticket_id) values (?, ?);
+        """,
+        "remove_label_from_ticket": """
+            DELETE FROM TicketsTicketLabelsRelation WHERE ticket_label_id= ? AND ticket_id= ?
+        """,
+        "get_all_labels": """
+            SELECT id, name, description, hex_color from TicketLabels
+        """,
+        "get_ticket_label_ids": """
+            SELECT ticket_label_id FROM TicketsTicketLabelsRelation WHERE ticket_id = ?;
+        """,
+    }
+
     def __init__(self, storage:Storage) -> None:
         self.storage = storage
+        self.sql = storage.statements.register("TicketLabels", self.statements)
         
-    def create_label(self, name:str, description:str, hex_color:str) -> Union[int, None]:
-        self.storage._execute("""
-            insert into TicketLabels (name, description, hex_color) values (?,?,?) RETURNING id;
-        """, (name, description, hex_color,))
-        inserted_id = self.storage.cursor.fetchone()
+    async def create_label(self, name:str, description:str, hex_color:str) -> Union[int, None]:
+        inserted_id = await self.storage.fetchone(self.sql["create_label"], (name, description, hex_color,))
         if inserted_id:
             return inserted_id[0]
         return inserted_id
         
-    def get_label(self, label_id:int) -> Union[int, None]:
-        self.storage._execute("SELECT id FROM TicketLabels WHERE id= ?;", (label_id,))
-        id = self.storage.cursor.fetchone()
+    async def get_label(self, label_id:int) -> Union[int, None]:
+        id = await self.storage.fetchone(self.sql["get_label"], (label_id,))
         if id:
             return id[0]
         return id
     
-    def delete_label(self, label_id:int):
-        self.storage._execute("""
-            DELETE FROM TicketLabels WHERE id= ?;
-        """, (label_id,))
+    async def delete_label(self, label_id:int):
+        await self.storage.execute(self.sql["delete_label"], (label_id,))
         
-    def get_all_fields(self, label_id:int) -> TicketLabelData:
-        self.storage._execute("""
-            select id, name, description, hex_color from TicketLabels where id = ?;
-        """, (label_id,))
-        row = self.storage.cursor.fetchone()
+    async def get_all_fields(self, label_id:int) -> Optional[TicketLabelData]:
+        row = await self.storage.fetchone(self.sql["get_all_fields"], (label_id,))
+        if row is None:
+            return None
         return TicketLabelData(*row)
     
-    def set_label_name(self, label_id:int, name:str):
-        self.storage._execute("""
-            UPDATE TicketLabels SET name= ? WHERE id=?
-        """, (name, label_id))
+    async def set_label_name(self, label_id:int, name:str):
+        await self.storage.execute(self.sql["set_label_name"], (name, label_id))
             
-    def set_label_description(self, label_id:int, description:str):
-        self.storage._execute("""
-            UPDATE TicketLabels SET description= ? WHERE id=?
-        """, (description, label_id))
+    async def set_label_description(self, label_id:int, description:str):
+        await self.storage.execute(self.sql["set_label_description"], (description, label_id))
             
-    def set_label_color(self, label_id:int, color:str):
-        self.storage._execute("""
-            UPDATE TicketLabels SET color= ? WHERE id=?
-        """, (color, label_id))
+    async def set_label_color(self, label_id:int, color:str):
+        await self.storage.execute(self.sql["set_label_color"], (color, label_id))
     
-    def assign_label_to_ticket(self, label_id:int, ticket_id: int):
-        self.storage._execute("""
-            insert into TicketsTicketLabelsRelation (ticket_label_id, ticket_id) values (?, ?);
-        """, (label_id, ticket_id,))
+    async def assign_label_to_ticket(self, label_id:int, ticket_id: int):
+        await self.storage.execute(self.sql["assign_label_to_ticket"], (label_id, ticket_id,))
         
-    def remove_label_from_ticket(self, label_id:int, ticket_id: int):
-        self.storage._execute("""
-            DELETE FROM TicketsTicketLabelsRelation WHERE ticket_label_id= ? AND ticket_id= ?
-        """, (label_id, ticket_id))
+    async def remove_label_from_ticket(self, label_id:int, ticket_id: int):
+        await self.storage.execute(self.sql["remove_label_from_ticket"], (label_id, ticket_id))
         
-    def get_all_labels(self) -> [TicketLabelData]:
-        self.storage._execute("""
-            SELECT id, name, description, hex_color from TicketLabels
-        """, ())
-
-        labels = self.storage.cursor.fetchall()
+    async def get_all_labels(self) -> [TicketLabelData]:
+        labels = await self.storage.fetchall(self.sql["get_all_labels"], ())
         return [TicketLabelData(*label) for label in labels]
 
-    def get_ticket_label_ids(self, ticket_id:int) -> [int]:
-        self.storage._execute("""
-            SELECT ticket_label_id FROM TicketsTicketLabelsRelation WHERE ticket_id = ?;
-        """, (ticket_id,))
-
-        label_ids = self.storage.cursor.fetchall()
+    async def get_ticket_label_ids(self, ticket_id:int) -> [int]:
+        label_ids = await self.storage.fetchall(self.sql["get_ticket_label_ids"], (ticket_id,))
         return [label_id[0] for label_id in label_ids]
\ No newline at end of file
@@ -1,6 +1,8 @@
+from support_bot.batch_loader import in_list_query, in_list_statements
 from support_bot.storage import Storage
 from enum import Enum
 from datetime import datetime
+from typing import Dict, List
 
 class TicketStatus(Enum):
     OPEN = "open"
@@ -10,118 +12,167 @@ class TicketStatus(Enum):
     DELETED = "deleted"
 
 class TicketRepository(object):
+    statements = {
+        "create_ticket": """
+            INSERT INTO Tickets (user_id, ticket_name, raised_at) values (?, ?, ?) RETURNING id;
+        """,
+        "get_ticket_id": """
+            SELECT id FROM Tickets WHERE user_room_id= ?;
+        """,
+        "assign_staff_to_ticket": """
+            insert into TicketsStaffRelation (ticket_id, staff_id) values (?, ?);
+        """,
+        "get_assigned_staff": """
+            SELECT staff_id FROM TicketsStaffRelation WHERE ticket_id = ?;
+        """,
+        "assign_support_to_ticket": """
+            insert into TicketsSupportRelation (ticket_id, support_id) values (?, ?);
+        """,
+        "get_assigned_support": """
+            SELECT support_id FROM TicketsSupportRelation WHERE ticket_id = ?;
+        """,
+        "remove_support_from_ticket": """
+            DELETE FROM TicketsSupportRelation WHERE ticket_id= ? AND support_id= ?
+        """,
+        "remove_staff_from_ticket": """
+            DELETE FROM TicketsStaffRelation WHERE ticket_id= ? AND staff_id= ?
+        """,
+        "set_ticket_closed_at": """
+            UPDATE Tickets SET closed_at= ? WHERE id=?
+        """,
+        "set_ticket_status": """
+            UPDATE Tickets SET status= ? WHERE id=?
+        """,
+        "get_ticket_status": """
+            SELECT status FROM Tickets WHERE id=?
+        """,
+        "set_ticket_name": """
+            UPDATE Tickets SET ticket_name= ? WHERE id=?
+        """,
+        "get_ticket_name": """
+            SELECT ticket_name FROM Tickets WHERE id=?
+        """,
+        "set_ticket_room_id": """
+            UPDATE Tickets SET user_room_id= ? WHERE id=?
+        """,
+        "get_ticket_room_id": """
+            SELECT user_room_id FROM Tickets WHERE id=?
+        """,
+        "get_all_fields": """
+            select id, user_id, user_room_id, status, ticket_name, raised_at, closed_at from Tickets where id = ?;
+        """,
+        **in_list_statements("get_all_fields_many", """
+            select id, user_id, user_room_id, status, ticket_name, raised_at, closed_at from Tickets where id IN ({});
+        """),
+        "get_ticket_rooms": """
+            SELECT user_room_id, id FROM Tickets WHERE user_room_id IS NOT NULL
+        """,
+        "get_open_tickets": """
+            SELECT id, user_id, ticket_name FROM Tickets WHERE status=?
+        """,
+        "get_open_tickets_of_staff": """
+            SELECT id, user_id, ticket_name FROM Tickets t JOIN TicketsStaffRelation ts ON t.id=ts.ticket_id WHERE status=? AND staff_id=?
+        """,
+    }
+
     def __init__(self, storage:Storage) -> None:
         self.storage = storage
+        self.sql = storage.statements.register("Ticket", self.statements)
     
-    def create_ticket(self, user_id:str, ticket_name:str, raised_at:datetime):
-        self.storage._execute("""
-            INSERT INTO Tickets (user_id, ticket_name, raised_at) values (?, ?, ?) RETURNING id;
-        """, (user_id, ticket_name, raised_at,))
-        inserted_id = self.storage.cursor.fetchone()
+    async def create_ticket(self, user_id:str, ticket_name:str, raised_at:datetime):
+        inserted_id = await self.storage.fetchone(self.sql["create_ticket"], (user_id, ticket_name, raised_at,))
         if inserted_id:
+            self.storage.model_cache.invalidate("Ticket", inserted_id[0])
             return inserted_id[0] #BUG - lastrowid always returns 0??
         return inserted_id
         
-    def get_ticket_id(self, user_room_id: str):
-        self.storage._execute("SELECT id FROM Tickets WHERE user_room_id= ?;", (user_room_id,))
-        id = self.storage.cursor.fetchone()
+    async def get_ticket_id(self, user_room_id: str):
+        id = await self.storage.fetchone(self.sql["get_ticket_id"], (user_room_id,))
         if id:
             return id[0]
         return id
 
-    def get_ticket(self, ticket_id:int):
-        self.storage._execute("SELECT id FROM Tickets WHERE id= ?;", (ticket_id, ))
-        id = self.storage.cursor.fetchone()
-        if id:
-            return id[0]
-        return id
+    async def assign_staff_to_ticket(self, ticket_id: int, staff_id:str):
+        await self.storage.execute(self.sql["assign_staff_to_ticket"], (ticket_id, staff_id,))
     
-    def assign_staff_to_ticket(self, ticket_id: int, staff_id:str):
-        self.storage._execute("""
-            insert into TicketsStaffRelation (ticket_id, staff_id) values (?, ?);
-        """, (ticket_id, staff_id,))
-    
-    def get_assigned_staff(self, ticket_id:int):
-        self.storage._execute("""
-            SELECT staff_id FROM TicketsStaffRelation WHERE ticket_id = ?;
-        """, (ticket_id,))
-        staff = self.storage.cursor.fetchall()
+    async def get_assigned_staff(self, ticket_id:int):
+        staff = await self.storage.fetchall(self.sql["get_assigned_staff"], (ticket_id,))
         return [
             {
                 "user_id": row[0],
             } for row in staff
         ]
     
-    def assign_support_to_ticket(self, ticket_id: int, support_id:str):
-        self.storage._execute("""
-            insert into TicketsSupportRelation (ticket_id, support_id) values (?, ?);
-        """, (ticket_id, support_id,))
+    async def assign_support_to_ticket(self, ticket_id: int, support_id:str):
+        await self.storage.execute(self.sql["assign_support_to_ticket"], (ticket_id, support_id,))
     
-    def get_assigned_support(self, ticket_id:int):
-        self.storage._execute("""
-            SELECT support_id FROM TicketsSupportRelation WHERE ticket_id = ?;
-        """, (ticket_id,))
-        support = self.storage.cursor.fetchall()
+    async def get_assigned_support(self, ticket_id:int):
+        support = await self.storage.fetchall(self.sql["get_assigned_support"], (ticket_id,))
         return [
             {
                 "user_id": row[0],
             } for row in support
         ]
     
-    def remove_support_from_ticket(self, ticket_id: int, support_id:str):
-        self.storage._execute("""
-            DELETE FROM TicketsSupportRelation WHERE ticket_id= ? AND support_id= ?
-        """, (ticket_id, support_id))
+    async def remove_support_from_ticket(self, ticket_id: int, support_id:str):
+        await self.storage.execute(self.sql["remove_support_from_ticket"], (ticket_id, support_id))
     
-    def remove_staff_from_ticket(self, ticket_id: int, staff_id:str):
-        self.storage._execute("""
-            DELETE FROM TicketsStaffRelation WHERE ticket_id= ? AND staff_id= ?
-        """, (ticket_id, staff_id))
+    async def remove_staff_from_ticket(self, ticket_id: int, staff_id:str):
+        await self.storage.execute(self.sql["remove_staff_from_ticket"], (ticket_id, staff_id))
     
-    def set_ticket_closed_at(self, ticket_id:int, closed_at:datetime):
-        self.storage._execute("""
-            UPDATE Tickets SET closed_at= ? WHERE id=?
-        """, (closed_at, ticket_id))
+    async def set_ticket_closed_at(self, ticket_id:int, closed_at:datetime):
+        await self.storage.execute(self.sql["set_ticket_closed_at"], (closed_at, ticket_id))
+        self.storage.model_cache.invalidate("Ticket", ticket_id)
     
-    def set_ticket_status(self, ticket_id:int, status:str):
-        self.storage._execute("""
-            UPDATE Tickets SET status= ? WHERE id=?
-        """, (status, ticket_id))
+    async def set_ticket_status(self, ticket_id:int, status:str):
+        await self.storage.execute(self.sql["set_ticket_status"], (status, ticket_id))
+        self.storage.model_cache.invalidate("Ticket", ticket_id)
 
-    def get_ticket_status(self, ticket_id: int):
-        self.storage._execute("""
-            SELECT status FROM Tickets WHERE id=?
-        """, (ticket_id,))
+    async def get_ticket_status(self, ticket_id: int):
+        status = await self.storage.fetchone(self.sql["get_ticket_status"], (ticket_id,))
+        if status:
+            return status[0]
+        return status
 
-    def set_ticket_name(self, ticket_id:int, ticket_name:str):
-        self.storage._execute("""
-            UPDATE Tickets SET ticket_name= ? WHERE id=?
-        """, (ticket_name, ticket_id))
+    async def set_ticket_name(self, ticket_id:int, ticket_name:str):
+        await self.storage.execute(self.sql["set_ticket_name"], (ticket_name, ticket_id))
+        self.storage.model_cache.invalidate("Ticket", ticket_id)
 
-    def get_ticket_name(self, ticket_id: int):
-        self.storage._execute("""
-            SELECT ticket_name FROM Tickets WHERE id=?
-        """, (ticket_id,))
+    async def get_ticket_name(self, ticket_id: int):
+        ticket_name = await self.storage.fetchone(self.sql["get_ticket_name"], (ticket_id,))
+        if ticket_name:
+            return ticket_name[0]
+        return ticket_name
 
-    def set_ticket_room_id(self, ticket_id:int, ticket_room_id:str):
-        self.storage._execute("""
-            UPDATE Tickets SET user_room_id= ? WHERE id=?
-        """, (ticket_room_id, ticket_id))
+    async def set_ticket_room_id(self, ticket_id:int, ticket_room_id:str):
+        await self.storage.execute(self.sql["set_ticket_room_id"], (ticket_room_id, ticket_id))
+        self.storage.model_cache.invalidate("Ticket", ticket_id)
+        self.storage.room_index.add_ticket(ticket_room_id, ticket_id)
 
-    def get_ticket_room_id(self, ticket_id: int):
-        self.storage._execute("""
-            SELECT user_room_id FROM Tickets WHERE id=?
-        """, (ticket_id,))
-        ticket_room_id = self.storage.cursor.fetchone()
+    async def get_ticket_room_id(self, ticket_id: int):
+        ticket_room_id = await self.storage.fetchone(self.sql["get_ticket_room_id"], (ticket_id,))
         if ticket_room_id:
             return ticket_room_id[0]
         return ticket_room_id
 
-    def get_all_fields(self, ticket_id:int):
-        self.storage._execute("""
-            select id, user_id, user_room_id, status, ticket_name, raised_at, closed_at from Tickets where id = ?;
-        """, (ticket_id,))
-        row = self.storage.cursor.fetchone()
+    async def get_all_fields(self, ticket_id:int):
+        row = await self.storage.fetchone(self.sql["get_all_fields"], (ticket_id,))
+        if row is None:
+            return None
+        return self._fields(row)
+
+    async def get_all_fields_many(self, ticket_ids: List[int]) -> Dict[int, dict]:
+        """Fields of up to MAX_BATCH tickets by ticket_id, missing tickets are left out"""
+        if len(ticket_ids) == 1:
+            fields = await self.get_all_fields(ticket_ids[0])
+            return {ticket_ids[0]: fields} if fields else {}
+
+        statement, params = in_list_query(self.sql, "get_all_fields_many", ticket_ids)
+        rows = await self.storage.fetchall(statement, params)
+        return {row[0]: self._fields(row) for row in rows}
+
+    @staticmethod
+    def _fields(row) -> dict:
         # TODO: rename user_room_id to ticket_room_id (specifies staff-bot communications room for the ticket)
         return {
                 "id": row[0],
@@ -133,12 +184,11 @@ class TicketRepository(object):
                 "closed_at": row[6],
             }
 
-    def get_open_tickets(self):
-        self.storage._execute("""
-            SELECT id, user_id, ticket_name FROM Tickets WHERE status=?
-        """, (TicketStatus.OPEN.value,))
+    async def get_ticket_rooms(self):
+        return await self.storage.fetchall(self.sql["get_ticket_rooms"])
 
-        tickets = self.storage.cursor.fetchall()
+    async def get_open_tickets(self):
+        tickets = await self.storage.fetchall(self.sql["get_open_tickets"], (TicketStatus.OPEN.value,))
         return [
             {
                 'id':ticket[0],
@@ -147,12 +197,8 @@ class TicketRepository(object):
             } for ticket in tickets
         ]
 
-    def get_open_tickets_of_staff(self, staff_id:str):
-        self.storage._execute("""
-            SELECT id, user_id, ticket_name FROM Tickets t JOIN TicketsStaffRelation ts ON t.id=ts.ticket_id WHERE status=? AND staff_id=?
-        """, (TicketStatus.OPEN.value, staff_id, ))
-
-        tickets = self.storage.cursor.fetchall()
+    async def get_open_tickets_of_staff(self, staff_id:str):
+        tickets = await self.storage.fetchall(self.sql["get_open_tickets_of_staff"], (TicketStatus.OPEN.value, staff_id, ))
         return [
             {
                 'id':ticket[0],
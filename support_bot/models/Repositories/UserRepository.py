@@ -1,80 +1,117 @@
-from typing import Union
+from typing import Dict, List, Union
 
+from support_bot.batch_loader import in_list_query, in_list_statements
 from support_bot.storage import Storage
 
 class UserRepository(object):
+    statements = {
+        "create_user": """
+            insert into Users (user_id) values (?);
+        """,
+        "get_user": """
+            SELECT user_id FROM Users WHERE user_id= ?;
+        """,
+        "delete_user": """
+            DELETE FROM Users WHERE user_id= ?;
+        """,
+        "set_user_room": """
+            UPDATE Users SET room_id= ? WHERE user_id=?
+        """,
+        "get_user_room": """
+            SELECT room_id FROM Users WHERE user_id=?
+        """,
+        "set_user_current_ticket_id": """
+            UPDATE Users SET current_ticket_id= ? WHERE user_id=?
+        """,
+        "get_user_current_ticket_id": """
+            SELECT current_ticket_id FROM Users WHERE user_id=?
+        """,
+        "set_user_current_chat_room_id": """
+            UPDATE Users SET current_chat_room_id= ? WHERE user_id=?
+        """,
+        "get_user_current_chat_room_id": """
+            SELECT current_chat_room_id FROM Users WHERE user_id=?
+        """,
+        "get_all_fields": """
+            select user_id, room_id, current_ticket_id, current_chat_room_id from Users where user_id = ?;
+        """,
+        **in_list_statements("get_all_fields_many", """
+            select user_id, room_id, current_ticket_id, current_chat_room_id from Users where user_id IN ({});
+        """),
+    }
+
     def __init__(self, storage:Storage) -> None:
         self.storage = storage
+        self.sql = storage.statements.register("User", self.statements)
         
-    def create_user(self, user_id:str):
-        self.storage._execute("""
-            insert into Users (user_id) values (?);
-        """, (user_id,))
+    async def create_user(self, user_id:str):
+        await self.storage.execute(self.sql["create_user"], (user_id,))
+        self.storage.model_cache.invalidate("User", user_id)
         return user_id
         
-    def get_user(self, user_id:str):
-        self.storage._execute("SELECT user_id FROM Users WHERE user_id= ?;", (user_id,))
-        id = self.storage.cursor.fetchone()
+    async def get_user(self, user_id:str):
+        id = await self.storage.fetchone(self.sql["get_user"], (user_id,))
         if id:
             return id[0]
         return id
     
-    def delete_user(self, user_id:str):
-        self.storage._execute("""
-            DELETE FROM Users WHERE user_id= ?;
-        """, (user_id,))
+    async def delete_user(self, user_id:str):
+        await self.storage.execute(self.sql["delete_user"], (user_id,))
+        self.storage.model_cache.invalidate("User", user_id)
+        # Tickets and chats of the user are deleted with it
+        self.storage.room_index.reset()
 
-    def set_user_room(self, user_id:str, room_id:str):
-        self.storage._execute("""
-            UPDATE Users SET room_id= ? WHERE user_id=?
-        """, (room_id, user_id))
+    async def set_user_room(self, user_id:str, room_id:str):
+        await self.storage.execute(self.sql["set_user_room"], (room_id, user_id))
+        self.storage.model_cache.invalidate("User", user_id)
 
-    def get_user_room(self, user_id: str):
-        self.storage._execute("""
-            SELECT room_id FROM Users WHERE user_id=?
-        """, (user_id,))
-        room_id = self.storage.cursor.fetchone()
+    async def get_user_room(self, user_id: str):
+        room_id = await self.storage.fetchone(self.sql["get_user_room"], (user_id,))
         if room_id:
             return room_id[0]
         return room_id
 
-    def set_user_current_ticket_id(self, user_id:str, current_ticket_id:Union[int, None]):
-        self.storage._execute("""
-            UPDATE Users SET current_ticket_id= ? WHERE user_id=?
-        """, (current_ticket_id, user_id))
+    async def set_user_current_ticket_id(self, user_id:str, current_ticket_id:Union[int, None]):
+        await self.storage.execute(self.sql["set_user_current_ticket_id"], (current_ticket_id, user_id))
+        self.storage.model_cache.invalidate("User", user_id)
 
-    def get_user_current_ticket_id(self, user_id: str):
-        self.storage._execute("""
-            SELECT current_ticket_id FROM Users WHERE user_id=?
-        """, (user_id,))
-        current_ticket_id = self.storage.cursor.fetchone()
+    async def get_user_current_ticket_id(self, user_id: str):
+        current_ticket_id = await self.storage.fetchone(self.sql["get_user_current_ticket_id"], (user_id,))
         if current_ticket_id:
             return current_ticket_id[0]
         return current_ticket_id
 
-    def set_user_current_chat_room_id(self, user_id:str, current_chat_room_id:Union[str, None]):
-        self.storage._execute("""
-            UPDATE Users SET current_chat_room_id= ? WHERE user_id=?
-        """, (current_chat_room_id, user_id))
+    async def set_user_current_chat_room_id(self, user_id:str, current_chat_room_id:Union[str, None]):
+        await self.storage.execute(self.sql["set_user_current_chat_room_id"], (current_chat_room_id, user_id))
+        self.storage.model_cache.invalidate("User", user_id)
 
-    def get_user_current_chat_room_id(self, user_id: str):
-        self.storage._execute("""
-            SELECT current_chat_room_id FROM Users WHERE user_id=?
-        """, (user_id,))
-        current_chat_room_id = self.storage.cursor.fetchone()
+    async def get_user_current_chat_room_id(self, user_id: str):
+        current_chat_room_id = await self.storage.fetchone(self.sql["get_user_current_chat_room_id"], (user_id,))
         if current_chat_room_id:
             return current_chat_room_id[0]
         return current_chat_room_id
 
-    def get_all_fields(self, user_id:str):
-        self.storage._execute("""
-            select user_id, room_id, current_ticket_id, current_chat_room_id from Users where user_id = ?;
-        """, (user_id,))
-        row = self.storage.cursor.fetchone()
+    async def get_all_fields(self, user_id:str):
+        row = await self.storage.fetchone(self.sql["get_all_fields"], (user_id,))
+        if row is None:
+            return None
+        return self._fields(row)
+
+    async def get_all_fields_many(self, user_ids: List[str]) -> Dict[str, dict]:
+        """Fields of up to MAX_BATCH users by user_id, missing users are left out"""
+        if len(user_ids) == 1:
+            fields = await self.get_all_fields(user_ids[0])
+            return {user_ids[0]: fields} if fields else {}
+
+        statement, params = in_list_query(self.sql, "get_all_fields_many", user_ids)
+        rows = await self.storage.fetchall(statement, params)
+        return {row[0]: self._fields(row) for row in rows}
 
+    @staticmethod
+    def _fields(row) -> dict:
         return {
                 "user_id": row[0],
                 "room_id": row[1],
                 "current_ticket_id": row[2],
                 "current_chat_room_id": row[3],
-            }
\ No newline at end of file
+            }
@@ -10,16 +10,20 @@ class Staff(object):
         self.user_id = user_id
 
     @staticmethod
-    def get_existing(storage:Storage, user_id:str):
-        # Find existing staff
-        exists = storage.repositories.staffRep.get_staff(user_id)
+    async def get_existing(storage:Storage, user_id:str):
+        if storage.authorization.loaded:
+            exists = storage.authorization.is_staff(user_id)
+        else:
+            # Find existing staff
+            exists = await storage.repositories.staffRep.get_staff(user_id)
+
         if not exists:
             return None
         else:
             return Staff(storage, user_id)
 
     @staticmethod
-    def create_new(storage:Storage, user_id:str):
+    async def create_new(storage:Storage, user_id:str):
         # Create Staff entry if not found in DB
-        storage.repositories.staffRep.create_staff(user_id)
+        await storage.repositories.staffRep.create_staff(user_id)
         return Staff(storage, user_id)
\ No newline at end of file
@@ -9,16 +9,20 @@ class Support(object):
         self.user_id = user_id
 
     @staticmethod
-    def get_existing(storage:Storage, user_id:str):
-        # Find existing support
-        exists = storage.repositories.supportRep.get_support(user_id)
+    async def get_existing(storage:Storage, user_id:str):
+        if storage.authorization.loaded:
+            exists = storage.authorization.is_support(user_id)
+        else:
+            # Find existing support
+            exists = await storage.repositories.supportRep.get_support(user_id)
+
         if not exists:
             return None
         else:
             return Support(storage, user_id)
 
     @staticmethod
-    def create_new(storage:Storage, user_id:str):
+    async def create_new(storage:Storage, user_id:str):
         # Create Support entry if not found in DB
-        storage.repositories.supportRep.create_support(user_id)
+        await storage.repositories.supportRep.create_support(user_id)
         return Support(storage, user_id)
\ No newline at end of file
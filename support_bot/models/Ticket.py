@@ -5,6 +5,8 @@ from nio import AsyncClient, RoomCreateResponse, RoomInviteResponse, MatrixRoom,
 from support_bot.chat_functions import invite_to_room, create_room, send_text_to_room
 from support_bot.models.Repositories.TicketRepository import TicketStatus, TicketRepository
 from support_bot.models.Repositories.UserRepository import UserRepository
+from support_bot.models.User import User
+from support_bot.room_index import TICKET_ROOM
 from support_bot.storage import Storage
 import logging
 import re
@@ -16,18 +18,13 @@ logger = logging.getLogger(__name__)
 ticket_name_pattern = re.compile(r"Ticket #(\d+) \(.+\)")
 
 class Ticket(object):
-
-    ticket_cache = {}
-
-    def __init__(self, storage:Storage, ticket_id:int):
+    def __init__(self, storage:Storage, fields:dict):
         # Setup Storage bindings
         self.storage = storage
         self.ticketRep:TicketRepository = self.storage.repositories.ticketRep
         self.userRep: UserRepository = self.storage.repositories.userRep
 
-        # Fetch existing fields of Ticket
-        fields = self.ticketRep.get_all_fields(ticket_id)
-
+        # Existing fields of Ticket, fetched by Ticket.load
         self.id =               fields['id']
         self.user_id =          fields['user_id']
         self.ticket_room_id =   fields['ticket_room_id']
@@ -37,35 +34,48 @@ class Ticket(object):
         self.closed_at =        fields['closed_at']
 
     @staticmethod
-    def get_existing(storage: Storage, ticket_id: int):
-        # Check cache first
+    async def load(storage: Storage, ticket_id: int):
+        # Fetch existing fields of Ticket, None if it doesn't exist
+        fields = await storage.repositories.ticketRep.get_all_fields(ticket_id)
+        return Ticket(storage, fields) if fields else None
+
+    @staticmethod
+    async def load_many(storage: Storage, ticket_ids: List[int]):
+        # Fetch existing fields of a batch of Tickets
+        rows = await storage.repositories.ticketRep.get_all_fields_many(ticket_ids)
+
+        tickets = {}
+        for ticket_id in ticket_ids:
+            fields = rows.get(ticket_id)
+            tickets[ticket_id] = Ticket(storage, fields) if fields else None
+            # Add ticket to cache, or remember that it doesn't exist
+            storage.model_cache.put("Ticket", ticket_id, tickets[ticket_id])
+        return tickets
+
+    @staticmethod
+    async def get_existing(storage: Storage, ticket_id: int):
         if not isinstance(ticket_id, int):
             return None
-        
-        ticket = Ticket.ticket_cache.get(ticket_id, None)
-        if ticket:
-            return ticket
 
-        # Find existing Ticket in Database
-        exists = storage.repositories.ticketRep.get_ticket(ticket_id)
-        if exists:
-            ticket = Ticket(storage, ticket_id)
-            # Add ticket to cache
-            Ticket.ticket_cache[ticket_id] = ticket
+        # Check cache first
+        cached, ticket = storage.model_cache.lookup("Ticket", ticket_id)
+        if cached:
             return ticket
-        else:
-            return None
+
+        # Find existing Ticket in Database, batched with concurrent lookups
+        loader = storage.loader("Ticket", lambda ticket_ids: Ticket.load_many(storage, ticket_ids))
+        return await loader.load(ticket_id)
 
     @staticmethod
-    def create_new(storage: Storage, user_id:str, ticket_name:str="General"):
+    async def create_new(storage: Storage, user_id:str, ticket_name:str="General"):
         # Create Ticket entry
         raised_at = datetime.now()
-        ticket_id = storage.repositories.ticketRep.create_ticket(user_id, ticket_name, raised_at)
+        ticket_id = await storage.repositories.ticketRep.create_ticket(user_id, ticket_name, raised_at)
 
         if ticket_id:
-            ticket = Ticket(storage, ticket_id)
+            ticket = await Ticket.load(storage, ticket_id)
             # Add ticket to cache
-            Ticket.ticket_cache[ticket_id] = ticket
+            ticket._cache()
             return ticket
         else:
             return None
@@ -86,116 +96,103 @@ class Ticket(object):
     #     return storage.repositories.ticketRep.get_ticket_id(room.room_id)
     
     @staticmethod
-    def get_ticket_id_from_room_id(storage:Storage, room_id:str):        
-        return storage.repositories.ticketRep.get_ticket_id(room_id)
+    async def get_ticket_id_from_room_id(storage:Storage, room_id:str):
+        room_kind, ticket_id = await storage.room_index.lookup(room_id)
+        return ticket_id if room_kind == TICKET_ROOM else None
         
     @staticmethod
-    def find_ticket_of_room_id(store:Storage, room_id:str):
-        is_open_ticket_room = False
-
-        ticket_id = Ticket.get_ticket_id_from_room_id(store, room_id)
+    async def find_ticket_of_room_id(store:Storage, room_id:str):
+        ticket_id = await Ticket.get_ticket_id_from_room_id(store, room_id)
         if not ticket_id:
             return None
 
-        should_add_to_cache = False
-        ticket = Ticket.ticket_cache.get(ticket_id, None)
-        # Cache hit
-        if ticket:
-            return ticket
-
-        # Cache miss
-        ticket = Ticket.get_existing(store, ticket_id)
+        return await Ticket.get_existing(store, ticket_id)
 
-        if ticket:
-            Ticket.ticket_cache[ticket.id] = ticket
-            return ticket
-        else:
-            return None
+    def _cache(self):
+        # Write-through, the repository setters invalidate the cached Ticket
+        self.storage.model_cache.put("Ticket", self.id, self)
 
     async def create_ticket_room(self, client:AsyncClient, invite:List[str] = []):
         # Request a Ticket reply room to be created.
         response = await create_room(client, f"Ticket #{self.id} ({self.ticket_name})", invite)
 
         if isinstance(response, RoomCreateResponse):
-            self.ticket_room_id = response.room_id
-            self.ticketRep.set_ticket_room_id(self.id, self.ticket_room_id)
+            await self.set_ticket_room_id(response.room_id)
 
         return response
 
-    def set_ticket_room_id(self, ticket_room_id:str):
+    async def set_ticket_room_id(self, ticket_room_id:str):
+        if self.ticket_room_id:
+            self.storage.room_index.forget(self.ticket_room_id)
         self.ticket_room_id = ticket_room_id
-        self.ticketRep.set_ticket_room_id(self.id, ticket_room_id)
+        await self.ticketRep.set_ticket_room_id(self.id, ticket_room_id)
+        self._cache()
 
     async def invite_to_ticket_room(self, client:AsyncClient, user_id:str):
         # Invite staff to the Ticket room
         response = await invite_to_room(client, user_id, self.ticket_room_id)
         return response
 
-    def claim_ticket(self, staff_id:str):
+    async def claim_ticket(self, staff_id:str):
         # Claim the ticket for staff member
 
-        staff = self.ticketRep.get_assigned_staff(self.id)
+        staff = await self.ticketRep.get_assigned_staff(self.id)
 
         # Check if staff not assigned to ticket already
         if staff_id in [s['user_id'] for s in staff]:
             return
 
         # Assign staff member to the ticket
-        self.ticketRep.assign_staff_to_ticket(self.id, staff_id)
+        await self.ticketRep.assign_staff_to_ticket(self.id, staff_id)
         
-    def claimfor_ticket(self, support_id:str):
+    async def claimfor_ticket(self, support_id:str):
         # Claim the ticket for support member
 
-        support = self.ticketRep.get_assigned_support(self.id)
+        support = await self.ticketRep.get_assigned_support(self.id)
 
         # Check if support not assigned to ticket already
         if support_id in [s['user_id'] for s in support]:
             return
 
         # Assign support member to the ticket
-        self.ticketRep.assign_support_to_ticket(self.id, support_id)
+        await self.ticketRep.assign_support_to_ticket(self.id, support_id)
 
-    def get_assigned_support(self):
-        support = self.ticketRep.get_assigned_support(self.id)
+    async def get_assigned_support(self):
+        support = await self.ticketRep.get_assigned_support(self.id)
 
         return [s['user_id'] for s in support]
     
-    def unassign_support(self, support_id:str):
-        self.ticketRep.remove_support_from_ticket(self.id, support_id)
+    async def unassign_support(self, support_id:str):
+        await self.ticketRep.remove_support_from_ticket(self.id, support_id)
         
-    def unassign_staff(self, staff_id:str):
-        self.ticketRep.remove_staff_from_ticket(self.id, staff_id)
+    async def unassign_staff(self, staff_id:str):
+        await self.ticketRep.remove_staff_from_ticket(self.id, staff_id)
     
-    def get_assigned_staff(self):
-        staff = self.ticketRep.get_assigned_staff(self.id)
+    async def get_assigned_staff(self):
+        staff = await self.ticketRep.get_assigned_staff(self.id)
 
         return [s['user_id'] for s in staff]
 
-    def _close_ticket(self):
-        self.ticketRep.set_ticket_closed_at(self.id, datetime.now())
-        
-        # Remove from cache if closing ticket
-        if Ticket.ticket_cache.get(self.id):
-            Ticket.ticket_cache.pop(self.id)
+    async def _close_ticket(self):
+        self.closed_at = datetime.now()
+        await self.ticketRep.set_ticket_closed_at(self.id, self.closed_at)
     
-    def _open_ticket(self):
-        self.ticketRep.set_ticket_closed_at(self.id, None)
-        
-        # Remove from cache if closing ticket
-        if Ticket.ticket_cache.get(self.id):
-            Ticket.ticket_cache.pop(self.id)
+    async def _open_ticket(self):
+        self.closed_at = None
+        await self.ticketRep.set_ticket_closed_at(self.id, None)
 
-    def set_status(self, status:TicketStatus):
-        self.ticketRep.set_ticket_status(self.id, status.value)
+    async def set_status(self, status:TicketStatus):
+        await self.ticketRep.set_ticket_status(self.id, status.value)
         self.status = status
 
         if status == TicketStatus.CLOSED:
-            self._close_ticket()
+            await self._close_ticket()
         elif status == TicketStatus.OPEN:
-            self._open_ticket()
-        elif status == TicketStatus.DELETED:
-            if Ticket.ticket_cache.get(self.id):
-                Ticket.ticket_cache.pop(self.id)
+            await self._open_ticket()
+
+        self._cache()
 
-    def find_user_current_ticket_id(self):
-        return self.userRep.get_user_current_ticket_id(self.user_id)
+    async def find_user_current_ticket_id(self):
+        # Through the loaded User, shared with the other lookups of the user
+        user = await User.get_existing(self.storage, self.user_id)
+        return user.current_ticket_id if user else None
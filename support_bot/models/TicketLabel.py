@@ -1,47 +1,49 @@
-from support_bot.models.Repositories.TicketLabelsRepository import TicketLabelsRepository
+from support_bot.models.Repositories.TicketLabelsRepository import TicketLabelData, TicketLabelsRepository
 from support_bot.storage import Storage
 
 class TicketLabel(object):
-    def __init__(self, storage:Storage, label_id:int):
+    def __init__(self, storage:Storage, data:TicketLabelData):
         # Setup Storage bindings
         self.storage = storage
         self.ticketLabelsRep:TicketLabelsRepository = self.storage.repositories.ticketLabelsRep
 
-        # Fetch existing fields of Ticket
-        self.data = self.ticketLabelsRep.get_all_fields(label_id)
+        # Existing fields of Ticket label, fetched by TicketLabel.load
+        self.data = data
 
     @staticmethod
-    def get_existing(storage:Storage, label_id:int):
+    async def load(storage:Storage, label_id:int):
+        # Fetch existing fields of Ticket label, None if it doesn't exist
+        data = await storage.repositories.ticketLabelsRep.get_all_fields(label_id)
+        return TicketLabel(storage, data) if data else None
+
+    @staticmethod
+    async def get_existing(storage:Storage, label_id:int):
         # Find existing ticket label
-        exists = storage.repositories.ticketLabelsRep.get_label(label_id)
-        if not exists:
-            return None
-        else:
-            return TicketLabel(storage, label_id)
+        return await TicketLabel.load(storage, label_id)
 
     @staticmethod
-    def create_new(storage:Storage, name:str, hex_color: str, description: str = ""):
+    async def create_new(storage:Storage, name:str, hex_color: str, description: str = ""):
         # Create Support entry if not found in DB
-        label_id = storage.repositories.ticketLabelsRep.create_label(name, description, hex_color)
+        label_id = await storage.repositories.ticketLabelsRep.create_label(name, description, hex_color)
         
         if label_id:
-            ticketLabel = TicketLabel(storage, label_id)
+            ticketLabel = await TicketLabel.load(storage, label_id)
             return ticketLabel
         else:
             return None
 
-    def set_name(self, name:str):
-        self.ticketLabelsRep.set_label_name(self.data.id, name)
+    async def set_name(self, name:str):
+        await self.ticketLabelsRep.set_label_name(self.data.id, name)
         self.data.name = name
     
-    def set_description(self, description:str):
-        self.ticketLabelsRep.set_label_name(self.data.id, description)
+    async def set_description(self, description:str):
+        await self.ticketLabelsRep.set_label_description(self.data.id, description)
         self.data.description = description
         
-    def set_color(self, color:str):
-        self.ticketLabelsRep.set_label_name(self.data.id, color)
-        self.data.color = color
+    async def set_color(self, color:str):
+        await self.ticketLabelsRep.set_label_color(self.data.id, color)
+        self.data.hex_color = color
         
-    def delete(self):
-        self.ticketLabelsRep.delete_label(self.data.id)
+    async def delete(self):
+        await self.ticketLabelsRep.delete_label(self.data.id)
         self.data = None
\ No newline at end of file
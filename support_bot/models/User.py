@@ -1,16 +1,17 @@
+from typing import List
+
 from support_bot.models.Repositories.UserRepository import UserRepository
 from support_bot.storage import Storage
 from support_bot.utils import get_username
 
 # Controller (External data)-> Service (Logic) -> Repository (sql queries)
 class User(object):
-    def __init__(self, storage:Storage, user_id:str):
+    def __init__(self, storage:Storage, fields:dict):
         # Setup storage bindings
         self.storage = storage
         self.userRep:UserRepository = self.storage.repositories.userRep
 
-        # Fetch existing fields of User
-        fields = self.userRep.get_all_fields(user_id)
+        # Existing fields of User, fetched by User.load
         self.user_id =              fields['user_id']
         self.room_id =              fields['room_id']
         self.current_ticket_id =    fields['current_ticket_id']
@@ -18,28 +19,58 @@ class User(object):
         self.username = get_username(self.user_id)
 
     @staticmethod
-    def get_existing(storage:Storage, user_id:str):
-        # Find existing user
-        exists = storage.repositories.userRep.get_user(user_id)
-        if not exists:
-            return None
-        else:
-            return User(storage, user_id)
+    async def load(storage:Storage, user_id:str):
+        # Fetch existing fields of User, None if it doesn't exist
+        fields = await storage.repositories.userRep.get_all_fields(user_id)
+        return User(storage, fields) if fields else None
+
+    @staticmethod
+    async def load_many(storage:Storage, user_ids:List[str]):
+        # Fetch existing fields of a batch of Users
+        rows = await storage.repositories.userRep.get_all_fields_many(user_ids)
+
+        users = {}
+        for user_id in user_ids:
+            fields = rows.get(user_id)
+            users[user_id] = User(storage, fields) if fields else None
+            # Add user to cache, or remember that it doesn't exist
+            storage.model_cache.put("User", user_id, users[user_id])
+        return users
+
+    @staticmethod
+    async def get_existing(storage:Storage, user_id:str):
+        # Check cache first
+        cached, user = storage.model_cache.lookup("User", user_id)
+        if cached:
+            return user
+
+        # Find existing user, batched with concurrent lookups
+        loader = storage.loader("User", lambda user_ids: User.load_many(storage, user_ids))
+        return await loader.load(user_id)
 
     @staticmethod
-    def create_new(storage:Storage, user_id:str):
+    async def create_new(storage:Storage, user_id:str):
         # Create User entry if not found in DB
-        storage.repositories.userRep.create_user(user_id)
-        return User(storage, user_id)
+        await storage.repositories.userRep.create_user(user_id)
+        user = await User.load(storage, user_id)
+        user._cache()
+        return user
+
+    def _cache(self):
+        # Write-through, the repository setters invalidate the cached User
+        self.storage.model_cache.put("User", self.user_id, self)
 
-    def update_communications_room(self, room_id: str):
-        self.userRep.set_user_room(self.user_id, room_id)
+    async def update_communications_room(self, room_id: str):
+        await self.userRep.set_user_room(self.user_id, room_id)
         self.room_id = room_id
+        self._cache()
 
-    def update_current_ticket_id(self, current_ticket_id: int):
-        self.userRep.set_user_current_ticket_id(self.user_id, current_ticket_id)
+    async def update_current_ticket_id(self, current_ticket_id: int):
+        await self.userRep.set_user_current_ticket_id(self.user_id, current_ticket_id)
         self.current_ticket_id = current_ticket_id
+        self._cache()
 
-    def update_current_chat_room_id(self, current_chat_room_id: str):
-        self.userRep.set_user_current_chat_room_id(self.user_id, current_chat_room_id)
-        self.current_chat_room_id = current_chat_room_id
\ No newline at end of file
+    async def update_current_chat_room_id(self, current_chat_room_id: str):
+        await self.userRep.set_user_current_chat_room_id(self.user_id, current_chat_room_id)
+        self.current_chat_room_id = current_chat_room_id
+        self._cache()
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+# noinspection PyPackageRequirements
+from nio import AsyncClient, RoomSendResponse
+
+from support_bot.chat_functions import send_text_to_room
+from support_bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 3600.0
+DEFAULT_INTERVAL = 10.0
+DEFAULT_MAX_LINES = 50
+
+
+class _Window(object):
+    __slots__ = ("started_at", "lines", "count", "event_id", "sent_count")
+
+    def __init__(self, max_lines: int):
+        self.started_at = time.time()
+        self.lines: Deque[Tuple[float, str]] = deque(maxlen=max_lines)
+        self.count = 0
+        # Event ID of the digest message, edited by the later flushes of the window
+        self.event_id: Optional[str] = None
+        self.sent_count = 0
+
+
+class NoticeDigest(object):
+    def __init__(
+        self,
+        client: AsyncClient,
+        config: Config,
+        window: float = DEFAULT_WINDOW,
+        interval: float = DEFAULT_INTERVAL,
+        max_lines: int = DEFAULT_MAX_LINES,
+    ):
+        """Low value management room notices, coalesced into one message per time window
+
+        Notices added within `interval` seconds of each other are sent together. The first
+        flush of a window sends the digest message, later flushes edit it in place. After
+        `window` seconds a new digest message is started. Only the last `max_lines` notices
+        are listed, with a count of the earlier ones.
+
+        Args:
+            client (nio.AsyncClient): nio client used to send the digest
+
+            config (Config): Bot configuration, the digest goes to its management room
+
+            window (float): Number of seconds a digest message is edited before a new one is started
+
+            interval (float): Number of seconds notices are collected before the digest is sent or edited
+
+            max_lines (int): Maximum number of notices listed in a digest message
+        """
+        self.client = client
+        self.config = config
+        self.window = window
+        self.interval = interval
+        self.max_lines = max(1, int(max_lines))
+
+        self._current: Optional[_Window] = None
+        self._pending: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+        # Counters
+        self.added = 0
+        self.sent = 0
+        self.edited = 0
+        self.failed = 0
+
+    def add(self, message: str):
+        """Queue a notice for the next flush of the digest"""
+        self.added += 1
+        current = self._current
+        if current is None or time.time() >= current.started_at + self.window:
+            if current is not None and current.count > current.sent_count:
+                # Last edit of the previous window
+                asyncio.ensure_future(self._flush(current))
+            current = self._current = _Window(self.max_lines)
+
+        # One list item per notice
+        current.lines.append((time.time(), message.replace("\n", " ")))
+        current.count += 1
+        if self._pending is None:
+            self._pending = asyncio.get_event_loop().call_later(self.interval, self._flush_current)
+
+    def _flush_current(self):
+        self._pending = None
+        if self._current is not None:
+            asyncio.ensure_future(self._flush(self._current))
+
+    async def flush(self):
+        """Send the queued notices now, e.g. before shutting down"""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        if self._current is not None:
+            await self._flush(self._current)
+
+    async def _flush(self, window: _Window):
+        # Flushes are sent one at a time, so edits of a digest arrive in order
+        async with self._lock:
+            if window.count == window.sent_count:
+                return
+            count = window.count
+            response = await self._send(window, self.render(window))
+            if isinstance(response, RoomSendResponse):
+                window.sent_count = count
+                if window.event_id is None:
+                    window.event_id = response.event_id
+                    self.sent += 1
+                else:
+                    self.edited += 1
+            else:
+                self.failed += 1
+                logger.warning(f"Failed to send the notice digest to the management room: {response}")
+
+    async def _send(self, window: _Window, text: str):
+        return await send_text_to_room(
+            self.client, self.config.management_room_id, text, True, replaces_event_id=window.event_id,
+        )
+
+    @staticmethod
+    def render(window: _Window) -> str:
+        started = time.strftime("%H:%M", time.localtime(window.started_at))
+        lines = [f"**Notices since {started}** ({window.count})", ""]
+        earlier = window.count - len(window.lines)
+        if earlier:
+            lines.append(f"- ... {earlier} earlier")
+        for added_at, message in window.lines:
+            lines.append(f"- `{time.strftime('%H:%M:%S', time.localtime(added_at))}` {message}")
+        return "\n".join(lines)
+
+    def stats(self) -> dict:
+        return {
+            "added": self.added,
+            "sent": self.sent,
+            "edited": self.edited,
+            "failed": self.failed,
+        }
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, List, Optional
+
+# noinspection PyPackageRequirements
+from nio import ErrorResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 20
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_QUEUED = 1000
+# Lowest rate the bucket adapts down to after being rate limited
+MIN_RATE = 0.5
+
+# Status code of the responses of requests dropped from a full queue
+SHED = "M_OUTBOUND_SHED"
+
+
+class Lane(IntEnum):
+    """Priority of outbound requests, lower values are sent first"""
+    RELAY = 0       # Messages relayed to and from users
+    COMMAND = 1     # Actions of staff commands: rooms, invites, kicks, joins
+    NOTICE = 2      # Notices and confirmations in the management room
+    LOGGING = 3     # Messages to the logging room
+
+
+class _Request(object):
+    __slots__ = ("lane", "func", "args", "kwargs", "future", "enqueued_at")
+
+    def __init__(self, lane: Lane, func: Callable[..., Awaitable], args: tuple, kwargs: dict):
+        self.lane = lane
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = asyncio.get_event_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class OutboundScheduler(object):
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+    ):
+        """Single queue in front of the requests the bot sends to the homeserver
+
+        Requests wait in one queue per `Lane` and are started highest priority first,
+        taking a token from a bucket shared by all senders. When the homeserver answers
+        M_LIMIT_EXCEEDED, all lanes pause for `retry_after_ms`, the request is retried
+        first, and the rate is halved. It grows back slowly with every successful request
+        (AIMD), so concurrent senders back off together instead of retrying in a stampede.
+
+        When `max_queued` requests are waiting, the oldest request of the lowest priority
+        lane is dropped to make space, answered with an ErrorResponse with status code
+        SHED. A request is dropped instead if no lower priority request is waiting.
+
+        Args:
+            rate (float): Maximum number of requests started per second
+
+            burst (int): Number of requests that can be started at once after being idle
+
+            concurrency (int): Maximum number of requests in flight
+
+            max_queued (int): Maximum number of requests waiting over all lanes
+        """
+        self.max_rate = max(MIN_RATE, float(rate))
+        self.rate = self.max_rate
+        self.burst = max(1, int(burst))
+        self.max_queued = max(1, int(max_queued))
+
+        self._lanes: List[Deque[_Request]] = [deque() for _ in Lane]
+        self._queued = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._slots = asyncio.Semaphore(max(1, int(concurrency)))
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Counters, by lane
+        self.submitted: Counter = Counter()
+        self.sent: Counter = Counter()
+        self.shed: Counter = Counter()
+        self.failed: Counter = Counter()
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def submit(self, lane: Lane, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """Queue a request and wait for its response"""
+        request = _Request(lane, func, args, kwargs)
+        self.submitted[lane.name] += 1
+
+        if self._queued >= self.max_queued and not self._shed_below(lane):
+            self._drop(request)
+            return await request.future
+
+        self._lanes[lane].append(request)
+        self._queued += 1
+        self._wake()
+        return await request.future
+
+    def _shed_below(self, lane: Lane) -> bool:
+        """Drop the oldest waiting request of a lower priority than `lane`, if any"""
+        for lower in reversed(Lane):
+            if lower <= lane:
+                return False
+            if self._lanes[lower]:
+                self._queued -= 1
+                self._drop(self._lanes[lower].popleft())
+                return True
+        return False
+
+    def _drop(self, request: _Request):
+        self.shed[request.lane.name] += 1
+        logger.warning(f"Outbound queue full ({self._queued} waiting), dropping {request.lane.name} request {request.func.__name__}")
+        request.future.set_result(ErrorResponse("Outbound queue full, request dropped", SHED))
+
+    def _wake(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+    def _next(self) -> Optional[_Request]:
+        for queue in self._lanes:
+            if queue:
+                self._queued -= 1
+                return queue.popleft()
+        return None
+
+    async def _take_token(self):
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def _run(self):
+        while True:
+            if not self._queued:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            await self._take_token()
+            await self._slots.acquire()
+            # Picked only now, a request queued while waiting may have a higher priority
+            request = self._next()
+            if request is None:
+                self._slots.release()
+                continue
+            asyncio.ensure_future(self._send(request))
+
+    async def _send(self, request: _Request):
+        try:
+            response = await request.func(*request.args, **request.kwargs)
+        except Exception as e:
+            self.failed[request.lane.name] += 1
+            if not request.future.done():
+                request.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        if isinstance(response, ErrorResponse) and response.status_code == "M_LIMIT_EXCEEDED":
+            self._limited(response.retry_after_ms)
+            # Retried before anything else of its lane
+            self._lanes[request.lane].appendleft(request)
+            self._queued += 1
+            self._wake()
+            return
+
+        self._succeeded()
+        wait = time.monotonic() - request.enqueued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.sent[request.lane.name] += 1
+        if not request.future.done():
+            request.future.set_result(response)
+
+    def _limited(self, retry_after_ms: Optional[int]):
+        self.rate_limited += 1
+        self.rate = max(MIN_RATE, self.rate / 2)
+        self._tokens = 0.0
+        pause = (retry_after_ms or 1000) / 1000
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        logger.warning(f"Rate limited by the homeserver, pausing outbound requests for {pause:.1f}s at {self.rate:.1f}/s")
+
+    def _succeeded(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def queue_depths(self) -> dict:
+        return {lane.name: len(self._lanes[lane]) for lane in Lane}
+
+    def stats(self) -> dict:
+        sent = sum(self.sent.values())
+        return {
+            "queued": self.queue_depths(),
+            "rate": self.rate,
+            "submitted": dict(self.submitted),
+            "sent": dict(self.sent),
+            "shed": dict(self.shed),
+            "failed": dict(self.failed),
+            "rate_limited": self.rate_limited,
+            "avg_wait": self.total_wait / sent if sent else 0.0,
+            "max_wait": self.max_wait,
+        }
@@ -0,0 +1,115 @@
+import re
+from functools import cached_property
+from typing import Optional, Set
+
+# noinspection PyPackageRequirements
+import nio
+
+# Domain part from https://stackoverflow.com/a/106223/1489738
+USER_ID_REGEX = r"@[a-z0-9_=\/\-\.]*:(([a-zA-Z0-9]|[a-zA-Z0-9][a-zA-Z0-9\-]*[a-zA-Z0-9])\.)*([A-Za-z0-9]|[A-Za-z0-9]" \
+                r"[A-Za-z0-9\-]*[A-Za-z0-9])*"
+user_id_pattern = re.compile(USER_ID_REGEX, re.MULTILINE)
+
+reply_regex = re.compile(r"<mx-reply><blockquote>.*</blockquote></mx-reply>(.*)", flags=re.RegexFlag.DOTALL)
+
+# Prefix of the edit fallback body clients send with m.replace events
+EDIT_PREFIX = " * "
+# Commands accepted without the configured command prefix
+BARE_COMMAND = "!message"
+
+
+class ParsedEvent(object):
+    def __init__(self, event: nio.Event, command_prefix: Optional[str] = None):
+        """Fields of a message event, each parsed at most once
+
+        The relations, the reply and raise sections, mentions and the command of an event
+        are looked up when first used and remembered, so the callbacks, the message
+        classes and the commands handling the same event share one parse.
+
+        Args:
+            event (nio.Event): The event to parse
+
+            command_prefix (str): The configured command prefix, including the trailing space
+        """
+        self.event = event
+        self.command_prefix = command_prefix
+
+    @cached_property
+    def content(self) -> dict:
+        return self.event.source.get("content", {})
+
+    @cached_property
+    def relates_to(self) -> dict:
+        return self.content.get("m.relates_to", {})
+
+    @cached_property
+    def in_reply_to(self) -> Optional[str]:
+        """Event ID this event replies to, if any"""
+        return self.relates_to.get("m.in_reply_to", {}).get("event_id")
+
+    @cached_property
+    def replaces(self) -> Optional[str]:
+        """Event ID this event edits, if any"""
+        if self.relates_to.get("rel_type") == "m.replace":
+            return self.relates_to.get("event_id")
+
+    @cached_property
+    def text(self) -> str:
+        """Body of the event, without the edit prefix"""
+        text = self.event.body
+        if text.startswith(EDIT_PREFIX):
+            text = text[len(EDIT_PREFIX):]
+        return text
+
+    @cached_property
+    def command(self) -> Optional[str]:
+        """The command and arguments, None if the event is not a command"""
+        if self.text.startswith(BARE_COMMAND):
+            return self.text[1:]
+        if self.command_prefix and self.text.startswith(self.command_prefix):
+            return self.text[len(self.command_prefix):]
+        return None
+
+    @cached_property
+    def reply_section(self) -> Optional[str]:
+        """New text of the event without the quoted reply fallback"""
+        # first check if this is edit
+        content = self.content.get("m.new_content", {}) if self.replaces else self.content
+        msg_plain = content.get("body")
+        msg_formatted = content.get("formatted_body")
+
+        if msg_formatted and (reply_msg := reply_regex.findall(msg_formatted)):
+            return reply_msg[0]
+        elif msg_formatted:
+            return msg_formatted
+        else:
+            #revert to old method
+            message_parts = msg_plain.split('\n\n', 1)
+            if len(message_parts) > 1:
+                return '\n\n'.join(message_parts[1:])
+            return msg_plain
+
+    def _related_section(self, command: str) -> Optional[str]:
+        if self.in_reply_to or self.replaces:
+            if reply_section := self.reply_section:
+                if reply_section.startswith(command) or reply_section.startswith("<p>" + command):
+                    return reply_section
+
+    @cached_property
+    def reply_msg(self) -> Optional[str]:
+        """The reply section, if it is a `!reply` to or edit of an event"""
+        return self._related_section("!reply ")
+
+    @cached_property
+    def raise_msg(self) -> Optional[str]:
+        """The reply section, if it is a `!raise` in reply to or edit of an event"""
+        return self._related_section("!raise ")
+
+    @cached_property
+    def mentions(self) -> Set[str]:
+        """User IDs mentioned in the text"""
+        return {match.group() for match in user_id_pattern.finditer(self.text)}
+
+    def mentions_user(self, user_id: str) -> bool:
+        # A user ID not in the text can't be matched, skip the regex
+        return user_id in self.text and user_id in self.mentions
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional
+
+# noinspection PyPackageRequirements
+from nio import AsyncClient, Event, SyncResponse
+
+from support_bot.chat_functions import send_text_to_room
+from support_bot.config import Config
+from support_bot.models.IncomingEvent import IncomingEvent
+from support_bot.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Seconds a delivery waits for the state of its room before it is dropped
+DEFAULT_TIMEOUT = 300
+# Resolution of the expiry of deliveries, in seconds
+DEFAULT_TICK = 1.0
+
+# What a delivery does once its room is ready
+KIND_MESSAGE = "message"
+KIND_CALL_EVENT = "call_event"
+KIND_TEXT = "text"
+
+
+class TimerWheel(object):
+    def __init__(self, tick: float, slots: int):
+        """Hashed timer wheel, expiring keys after a delay with the resolution of a tick
+
+        Scheduling and cancelling a key is O(1), advancing the wheel only visits the slots of
+        the ticks that passed. Delays longer than the wheel are kept in their slot until the
+        wheel comes round to their tick.
+
+        Args:
+            tick (float): Seconds between ticks
+
+            slots (int): Number of slots of the wheel
+        """
+        self.tick = tick
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(max(1, slots))]
+        self._ticks: Dict[Hashable, int] = {}
+        self._origin = time.monotonic()
+        self._current = 0
+
+    def __len__(self) -> int:
+        return len(self._ticks)
+
+    def _now(self) -> int:
+        return int((time.monotonic() - self._origin) / self.tick)
+
+    def schedule(self, key: Hashable, delay: float):
+        self.cancel(key)
+        if not self._ticks:
+            # Nothing to expire in the ticks that passed while empty
+            self._current = self._now()
+        expires = self._current + max(1, math.ceil(delay / self.tick))
+        self._slots[expires % len(self._slots)][key] = expires
+        self._ticks[key] = expires
+
+    def cancel(self, key: Hashable):
+        expires = self._ticks.pop(key, None)
+        if expires is not None:
+            del self._slots[expires % len(self._slots)][key]
+
+    def advance(self) -> List[Hashable]:
+        """Move the wheel to the current tick, returning the keys that expired"""
+        now = self._now()
+        expired = []
+        # Each slot is visited once at most, however long it has been
+        for tick in range(max(self._current + 1, now - len(self._slots) + 1), now + 1):
+            slot = self._slots[tick % len(self._slots)]
+            for key in [key for key, expires in slot.items() if expires <= now]:
+                del slot[key]
+                del self._ticks[key]
+                expired.append(key)
+        self._current = max(self._current, now)
+        return expired
+
+
+class PendingDelivery(object):
+    __slots__ = ("id", "kind", "room_id", "source_room_id", "event", "text", "queued_at")
+
+    def __init__(
+        self, kind: str, room_id: str, source_room_id: str, event: Optional[Event] = None, text: Optional[str] = None,
+        queued_at: Optional[int] = None, id: Optional[int] = None,
+    ):
+        self.id = id
+        self.kind = kind
+        # The room the delivery waits for
+        self.room_id = room_id
+        # The room the event is processed in again once the room is ready
+        self.source_room_id = source_room_id
+        self.event = event
+        self.text = text
+        self.queued_at = queued_at if queued_at is not None else int(time.time())
+
+    def describe(self) -> str:
+        if self.event is None:
+            return f"text - {self.text}"
+        return f"message from {self.event.sender} - {getattr(self.event, 'body', self.event.event_id)}"
+
+
+class PendingDeliveries(object):
+    def __init__(
+        self, client: AsyncClient, store: Storage, config: Config, timeout: float = DEFAULT_TIMEOUT, tick: float = DEFAULT_TICK,
+    ):
+        """Deliveries waiting for the state of their room to arrive before they can be sent
+
+        A delivery is queued when the room a message is relayed to isn't known yet. Rooms are
+        woken when a sync changes their state (a join, encryption being enabled) and their
+        deliveries are sent in order once the room is known and encrypted. Deliveries still
+        waiting after `timeout` seconds are dropped by a timer wheel, which only runs while
+        deliveries are waiting. Deliveries are stored in the database until sent or dropped,
+        and restored after the first sync following a restart.
+
+        Args:
+            client (nio.AsyncClient): nio client the deliveries are sent with
+
+            store (Storage): Storage the deliveries are kept in
+
+            config (Config): Bot configuration parameters
+
+            timeout (float): Seconds a delivery waits for its room
+
+            tick (float): Resolution of the timeout in seconds
+        """
+        self.client = client
+        self.store = store
+        self.config = config
+        self.timeout = timeout
+
+        self._rooms: Dict[str, List[PendingDelivery]] = defaultdict(list)
+        self._wheel = TimerWheel(tick, math.ceil(timeout / tick) + 1)
+        self._timer: Optional[asyncio.Task] = None
+        self._restored = False
+
+        # Counters
+        self.queued = 0
+        self.delivered = 0
+        self.expired = 0
+        self.restored = 0
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self._rooms
+
+    def __len__(self) -> int:
+        return sum(len(deliveries) for deliveries in self._rooms.values())
+
+    def ready(self, room_id: str) -> bool:
+        return room_id in self.client.rooms and room_id in self.client.encrypted_rooms
+
+    async def add(
+        self, kind: str, room_id: str, source_room_id: str, event: Optional[Event] = None, text: Optional[str] = None,
+    ) -> PendingDelivery:
+        """Queue a delivery until the state of its room has arrived"""
+        delivery = PendingDelivery(kind, room_id, source_room_id, event, text)
+        payload = None
+        if event is not None:
+            payload = IncomingEvent.snapshot(event)
+            if payload is None:
+                logger.warning(f"Event {event.event_id} queued for room {room_id} is too large to store, "
+                               f"it is lost on a restart")
+        if event is None or payload is not None:
+            delivery.id = await self.store.repositories.pendingDeliveriesRep.put_delivery(
+                kind, room_id, source_room_id, text, payload, delivery.queued_at,
+            )
+
+        self.queued += 1
+        self._queue(delivery, self.timeout)
+        # The state may have arrived while the delivery was being queued
+        if self.ready(room_id):
+            asyncio.ensure_future(self.wake(room_id))
+        return delivery
+
+    def _queue(self, delivery: PendingDelivery, timeout: float):
+        self._rooms[delivery.room_id].append(delivery)
+        self._wheel.schedule(delivery, timeout)
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._expire_loop())
+
+    async def restore(self):
+        """Queue the deliveries stored by a previous run of the bot"""
+        now = time.time()
+        for row in await self.store.repositories.pendingDeliveriesRep.get_deliveries():
+            event = None
+            if row["payload"] is not None:
+                event = IncomingEvent.load_snapshot(row["payload"], f"queued for {row['room_id']}")
+                if event is None:
+                    await self._forget(PendingDelivery(row["kind"], row["room_id"], row["source_room_id"], id=row["id"]))
+                    continue
+            delivery = PendingDelivery(
+                row["kind"], row["room_id"], row["source_room_id"], event, row["text"], row["queued_at"], row["id"],
+            )
+            self.restored += 1
+            self._queue(delivery, delivery.queued_at + self.timeout - now)
+
+    async def sync(self, response: SyncResponse):
+        """Callback for sync responses, waking the rooms with deliveries whose state changed"""
+        if not self._restored:
+            self._restored = True
+            await self.restore()
+            for room_id in list(self._rooms):
+                await self.wake(room_id)
+            return
+
+        for room_id, room_info in response.rooms.join.items():
+            if room_id not in self._rooms:
+                continue
+            if room_info.state or any("state_key" in event.source for event in room_info.timeline.events):
+                await self.wake(room_id)
+
+    async def wake(self, room_id: str):
+        """Send the deliveries of a room if its state has arrived"""
+        if room_id not in self._rooms or not self.ready(room_id):
+            return
+
+        # Taken out before awaiting anything, as event callbacks run concurrently and may queue more
+        deliveries = self._rooms.pop(room_id)
+        for delivery in deliveries:
+            self._wheel.cancel(delivery)
+        for delivery in deliveries:
+            try:
+                logger.info(f"Executing queued task for room {room_id}")
+                await self._deliver(delivery)
+                self.delivered += 1
+            except Exception as e:
+                logger.error(f"Error performing queued task after joining room: {e}")
+            await self._forget(delivery)
+
+    async def _deliver(self, delivery: PendingDelivery):
+        if delivery.kind == KIND_TEXT:
+            await send_text_to_room(self.client, delivery.room_id, delivery.text)
+            return
+
+        if delivery.kind == KIND_CALL_EVENT:
+            process = self.client.callbacks._call_event
+        else:
+            process = self.client.callbacks._message
+        room = self.client.rooms.get(delivery.source_room_id)
+        if room is None:
+            raise ValueError(f"Room {delivery.source_room_id} of event {delivery.event.event_id} is not known")
+        await process(room, delivery.event)
+
+    async def _forget(self, delivery: PendingDelivery):
+        if delivery.id is not None:
+            await self.store.repositories.pendingDeliveriesRep.delete_delivery(delivery.id)
+
+    async def _expire_loop(self):
+        # Only ticks while deliveries are waiting
+        while len(self._wheel):
+            await asyncio.sleep(self._wheel.tick)
+            for delivery in self._wheel.advance():
+                await self._expire(delivery)
+
+    async def _expire(self, delivery: PendingDelivery):
+        deliveries = self._rooms.get(delivery.room_id, [])
+        if delivery in deliveries:
+            deliveries.remove(delivery)
+        if not deliveries:
+            self._rooms.pop(delivery.room_id, None)
+        self.expired += 1
+        await self._forget(delivery)
+
+        msg = f"Task destined to room {delivery.room_id} DROPPED due to not receiving encryption/room state " \
+              f"for > {self.timeout}s. DROPPING {delivery.describe()}"
+        logger.error(msg)
+        try:
+            await send_text_to_room(self.client, self.config.matrix_logging_room, msg)
+        except Exception:
+            logger.error(f"Exception thrown while sending error message: {delivery.room_id}")
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "waiting": len(self),
+            "rooms": len(self._rooms),
+            "queued": self.queued,
+            "delivered": self.delivered,
+            "expired": self.expired,
+            "restored": self.restored,
+        }
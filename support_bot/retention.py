@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from support_bot.models.Repositories.ChatRepository import ChatStatus
+from support_bot.models.Repositories.TicketRepository import TicketStatus
+from support_bot.statements import Statement
+from support_bot.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 3600
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_BATCH_PAUSE = 0.05
+
+# Per table policies:
+#   max_age_days: Delete rows older than this, 0 keeps them
+#   deleted_rooms: Delete rows of the rooms of deleted tickets and chats
+#   max_per_user: Keep only this many of the newest rows per user, 0 keeps all
+DEFAULT_POLICIES = {
+    # Events that still couldn't be decrypted after weeks never will be
+    "encrypted_events": {"max_age_days": 30},
+    "messages": {"max_age_days": 0, "deleted_rooms": True},
+    "event_pairs": {"max_age_days": 0, "deleted_rooms": True},
+    "incoming_events": {"max_age_days": 0, "max_per_user": 1000},
+}
+
+TABLES = {
+    "encrypted_events": "encrypted_events",
+    "messages": "messages",
+    "event_pairs": "EventPairs",
+    "incoming_events": "IncomingEvents",
+}
+
+# Deletes are done in batches of at most LIMIT rows, each its own short transaction
+_deleted_rooms = """
+    SELECT user_room_id FROM Tickets WHERE status = ?
+    UNION
+    SELECT chat_room_id FROM Chats WHERE status = ?
+"""
+
+
+class Retention(object):
+    statements = {
+        **{
+            f"expire_{policy}": f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} WHERE created_at < ? LIMIT ?
+                ) RETURNING id;
+            """ for policy, table in TABLES.items()
+        },
+        "delete_deleted_room_messages": f"""
+            DELETE FROM messages WHERE id IN (
+                SELECT id FROM messages WHERE room_id IN ({_deleted_rooms}) LIMIT ?
+            ) RETURNING id;
+        """,
+        "delete_deleted_room_event_pairs": f"""
+            DELETE FROM EventPairs WHERE id IN (
+                SELECT id FROM EventPairs WHERE room_id IN ({_deleted_rooms}) LIMIT ?
+            ) RETURNING id;
+        """,
+        "delete_deleted_clone_room_event_pairs": f"""
+            DELETE FROM EventPairs WHERE id IN (
+                SELECT id FROM EventPairs WHERE clone_room_id IN ({_deleted_rooms}) LIMIT ?
+            ) RETURNING id;
+        """,
+        "users_over_incoming_events_cap": """
+            SELECT user_id FROM IncomingEvents GROUP BY user_id HAVING COUNT(*) > ?;
+        """,
+        "trim_user_incoming_events": """
+            DELETE FROM IncomingEvents WHERE id IN (
+                SELECT id FROM IncomingEvents WHERE user_id = ? ORDER BY id DESC LIMIT ? OFFSET ?
+            ) RETURNING id;
+        """,
+    }
+
+    def __init__(
+        self,
+        storage: Storage,
+        interval: float = DEFAULT_INTERVAL,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_pause: float = DEFAULT_BATCH_PAUSE,
+        policies: Optional[Dict[str, dict]] = None,
+        analyze: bool = True,
+        vacuum: bool = False,
+    ):
+        """Deletes bookkeeping rows that are no longer needed, in the background
+
+        Rows are deleted in batches of `batch_size`, pausing `batch_pause` seconds in
+        between, so event handlers never wait long for the database. Tables that had rows
+        deleted are analyzed afterwards, and optionally vacuumed.
+
+        Args:
+            storage (Storage): Storage to delete the rows from
+
+            interval (float): Number of seconds between runs
+
+            batch_size (int): Maximum number of rows deleted at once
+
+            batch_pause (float): Number of seconds to wait between batches
+
+            policies (dict): Per table policies, overriding `DEFAULT_POLICIES`
+
+            analyze (bool): Whether to update the query planner statistics after deleting
+
+            vacuum (bool): Whether to reclaim the disk space of deleted rows. On SQLite this
+                rewrites the whole database file
+        """
+        self.storage = storage
+        self.interval = interval
+        self.batch_size = max(1, int(batch_size))
+        self.batch_pause = batch_pause
+        self.analyze = analyze
+        self.vacuum = vacuum
+
+        self.policies = {policy: dict(defaults) for policy, defaults in DEFAULT_POLICIES.items()}
+        for policy, overrides in (policies or {}).items():
+            if policy not in self.policies:
+                raise ValueError(f"Unknown retention table '{policy}'")
+            self.policies[policy].update(overrides or {})
+
+        self.sql = storage.statements.register("Retention", self.statements)
+
+        # Counters
+        self.runs = 0
+        self.reclaimed: Counter = Counter()
+
+    async def run(self):
+        """Apply the policies every `interval` seconds, until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"Retention run failed: {e}")
+
+    async def run_once(self) -> Dict[str, int]:
+        """Apply the policies once, returning the number of deleted rows per table"""
+        start = time.monotonic()
+        # Buffered rows are deleted in order with the committed ones
+        await self.storage.flush_writes()
+
+        reclaimed = Counter()
+        for policy, options in self.policies.items():
+            max_age_days = options.get("max_age_days") or 0
+            if max_age_days > 0:
+                cutoff = datetime.now() - timedelta(days=max_age_days)
+                reclaimed[policy] += await self._delete_batches(self.sql[f"expire_{policy}"], (cutoff,))
+
+            if options.get("deleted_rooms"):
+                deleted = (TicketStatus.DELETED.value, ChatStatus.DELETED.value)
+                if policy == "messages":
+                    reclaimed[policy] += await self._delete_batches(self.sql["delete_deleted_room_messages"], deleted)
+                elif policy == "event_pairs":
+                    reclaimed[policy] += await self._delete_batches(self.sql["delete_deleted_room_event_pairs"], deleted)
+                    reclaimed[policy] += await self._delete_batches(
+                        self.sql["delete_deleted_clone_room_event_pairs"], deleted,
+                    )
+
+            max_per_user = options.get("max_per_user") or 0
+            if max_per_user > 0 and policy == "incoming_events":
+                reclaimed[policy] += await self._trim_incoming_events(max_per_user)
+
+        reclaimed = +reclaimed
+        if reclaimed:
+            await self._compact([TABLES[policy] for policy in reclaimed])
+
+        self.runs += 1
+        self.reclaimed.update(reclaimed)
+        logger.info(
+            f"Retention reclaimed {sum(reclaimed.values())} rows in {time.monotonic() - start:.1f}s"
+            + "".join(f", {policy}: {count}" for policy, count in reclaimed.items())
+        )
+        return dict(reclaimed)
+
+    async def _delete_batches(self, statement: Statement, params: tuple) -> int:
+        deleted = 0
+        while True:
+            rows = await self.storage.fetchall(statement, params + (self.batch_size,))
+            deleted += len(rows)
+            if len(rows) < self.batch_size:
+                return deleted
+            await asyncio.sleep(self.batch_pause)
+
+    async def _trim_incoming_events(self, max_per_user: int) -> int:
+        deleted = 0
+        users = await self.storage.fetchall(self.sql["users_over_incoming_events_cap"], (max_per_user,))
+        for user_id, in users:
+            while True:
+                rows = await self.storage.fetchall(
+                    self.sql["trim_user_incoming_events"], (user_id, self.batch_size, max_per_user),
+                )
+                deleted += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+                await asyncio.sleep(self.batch_pause)
+        return deleted
+
+    async def _compact(self, tables):
+        try:
+            if self.vacuum and self.storage.db_type == "sqlite":
+                # Can't be limited to a table
+                await self.storage.execute("VACUUM")
+            for table in tables:
+                if self.vacuum and self.storage.db_type == "postgres":
+                    await self.storage.execute(f"VACUUM ANALYZE {table}")
+                elif self.analyze:
+                    await self.storage.execute(f"ANALYZE {table}")
+        except Exception as e:
+            logger.warning(f"Failed to compact {', '.join(tables)} after retention: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "reclaimed": dict(self.reclaimed),
+        }
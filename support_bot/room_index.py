@@ -0,0 +1,127 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from support_bot.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Kinds of rooms backed by a database row
+TICKET_ROOM = "ticket"
+CHAT_ROOM = "chat"
+
+# Rooms that are neither are remembered for a while only, in case they become one
+DEFAULT_UNCLASSIFIED_TTL = 300.0
+DEFAULT_MAX_UNCLASSIFIED = 4096
+
+
+class RoomIndex(object):
+    def __init__(
+        self, storage: Storage, unclassified_ttl: float = DEFAULT_UNCLASSIFIED_TTL,
+        max_unclassified: int = DEFAULT_MAX_UNCLASSIFIED,
+    ):
+        """Classification of rooms into ticket rooms, chat rooms and neither
+
+        Maps room ids to (TICKET_ROOM, ticket id), (CHAT_ROOM, chat room id) or
+        (None, None). All ticket and chat rooms are loaded at startup and rooms are added
+        as tickets and chats are created, so classifying a room is a dictionary lookup.
+        Rooms not in the index are looked up in the database once and remembered. Rooms
+        that are neither are remembered for `unclassified_ttl` seconds, at most
+        `max_unclassified` of them.
+
+        Args:
+            storage (Storage): Storage with the ticket and chat repositories set
+
+            unclassified_ttl (float): Seconds a room that is neither is remembered
+
+            max_unclassified (int): Maximum number of rooms that are neither remembered
+        """
+        self.storage = storage
+        self.unclassified_ttl = unclassified_ttl
+        self.max_unclassified = max(1, int(max_unclassified))
+        self._rooms: Dict[str, Tuple[Optional[str], Any]] = {}
+        # Expiry time of the rooms that are neither, oldest first
+        self._unclassified: OrderedDict[str, float] = OrderedDict()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    async def load(self):
+        """Load the rooms of all tickets and chats"""
+        ticket_rooms = await self.storage.repositories.ticketRep.get_ticket_rooms()
+        chat_rooms = await self.storage.repositories.chatRep.get_chat_rooms()
+
+        for room_id, ticket_id in ticket_rooms:
+            self._rooms[room_id] = (TICKET_ROOM, ticket_id)
+        for chat_room_id in chat_rooms:
+            self._rooms[chat_room_id] = (CHAT_ROOM, chat_room_id)
+
+        logger.info(f"Room index loaded {len(ticket_rooms)} ticket rooms and {len(chat_rooms)} chat rooms")
+
+    async def lookup(self, room_id: str) -> Tuple[Optional[str], Any]:
+        """Classify a room, returning its kind and the id of its ticket or chat"""
+        entry = self._rooms.get(room_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        expires = self._unclassified.get(room_id)
+        if expires is not None:
+            if expires > time.monotonic():
+                self.hits += 1
+                return None, None
+            del self._unclassified[room_id]
+
+        self.misses += 1
+        ticket_id = await self.storage.repositories.ticketRep.get_ticket_id(room_id)
+        if ticket_id:
+            entry = (TICKET_ROOM, ticket_id)
+        elif await self.storage.repositories.chatRep.get_chat(room_id):
+            entry = (CHAT_ROOM, room_id)
+        else:
+            # The room may have been added while it was looked up
+            return self._rooms.get(room_id) or self._remember_unclassified(room_id)
+
+        # Rooms added while looked up are more recent
+        return self._rooms.setdefault(room_id, entry)
+
+    def _remember_unclassified(self, room_id: str) -> Tuple[None, None]:
+        self._unclassified.pop(room_id, None)
+        self._unclassified[room_id] = time.monotonic() + self.unclassified_ttl
+        while len(self._unclassified) > self.max_unclassified:
+            self._unclassified.popitem(last=False)
+        return None, None
+
+    def add_ticket(self, room_id: str, ticket_id: int):
+        if room_id:
+            self._rooms[room_id] = (TICKET_ROOM, ticket_id)
+            self._unclassified.pop(room_id, None)
+
+    def add_chat(self, chat_room_id: str):
+        self._rooms[chat_room_id] = (CHAT_ROOM, chat_room_id)
+        self._unclassified.pop(chat_room_id, None)
+
+    def forget(self, room_id: str):
+        self._rooms.pop(room_id, None)
+        self._unclassified.pop(room_id, None)
+
+    def reset(self):
+        """Forget all rooms, looking them up again as they are used"""
+        self._rooms.clear()
+        self._unclassified.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._rooms),
+            "unclassified": len(self._unclassified),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
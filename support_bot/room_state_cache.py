@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+# noinspection PyPackageRequirements
+from nio import AsyncClient, Event, MatrixRoom, RoomEncryptionEvent, RoomGetStateResponse
+
+logger = logging.getLogger(__name__)
+
+
+class RoomStateCache(object):
+    def __init__(self, client: AsyncClient):
+        """Local room state, refreshed from the homeserver only when missing
+
+        The room state in `client.rooms` is kept current by nio from the state events
+        delivered in every sync, so a room present there never needs to be fetched
+        again. Only rooms the sync has not delivered yet (fresh invites, rooms joined
+        moments ago) are fetched with a single `room_get_state` request.
+
+        Args:
+            client (nio.AsyncClient): nio client used to interact with matrix
+        """
+        self.client = client
+        self._refreshing: Dict[str, asyncio.Future] = {}
+
+        # Counters
+        self.refreshes_avoided = 0
+        self.refreshes_performed = 0
+        self.refreshes_failed = 0
+
+    def get(self, room_id: str) -> Optional[MatrixRoom]:
+        return self.client.rooms.get(room_id, None)
+
+    async def ensure(self, room_id: str) -> Optional[MatrixRoom]:
+        """Return the local state of a room, fetching it from the homeserver if missing"""
+        room = self.get(room_id)
+        if room:
+            self.refreshes_avoided += 1
+            return room
+
+        # Share an in flight refresh of the same room
+        pending = self._refreshing.get(room_id)
+        if pending:
+            self.refreshes_avoided += 1
+            return await asyncio.shield(pending)
+
+        pending = asyncio.get_event_loop().create_future()
+        self._refreshing[room_id] = pending
+        try:
+            room = await self._refresh(room_id)
+            pending.set_result(room)
+            return room
+        except Exception:
+            pending.set_result(None)
+            raise
+        finally:
+            del self._refreshing[room_id]
+
+    async def _refresh(self, room_id: str) -> Optional[MatrixRoom]:
+        self.refreshes_performed += 1
+        resp = await self.client.room_get_state(room_id)
+        if not isinstance(resp, RoomGetStateResponse):
+            self.refreshes_failed += 1
+            logger.warning(f"Failed to fetch state of room {room_id}: {resp}")
+            return None
+
+        # Sync may have delivered the room while we were waiting
+        room = self.get(room_id)
+        if room:
+            return room
+
+        encrypted = room_id in self.client.encrypted_rooms
+        room = MatrixRoom(room_id, self.client.user_id, encrypted)
+        for event_dict in resp.events:
+            event = Event.parse_event(event_dict)
+            if isinstance(event, RoomEncryptionEvent):
+                self.client.encrypted_rooms.add(room_id)
+            room.handle_event(event)
+
+        self.client.rooms[room_id] = room
+        dm_index = getattr(self.client, "dm_index", None)
+        if dm_index is not None:
+            dm_index.update_room(room)
+        logger.debug(f"Fetched state of room {room_id} missing from sync")
+        return room
+
+    def stats(self) -> dict:
+        return {
+            "refreshes_avoided": self.refreshes_avoided,
+            "refreshes_performed": self.refreshes_performed,
+            "refreshes_failed": self.refreshes_failed,
+        }
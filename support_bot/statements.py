@@ -0,0 +1,103 @@
+import logging
+import re
+import threading
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+_placeholder_pattern = re.compile(r"\?")
+
+
+class Statement(object):
+    def __init__(self, name: str, sql: str, db_type: str):
+        """A named SQL statement, translated to the placeholder style of the database once
+
+        Args:
+            name (str): Unique name, "<Repository>.<method>"
+
+            sql (str): The statement, with ? placeholders
+
+            db_type (str): One of "sqlite" or "postgres"
+        """
+        self.name = name
+        self.sql = sql
+        self.param_count = len(_placeholder_pattern.findall(sql))
+
+        if db_type == "postgres":
+            self.text = sql.replace("?", "%s")
+
+            # Server side prepared statement, planned once per connection
+            self.prepared_name = "stmt_" + re.sub(r"\W", "_", name).lower()
+            counter = iter(range(1, self.param_count + 1))
+            self.prepare_text = f"PREPARE {self.prepared_name} AS " + \
+                _placeholder_pattern.sub(lambda _: f"${next(counter)}", sql.strip().rstrip(";"))
+            if self.param_count:
+                self.execute_text = f"EXECUTE {self.prepared_name} ({', '.join(['%s'] * self.param_count)})"
+            else:
+                self.execute_text = f"EXECUTE {self.prepared_name}"
+        else:
+            # sqlite3 caches compiled statements per connection, keyed by the SQL text
+            self.text = sql
+            self.prepared_name = None
+
+        # Counters
+        self.calls = 0
+        self.total_time = 0.0
+
+
+class StatementRegistry(object):
+    def __init__(self, db_type: str):
+        """Named statements declared by the repositories
+
+        Args:
+            db_type (str): One of "sqlite" or "postgres"
+        """
+        self.db_type = db_type
+        self._statements: Dict[str, Statement] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def __iter__(self):
+        return iter(list(self._statements.values()))
+
+    def register(self, namespace: str, statements: Dict[str, str]) -> Dict[str, Statement]:
+        """Register a group of statements under a namespace, returning them by name"""
+        registered = {}
+        for name, sql in statements.items():
+            full_name = f"{namespace}.{name}"
+            statement = self._statements.get(full_name)
+            if not statement:
+                statement = Statement(full_name, sql, self.db_type)
+                self._statements[full_name] = statement
+            registered[name] = statement
+        return registered
+
+    def get(self, name: str) -> Statement:
+        return self._statements[name]
+
+    def record(self, statement: Statement, elapsed: float):
+        with self._lock:
+            statement.calls += 1
+            statement.total_time += elapsed
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            statement.name: {
+                "calls": statement.calls,
+                "total_time": statement.total_time,
+                "avg_time": statement.total_time / statement.calls if statement.calls else 0.0,
+            } for statement in self._statements.values() if statement.calls
+        }
+
+    def log_stats(self, limit: int = 10):
+        """Log the statements that took the most time in total"""
+        top = sorted(self._statements.values(), key=lambda s: s.total_time, reverse=True)[:limit]
+        for statement in top:
+            if not statement.calls:
+                break
+            logger.info(
+                f"Statement {statement.name}: {statement.calls} calls, {statement.total_time * 1000:.1f} ms total, "
+                f"{statement.total_time * 1000 / statement.calls:.2f} ms avg"
+            )
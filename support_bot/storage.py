@@ -1,14 +1,28 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 
+import asyncio
 import importlib
 import json
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import asdict
-from typing import Optional, List
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, List, Set, Tuple, Union
 # noinspection PyPackageRequirements
 from nio import MegolmEvent
 
+from support_bot.authorization import AuthorizationRegistry
+from support_bot.batch_loader import BatchLoader
+from support_bot.model_cache import DEFAULT_MAX_SIZE, DEFAULT_NEGATIVE_TTL, DEFAULT_TTL, ModelCache
+from support_bot.room_index import RoomIndex
+from support_bot.statements import Statement, StatementRegistry
+from support_bot.write_buffer import DEFAULT_FLUSH_INTERVAL, DEFAULT_MAX_BATCH, WriteBuffer
+
 if TYPE_CHECKING:
     from support_bot.models.Repositories.Repositories import Repositories
 
@@ -20,11 +34,144 @@ if TYPE_CHECKING:
 #
 # When a migration is performed, the `migration_version` table should be incremented.
 
-latest_migration_version = 15
+latest_migration_version = 20
+
+DEFAULT_POOL_SIZE = 4
+
+# Number of compiled statements each SQLite connection keeps, enough for every registered statement
+SQLITE_CACHED_STATEMENTS = 256
+
+# SQLite performance profile, applied to every connection
+SQLITE_DEFAULT_PROFILE = {
+    # Readers don't block the writer and commits append to the WAL instead of rewriting pages
+    "journal_mode": "wal",
+    # In WAL mode, only checkpoints fsync. A power loss may undo the last commits, never corrupt
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative values are in KiB
+    "cache_size": -64 * 1024,
+    "temp_store": "memory",
+    # Milliseconds to wait for a lock held by another pooled connection
+    "busy_timeout": 5000,
+}
+SQLITE_PRAGMA_VALUES = {
+    "journal_mode": {"delete", "truncate", "persist", "memory", "wal", "off"},
+    "synchronous": {"off", "normal", "full", "extra"},
+    "temp_store": {"default", "file", "memory"},
+}
+DEFAULT_MAINTENANCE_INTERVAL = 3600
+
+# Postgres error codes
+PG_INVALID_SQL_STATEMENT_NAME = "26000"
+PG_DUPLICATE_PREPARED_STATEMENT = "42P05"
+
+# What to fetch after executing a statement
+FETCH_NONE = 0
+FETCH_ONE = 1
+FETCH_ALL = 2
 
 logger = logging.getLogger(__name__)
 
 
+def sqlite_profile(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge configured pragmas into the default SQLite profile, validating them.
+
+    Pragma values can't be bound as parameters, so only known values are accepted.
+
+    Raises:
+        ValueError: On an unknown pragma or value
+    """
+    profile = dict(SQLITE_DEFAULT_PROFILE)
+    for pragma, value in overrides.items():
+        if pragma not in profile:
+            raise ValueError(f"Unknown SQLite pragma '{pragma}'")
+        if pragma in SQLITE_PRAGMA_VALUES:
+            value = str(value).lower()
+            if value not in SQLITE_PRAGMA_VALUES[pragma]:
+                raise ValueError(f"Invalid value '{value}' for SQLite pragma '{pragma}'")
+        else:
+            value = int(value)
+        profile[pragma] = value
+    return profile
+
+
+class ConnectionPool(object):
+    def __init__(self, connect: Callable[[], Any], size: int, on_discard: Callable[[Any], None] = None):
+        """A thread safe pool of database connections, opened lazily up to `size`
+
+        Args:
+            connect: Callable opening a new database connection
+
+            size (int): Maximum number of open connections
+
+            on_discard: Optional callable notified of every closed connection
+        """
+        self._connect = connect
+        self.size = size
+        self._on_discard = on_discard
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def acquire(self):
+        """Take an idle connection, open a new one or wait for one to be released"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """Drop a broken connection, making room for a new one"""
+        with self._lock:
+            self._opened -= 1
+        if self._on_discard:
+            self._on_discard(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            # psycopg2 marks connections it lost as closed
+            if getattr(conn, "closed", 0):
+                self.discard(conn)
+            else:
+                self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(conn)
+
+
 class Storage(object):
     def __init__(self, database_config):
         """Setup the database
@@ -32,24 +179,86 @@ class Storage(object):
         Runs an initial setup or migrations depending on whether a database file has already
         been created
 
+        Queries are run on a pool of connections by a bounded number of background
+        threads, so database round trips never block the event loop. Every query uses
+        its own cursor, so concurrent callers (event workers, the gRPC server handlers
+        running on the main loop) never share a cursor or a connection.
+
         Args:
             database_config: a dictionary containing the following keys:
                 * type: A string, one of "sqlite" or "postgres"
                 * connection_string: A string, featuring a connection string that
                     be fed to each respective db library's `connect` method
+                * pool_size: Optional maximum number of open connections
+                * prepared_statements: Optional, whether to use server side prepared
+                    statements for the registered statements on postgres
+                * write_buffer: Optional, whether to commit bookkeeping rows in batches
+                * write_buffer_flush_interval: Optional maximum number of seconds a
+                    buffered row waits to be committed
+                * write_buffer_max_batch: Optional number of buffered rows that are
+                    committed together at most
+                * model_cache_size: Optional maximum number of cached models
+                * model_cache_ttl: Optional number of seconds a model stays cached
+                * model_cache_negative_ttl: Optional number of seconds a missing model
+                    stays cached
+                * sqlite: Optional SQLite pragmas overriding `SQLITE_DEFAULT_PROFILE`
+                * maintenance_interval: Optional number of seconds between the WAL
+                    checkpoint and optimize runs of `run_maintenance`
         """
-        self.conn = self._get_database_connection(
-            database_config["type"], database_config["connection_string"]
-        )
-        self.cursor = self.conn.cursor()
         self.db_type = database_config["type"]
+        connection_string = database_config["connection_string"]
+
+        self.sqlite_profile = sqlite_profile(database_config.get("sqlite") or {})
+        self.maintenance_interval = database_config.get("maintenance_interval", DEFAULT_MAINTENANCE_INTERVAL)
+
+        pool_size = max(1, int(database_config.get("pool_size") or DEFAULT_POOL_SIZE))
+        if self.db_type == "sqlite" and ":memory:" in connection_string:
+            # Every connection to an in-memory database opens a separate, empty database
+            pool_size = 1
+
+        self.pool = ConnectionPool(
+            lambda: self._get_database_connection(self.db_type, connection_string, self.sqlite_profile), pool_size,
+            on_discard=lambda conn: self._prepared.pop(id(conn), None),
+        )
+        # One thread per connection, so a query never waits for a connection
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="storage")
+
+        # Named statements declared by the repositories, translated to this database once
+        self.statements = StatementRegistry(self.db_type)
+        self.prepared_statements = self.db_type == "postgres" and database_config.get("prepared_statements", True)
+        # Names of the statements prepared on each connection, by connection id
+        self._prepared: Dict[int, Set[str]] = {}
+
+        # Bookkeeping rows written behind the event handlers, one transaction per batch
+        self.writes: Optional[WriteBuffer] = None
+        if database_config.get("write_buffer", True):
+            self.writes = WriteBuffer(
+                self,
+                flush_interval=database_config.get("write_buffer_flush_interval", DEFAULT_FLUSH_INTERVAL),
+                max_batch=database_config.get("write_buffer_max_batch", DEFAULT_MAX_BATCH),
+            )
+
+        # Models loaded by the repositories, shared by all model types
+        self.model_cache = ModelCache(
+            database_config.get("model_cache_size", DEFAULT_MAX_SIZE),
+            database_config.get("model_cache_ttl", DEFAULT_TTL),
+            database_config.get("model_cache_negative_ttl", DEFAULT_NEGATIVE_TTL),
+        )
+
+        # Batched model lookups, by model kind
+        self.loaders: Dict[str, BatchLoader] = {}
+
+        # Ticket and chat rooms by room id, loaded once the repositories are set
+        self.room_index = RoomIndex(self)
+
+        # Staff and Support rosters, loaded once the repositories are set
+        self.authorization = AuthorizationRegistry(self)
 
         # Try to check the current migration version
         migration_level = 0
         # noinspection PyBroadException
         try:
-            self._execute("SELECT version FROM migration_version")
-            row = self.cursor.fetchone()
+            row = self._run("SELECT version FROM migration_version", fetch=FETCH_ONE)
             migration_level = row[0]
         except Exception:
             self._initial_setup()
@@ -57,18 +266,73 @@ class Storage(object):
             if migration_level < latest_migration_version:
                 self._run_migrations(migration_level)
 
+        self.sql = self.statements.register("Storage", {
+            "get_encrypted_events": """
+                select id, device_id, room_id, session_id, event, user_id from encrypted_events where session_id = ?;
+            """,
+            "get_encrypted_events_for_user": """
+                select id, device_id, room_id, session_id, event, user_id from encrypted_events where user_id = ?;
+            """,
+            "get_message_by_management_event_id": """
+                SELECT room_id, event_id FROM messages where management_event_id = ?
+            """,
+            "remove_encrypted_event": """
+                delete from encrypted_events where event_id = ?;
+            """,
+            "store_encrypted_event": """
+                insert into encrypted_events
+                    (device_id, event_id, room_id, session_id, event, user_id, created_at) values
+                    (?, ?, ?, ?, ?, ?, ?)
+            """,
+            "store_message": """
+                insert into messages (event_id, management_event_id, room_id, created_at) values (?, ?, ?, ?)
+            """,
+        })
+
         logger.info(f"Database initialization of type '{self.db_type}' complete")
+        if self.db_type == "sqlite":
+            self._log_sqlite_profile()
+
+    def _log_sqlite_profile(self):
+        """Log the settings in effect, which may differ from the configured ones
+
+        An in-memory database can't use WAL, for example, and has no mmap_size at all.
+        """
+        effective = {}
+        for pragma in SQLITE_DEFAULT_PROFILE:
+            row = self._run(f"PRAGMA {pragma}", fetch=FETCH_ONE)
+            effective[pragma] = row[0] if row else "n/a"
+        logger.info("SQLite profile: " + ", ".join(f"{pragma}={value}" for pragma, value in effective.items()))
+        if effective["journal_mode"] != self.sqlite_profile["journal_mode"]:
+            logger.warning(
+                f"SQLite journal mode is {effective['journal_mode']}, configured {self.sqlite_profile['journal_mode']}"
+            )
 
     def set_repositories(self, repositories: Repositories):
         self.repositories:Repositories = repositories
 
+    def loader(self, kind: str, load_many: Callable) -> BatchLoader:
+        """The batch loader of a model kind, created with `load_many` on first use"""
+        loader = self.loaders.get(kind)
+        if loader is None:
+            loader = self.loaders[kind] = BatchLoader(load_many)
+        return loader
+
     @staticmethod
-    def _get_database_connection(database_type: str, connection_string: str):
+    def _get_database_connection(database_type: str, connection_string: str, sqlite_profile: Dict[str, Any] = None):
         if database_type == "sqlite":
             import sqlite3
 
-            # Initialize a connection to the database, with autocommit on
-            return sqlite3.connect(connection_string, isolation_level=None)
+            # Initialize a connection to the database, with autocommit on.
+            # Connections are handed between the pool threads, but only used by one at a time
+            conn = sqlite3.connect(
+                connection_string, isolation_level=None, check_same_thread=False,
+                cached_statements=SQLITE_CACHED_STATEMENTS,
+            )
+            # busy_timeout first, switching the journal mode may have to wait for a lock
+            for pragma, value in sorted((sqlite_profile or {}).items(), key=lambda item: item[0] != "busy_timeout"):
+                conn.execute(f"PRAGMA {pragma} = {value}")
+            return conn
         elif database_type == "postgres":
             # noinspection PyUnresolvedReferences
             import psycopg2
@@ -133,19 +397,169 @@ class Storage(object):
             logger.info(f"Database migrated to v{next_migration_version}")
             current_migration_version += 1
 
+    def _run(self, sql: Union[str, Statement], params: tuple = (), fetch: int = FETCH_NONE):
+        """Execute a single statement on a pooled connection, with its own cursor. Blocking.
+
+        Registered statements are executed in their translated form and timed. Plain SQL
+        has its placeholder ?'s transformed to %s for postgres on every call.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute_statement(conn, cursor, sql, params)
+
+                if fetch == FETCH_ONE:
+                    return cursor.fetchone()
+                elif fetch == FETCH_ALL:
+                    return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _run_batch(self, batch: List[Tuple[Statement, tuple]]):
+        """Execute a batch of writes in a single transaction on a pooled connection. Blocking.
+
+        Nothing of the batch is committed if any statement fails.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if self.prepared_statements:
+                    # Prepare outside of the transaction, a failing PREPARE would abort it
+                    for statement in {statement for statement, _ in batch}:
+                        self._ensure_prepared(conn, cursor, statement)
+
+                cursor.execute("BEGIN")
+                try:
+                    for statement, params in batch:
+                        self._execute_statement(conn, cursor, statement, params)
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            finally:
+                cursor.close()
+
+    def _execute_statement(self, conn, cursor, sql: Union[str, Statement], params: tuple):
+        if not isinstance(sql, Statement):
+            if self.db_type == "postgres":
+                sql = sql.replace("?", "%s")
+            cursor.execute(sql, params)
+            return
+
+        start = time.perf_counter()
+        try:
+            if self.prepared_statements:
+                self._execute_prepared(conn, cursor, sql, params)
+            else:
+                cursor.execute(sql.text, params)
+        finally:
+            self.statements.record(sql, time.perf_counter() - start)
+
+    def _execute_prepared(self, conn, cursor, statement: Statement, params: tuple):
+        """Execute a statement prepared on the server, preparing it first if this connection hasn't"""
+        self._ensure_prepared(conn, cursor, statement)
+
+        try:
+            cursor.execute(statement.execute_text, params)
+        except Exception as e:
+            if getattr(e, "pgcode", None) != PG_INVALID_SQL_STATEMENT_NAME:
+                raise
+            # The server dropped the prepared statement (e.g. DISCARD ALL from a connection pooler)
+            self._prepare(cursor, statement)
+            cursor.execute(statement.execute_text, params)
+
+    def _ensure_prepared(self, conn, cursor, statement: Statement):
+        prepared = self._prepared.setdefault(id(conn), set())
+        if statement.prepared_name not in prepared:
+            self._prepare(cursor, statement)
+            prepared.add(statement.prepared_name)
+
+    @staticmethod
+    def _prepare(cursor, statement: Statement):
+        try:
+            cursor.execute(statement.prepare_text)
+        except Exception as e:
+            if getattr(e, "pgcode", None) != PG_DUPLICATE_PREPARED_STATEMENT:
+                raise
+
     def _execute(self, *args):
-        """A wrapper around cursor.execute that transforms placeholder ?'s to %s for postgres
+        """Blocking execution of a statement, for use during startup (migrations) only"""
+        self._run(*args)
+
+    def _submit(self, sql: Union[str, Statement], params: tuple, fetch: int):
+        return asyncio.get_running_loop().run_in_executor(self._executor, self._run, sql, params, fetch)
+
+    async def execute(self, sql: Union[str, Statement], params: tuple = ()) -> None:
+        """Execute a statement without blocking the event loop"""
+        await self._submit(sql, params, FETCH_NONE)
+
+    async def fetchone(self, sql: Union[str, Statement], params: tuple = ()) -> Optional[tuple]:
+        """Execute a statement without blocking the event loop, returning the first row"""
+        return await self._submit(sql, params, FETCH_ONE)
+
+    async def fetchall(self, sql: Union[str, Statement], params: tuple = ()) -> List[tuple]:
+        """Execute a statement without blocking the event loop, returning all rows"""
+        return await self._submit(sql, params, FETCH_ALL)
+
+    async def write(self, statement: Statement, params: tuple):
+        """Write a bookkeeping row through the write buffer, or directly if it is disabled
+
+        The row is not committed yet when this returns. Readers of buffered rows check
+        `writes.pending` first, or call `flush_writes`.
         """
-        if self.db_type == "postgres":
-            self.cursor.execute(args[0].replace("?", "%s"), *args[1:])
+        if self.writes is not None:
+            self.writes.add(statement, params)
         else:
-            self.cursor.execute(*args)
-
-    def get_encrypted_events(self, session_id: str) -> List:
-        self._execute("""
-            select id, device_id, room_id, session_id, event, user_id from encrypted_events where session_id = ?;
-        """, (session_id,))
-        events = self.cursor.fetchall()
+            await self.execute(statement, params)
+
+    def pending_writes(self, statement: Statement) -> List[tuple]:
+        """Parameters of the buffered, not yet committed, writes of a statement"""
+        return list(self.writes.pending(statement)) if self.writes is not None else []
+
+    async def flush_writes(self):
+        """Commit all buffered writes"""
+        if self.writes is not None:
+            await self.writes.flush()
+
+    def _maintain(self):
+        """Fold the WAL back into the database file and refresh the query planner statistics. Blocking."""
+        if self.sqlite_profile["journal_mode"] == "wal":
+            busy, log_pages, checkpointed = self._run("PRAGMA wal_checkpoint(TRUNCATE)", fetch=FETCH_ONE)
+            if busy:
+                logger.debug(f"WAL checkpoint incomplete, {checkpointed} of {log_pages} pages written back")
+        self._run("PRAGMA optimize")
+
+    async def run_maintenance(self):
+        """Periodically maintain a SQLite database, until cancelled"""
+        if self.db_type != "sqlite" or not self.maintenance_interval:
+            return
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._maintain)
+            except Exception as e:
+                logger.warning(f"SQLite maintenance failed: {e}")
+
+    def close(self):
+        """Commit buffered writes, wait for running queries and close all connections"""
+        self._executor.shutdown(wait=True)
+        if self.writes is not None:
+            self.writes.flush_sync()
+            logger.info(f"Write buffer: {self.writes.stats()}")
+        if self.db_type == "sqlite":
+            try:
+                self._run("PRAGMA optimize")
+            except Exception as e:
+                logger.warning(f"SQLite optimize failed: {e}")
+        self.pool.close()
+        self.statements.log_stats()
+        logger.info(f"Model cache: {self.model_cache.stats()}")
+        logger.info(f"Room index: {self.room_index.stats()}")
+        for kind, loader in self.loaders.items():
+            logger.info(f"{kind} loader: {loader.stats()}")
+
+    async def get_encrypted_events(self, session_id: str) -> List:
+        events = await self.fetchall(self.sql["get_encrypted_events"], (session_id,))
         return [
             {
                 "id": row[0],
@@ -157,11 +571,8 @@ class Storage(object):
             } for row in events
         ]
 
-    def get_encrypted_events_for_user(self, user_id: str) -> List:
-        self._execute("""
-            select id, device_id, room_id, session_id, event, user_id from encrypted_events where user_id = ?;
-        """, (user_id,))
-        events = self.cursor.fetchall()
+    async def get_encrypted_events_for_user(self, user_id: str) -> List:
+        events = await self.fetchall(self.sql["get_encrypted_events_for_user"], (user_id,))
         return [
             {
                 "id": row[0],
@@ -173,33 +584,31 @@ class Storage(object):
             } for row in events
         ]
 
-    def get_message_by_management_event_id(self, management_event_id: str) -> Optional[dict]:
-        self._execute("SELECT room_id, event_id FROM messages where management_event_id = ?", (management_event_id,))
-        row = self.cursor.fetchone()
+    async def get_message_by_management_event_id(self, management_event_id: str) -> Optional[dict]:
+        for pending in self.pending_writes(self.sql["store_message"]):
+            if pending[1] == management_event_id:
+                return {
+                    "room_id": pending[2],
+                    "event_id": pending[0],
+                }
+
+        row = await self.fetchone(self.sql["get_message_by_management_event_id"], (management_event_id,))
         if row:
             return {
                 "room_id": row[0],
                 "event_id": row[1],
             }
 
-    def remove_encrypted_event(self, event_id: str):
-        self._execute("""
-            delete from encrypted_events where event_id = ?;
-        """, (event_id,))
+    async def remove_encrypted_event(self, event_id: str):
+        await self.execute(self.sql["remove_encrypted_event"], (event_id,))
 
-    def store_encrypted_event(self, event: MegolmEvent):
+    async def store_encrypted_event(self, event: MegolmEvent):
         try:
             event_dict = asdict(event)
             event_json = json.dumps(event_dict)
-            self._execute("""
-                insert into encrypted_events
-                    (device_id, event_id, room_id, session_id, event, user_id) values
-                    (?, ?, ?, ?, ?, ?)
-            """, (event.device_id, event.event_id, event.room_id, event.session_id, event_json, event.sender))
+            await self.execute(self.sql["store_encrypted_event"], (event.device_id, event.event_id, event.room_id, event.session_id, event_json, event.sender, datetime.now()))
         except Exception as ex:
             logger.error("Failed to store encrypted event %s: %s" % (event.event_id, ex))
 
-    def store_message(self, event_id: str, management_event_id: str, room_id: str):
-        self._execute("""
-            insert into messages (event_id, management_event_id, room_id) values (?, ?, ?)
-        """, (event_id, management_event_id, room_id))
+    async def store_message(self, event_id: str, management_event_id: str, room_id: str):
+        await self.write(self.sql["store_message"], (event_id, management_event_id, room_id, datetime.now()))
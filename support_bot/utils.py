@@ -7,14 +7,11 @@ from typing import Optional, List
 
 # noinspection PyPackageRequirements
 import nio
-logger = logging.getLogger(__name__)
-
-# Domain part from https://stackoverflow.com/a/106223/1489738
-USER_ID_REGEX = r"@[a-z0-9_=\/\-\.]*:(([a-zA-Z0-9]|[a-zA-Z0-9][a-zA-Z0-9\-]*[a-zA-Z0-9])\.)*([A-Za-z0-9]|[A-Za-z0-9]" \
-                r"[A-Za-z0-9\-]*[A-Za-z0-9])*"
 
-reply_regex = re.compile(r"<mx-reply><blockquote>.*</blockquote></mx-reply>(.*)", flags=re.RegexFlag.DOTALL)
+from support_bot.outbound import Lane, OutboundScheduler
+from support_bot.parsed_event import ParsedEvent, user_id_pattern
 
+logger = logging.getLogger(__name__)
 
 def make_pill(user_id: str, displayname: str = None) -> str:
     """Convert a user ID (and optionally a display name) to a formatted user 'pill'
@@ -47,65 +44,44 @@ def get_in_reply_to(event: nio.Event) -> Optional[str]:
     """
     Pulls an in reply to event ID from an event, if any.
     """
-    return event.source.get("content", {}).get("m.relates_to", {}).get("m.in_reply_to", {}).get("event_id")
+    return ParsedEvent(event).in_reply_to
 
 
 def get_mentions(text: str) -> List[str]:
     """
     Get mentions in a message.
     """
-    matches = re.finditer(USER_ID_REGEX, text, re.MULTILINE)
-    return list({match.group() for match in matches})
+    return list({match.group() for match in user_id_pattern.finditer(text)})
 
 
 def get_replaces(event: nio.Event) -> Optional[str]:
     """
     Get the replaces relation, if any.
     """
-    rel_type = event.source.get("content", {}).get("m.relates_to", {}).get("rel_type")
-    if rel_type == "m.replace":
-        return event.source.get("content").get("m.relates_to").get("event_id")
+    return ParsedEvent(event).replaces
 
 
 def _get_reply_msg(event: nio.Event) -> Optional[str]:
-    # first check if this is edit
-    if get_replaces(event):
-        msg_plain = event.source.get("content", {}).get("m.new_content", {}).get("body")
-        msg_formatted = event.source.get("content", {}).get("m.new_content", {}).get("formatted_body")
-    else:
-        msg_plain = event.source.get("content", {}).get("body")
-        msg_formatted = event.source.get("content", {}).get("formatted_body")
-
-    if msg_formatted and (reply_msg := reply_regex.findall(msg_formatted)):
-        return reply_msg[0]
-    elif msg_formatted:
-        return msg_formatted
-    else:
-        #revert to old method
-        message_parts = msg_plain.split('\n\n', 1)
-        if len(message_parts) > 1:
-            return '\n\n'.join(message_parts[1:])
-        return msg_plain
+    return ParsedEvent(event).reply_section
 
 
 def get_reply_msg(event: nio.Event, reply_to: Optional[str], replaces: Optional[str]) -> Optional[str]:
-    if reply_to or replaces:
-        if reply_section := _get_reply_msg(event):
-            if any([reply_section.startswith(x) for x in ("!reply ", "<p>!reply ")]):
-                return reply_section
+    return ParsedEvent(event).reply_msg if reply_to or replaces else None
 def get_raise_msg(event: nio.Event, reply_to: Optional[str], replaces: Optional[str]) -> Optional[str]:
-    if reply_to or replaces:
-        if reply_section := _get_reply_msg(event):
-            if any([reply_section.startswith(x) for x in ("!raise ", "<p>!raise ")]):
-                return reply_section
+    return ParsedEvent(event).raise_msg if reply_to or replaces else None
 
 
 async def get_room_id(client: nio.AsyncClient, room: str, logger: logging.Logger) -> str:
     if room.startswith("#"):
-        response = await client.room_resolve_alias(room)
-        if getattr(response, "room_id", None):
-            logger.debug(f"Room '{room}' resolved to {response.room_id}")
-            return response.room_id
+        alias_cache = getattr(client, "alias_cache", None)
+        if alias_cache is not None:
+            room_id = await alias_cache.resolve(room)
+        else:
+            response = await client.room_resolve_alias(room)
+            room_id = getattr(response, "room_id", None)
+        if room_id:
+            logger.debug(f"Room '{room}' resolved to {room_id}")
+            return room_id
         else:
             logger.warning(f"Could not resolve '{room}' to a room ID")
             raise ValueError("Unknown room alias")
@@ -122,10 +98,19 @@ async def sleep_ms(delay_ms):
 
     await asyncio.sleep(delay_s)
 
-def with_ratelimit(func):
+def with_ratelimit(func, lane: Lane = Lane.COMMAND):
     """
     Decorator for calling client methods with backoff, specified in server response if rate limited.
+
+    Requests go through the outbound scheduler of the client in the given lane, if it has one.
     """
+    scheduler = getattr(getattr(func, "__self__", None), "outbound", None)
+    if isinstance(scheduler, OutboundScheduler):
+        async def scheduled(*args, **kwargs):
+            return await scheduler.submit(lane, func, *args, **kwargs)
+
+        return scheduled
+
     async def wrapper(*args, **kwargs):
         while True:
             logger.debug(f"waiting for response")
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import asyncio
+import itertools
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+from support_bot.statements import Statement
+
+if TYPE_CHECKING:
+    from support_bot.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 0.05
+DEFAULT_MAX_BATCH = 100
+
+
+class WriteBuffer(object):
+    def __init__(self, storage: Storage, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        """Write-behind buffer for bookkeeping rows
+
+        Buffered writes are committed together in a single transaction, either
+        `flush_interval` seconds after the first one was buffered or as soon as
+        `max_batch` writes are waiting, turning one commit per row into one per batch.
+
+        Rows waiting to be written, or being written, can be looked up with `pending`,
+        so readers always see their own writes.
+
+        Args:
+            storage (Storage): Storage the writes are committed to
+
+            flush_interval (float): Maximum number of seconds a write waits to be committed
+
+            max_batch (int): Number of waiting writes that triggers a flush immediately
+        """
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, int(max_batch))
+
+        self._pending: List[Tuple[Statement, tuple]] = []
+        self._flushing: List[Tuple[Statement, tuple]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.buffered = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._flushing)
+
+    def add(self, statement: Statement, params: tuple):
+        """Buffer a write, to be committed with the next batch"""
+        self._pending.append((statement, params))
+        self.buffered += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    def pending(self, statement: Statement) -> Iterator[tuple]:
+        """Parameters of the not yet committed writes of a statement, oldest first"""
+        for pending_statement, params in itertools.chain(self._flushing, self._pending):
+            if pending_statement is statement:
+                yield params
+
+    def _start_flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        # A running flush keeps going until nothing is pending
+        if not self._flush_task or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        while self._pending:
+            self._flushing, self._pending = self._pending, []
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self.storage._executor, self.storage._run_batch, self._flushing,
+                )
+                self.flushed_rows += len(self._flushing)
+            except Exception as e:
+                logger.warning(f"Failed to write a batch of {len(self._flushing)} rows, writing them one by one: {e}")
+                await self._write_one_by_one(self._flushing)
+            finally:
+                self.flushes += 1
+                self._flushing = []
+
+    async def _write_one_by_one(self, batch: List[Tuple[Statement, tuple]]):
+        for statement, params in batch:
+            try:
+                await self.storage.execute(statement, params)
+                self.flushed_rows += 1
+            except Exception as e:
+                self.failed_rows += 1
+                logger.error(f"Failed to write {statement.name} {params}: {e}")
+
+    async def flush(self):
+        """Commit every buffered write"""
+        if self._pending:
+            self._start_flush()
+        if self._flush_task:
+            await asyncio.shield(self._flush_task)
+
+    def flush_sync(self):
+        """Commit every buffered write, blocking. For use when the event loop is gone"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            self.storage._run_batch(batch)
+            self.flushed_rows += len(batch)
+        except Exception as e:
+            self.failed_rows += len(batch)
+            logger.error(f"Failed to write {len(batch)} buffered rows on shutdown: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self),
+            "buffered": self.buffered,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "avg_batch": self.flushed_rows / self.flushes if self.flushes else 0.0,
+        }
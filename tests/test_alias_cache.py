@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+import nio
+
+from support_bot.alias_cache import AliasCache
+from support_bot.utils import get_room_id
+from tests.utils import run
+
+
+class AliasCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        async def resolve(alias):
+            if alias == "#support:example.com":
+                return nio.RoomResolveAliasResponse(alias, "!support:example.com", [])
+            return nio.RoomResolveAliasError("Room alias not found")
+
+        self.client = Mock(spec=nio.AsyncClient)
+        self.client.room_resolve_alias = AsyncMock(side_effect=resolve)
+        self.client.alias_cache = AliasCache(self.client)
+        self.logger = Mock()
+
+    def test_resolution(self):
+        """Tests that concurrent and repeated sends resolve an alias once"""
+        async def sends():
+            return await asyncio.gather(*(
+                get_room_id(self.client, "#support:example.com", self.logger) for _ in range(3)
+            ))
+
+        self.assertEqual(run(sends()), ["!support:example.com"] * 3)
+        self.assertEqual(run(get_room_id(self.client, "#support:example.com", self.logger)), "!support:example.com")
+        self.assertEqual(self.client.room_resolve_alias.await_count, 1)
+
+    def test_failures(self):
+        """Tests that an alias that failed to resolve isn't requested again until it expires"""
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                run(get_room_id(self.client, "#missing:example.com", self.logger))
+
+        self.assertEqual(self.client.room_resolve_alias.await_count, 1)
+
+        self.client.alias_cache.negative_ttl = 0
+        self.client.alias_cache.invalidate("#missing:example.com")
+        self.assertIsNone(run(self.client.alias_cache.resolve("#missing:example.com")))
+        self.assertEqual(self.client.room_resolve_alias.await_count, 2)
+
+    def test_transport_errors(self):
+        """Tests that an alias whose resolution raised isn't requested again until it expires"""
+        self.client.room_resolve_alias.side_effect = nio.LocalProtocolError("Not logged in")
+
+        for _ in range(2):
+            self.assertIsNone(run(self.client.alias_cache.resolve("#support:example.com")))
+
+        self.assertEqual(self.client.room_resolve_alias.await_count, 1)
+        self.assertEqual(self.client.alias_cache.stats()["failures"], 1)
+
+    def test_cancelled(self):
+        """Tests that callers sharing a resolution that is cancelled don't wait forever"""
+        async def never(alias):
+            await asyncio.Event().wait()
+
+        self.client.room_resolve_alias.side_effect = never
+
+        async def cancel():
+            cache = self.client.alias_cache
+            resolving = asyncio.ensure_future(cache.resolve("#support:example.com"))
+            await asyncio.sleep(0)
+            sharing = asyncio.ensure_future(cache.resolve("#support:example.com"))
+            await asyncio.sleep(0)
+            resolving.cancel()
+            return await asyncio.wait_for(sharing, 1)
+
+        self.assertIsNone(run(cancel()))
+
+    def test_canonical_alias_change(self):
+        """Tests that the aliases of a room are resolved again after its canonical alias changes"""
+        cache = self.client.alias_cache
+        run(cache.warm(["#support:example.com", "!room:example.com", None]))
+
+        room = nio.MatrixRoom("!support:example.com", "@bot:example.com")
+        event = Mock(spec=nio.RoomAliasEvent)
+        event.canonical_alias = "#help:example.com"
+        event.source = {"content": {"alias": "#help:example.com"}}
+        run(cache.canonical_alias(room, event))
+        run(cache.resolve("#support:example.com"))
+
+        self.assertEqual(self.client.room_resolve_alias.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
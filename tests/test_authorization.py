@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.models.Staff import Staff
+from support_bot.models.Support import Support
+from support_bot.storage import Storage
+from tests.utils import run
+
+
+class AuthorizationRegistryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+        self.store.set_repositories(Repositories(self.store))
+        self.store._execute("INSERT INTO Staff (user_id) VALUES ('@staff:example.com')")
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_membership_without_queries(self):
+        """Tests that membership is answered from the loaded rosters, and kept current by the repositories"""
+        async def scenario():
+            await self.store.authorization.load()
+            staff = await Staff.get_existing(self.store, "@staff:example.com")
+            not_support = await Support.get_existing(self.store, "@staff:example.com")
+            await Support.create_new(self.store, "@support:example.com")
+            support = await Support.get_existing(self.store, "@support:example.com")
+            await self.store.repositories.staffRep.delete_staff("@staff:example.com")
+            removed_staff = await Staff.get_existing(self.store, "@staff:example.com")
+            return staff, not_support, support, removed_staff
+
+        staff, not_support, support, removed_staff = run(scenario())
+
+        self.assertEqual(staff.user_id, "@staff:example.com")
+        self.assertIsNone(not_support)
+        self.assertEqual(support.user_id, "@support:example.com")
+        self.assertIsNone(removed_staff)
+        self.assertEqual(self.store.statements.get("Staff.get_staff").calls, 0)
+        self.assertEqual(self.store.statements.get("Support.get_support").calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
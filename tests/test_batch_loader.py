@@ -0,0 +1,94 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from support_bot.batch_loader import BatchLoader
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.models.Ticket import Ticket
+from support_bot.models.User import User
+from support_bot.storage import Storage
+from tests.utils import run
+
+
+class BatchLoaderTestCase(unittest.TestCase):
+    def test_coalescing(self):
+        """Tests that lookups made together are loaded in batches of at most max_batch keys"""
+        batches = []
+
+        async def load_many(keys):
+            batches.append(keys)
+            return {key: key * 10 for key in keys if key != 3}
+
+        async def lookups():
+            loader = BatchLoader(load_many, max_batch=2)
+            return list(await asyncio.gather(*(loader.load(key) for key in [1, 2, 1, 3]))), loader
+
+        values, loader = run(lookups())
+
+        self.assertEqual(values, [10, 20, 10, None])
+        self.assertEqual(batches, [[1, 2], [3]])
+        self.assertEqual(loader.stats()["keys"], 3)
+
+    def test_errors(self):
+        """Tests that a failed batch raises for every lookup of it"""
+        async def load_many(keys):
+            raise RuntimeError("database is gone")
+
+        async def lookups():
+            loader = BatchLoader(load_many)
+            return await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+
+        results = run(lookups())
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+
+class ModelLoaderTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+        self.store.set_repositories(Repositories(self.store))
+
+        for name in ("a", "b", "c"):
+            self.store._execute(f"INSERT INTO Users (user_id) VALUES ('@{name}:example.com')")
+        self.store._execute("INSERT INTO Tickets (id, user_id) VALUES (7, '@a:example.com')")
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_concurrent_users(self):
+        """Tests that concurrent user lookups share one query and one model per user"""
+        user_ids = ["@a:example.com", "@b:example.com", "@c:example.com", "@missing:example.com", "@a:example.com"]
+
+        async def lookups():
+            return await asyncio.gather(*(User.get_existing(self.store, user_id) for user_id in user_ids))
+
+        users = run(lookups())
+
+        self.assertEqual([user.user_id if user else None for user in users[:4]], user_ids[:3] + [None])
+        self.assertIs(users[0], users[4])
+        self.assertEqual(self.store.statements.get("User.get_all_fields_many_4").calls, 1)
+        self.assertEqual(self.store.statements.get("User.get_all_fields").calls, 0)
+        # Loaded models are cached, missing ones remembered
+        self.assertEqual(self.store.model_cache.lookup("User", "@missing:example.com"), (True, None))
+
+    def test_single_ticket(self):
+        """Tests that a ticket is loaded with one query, without a separate existence check"""
+        async def lookups():
+            return await Ticket.get_existing(self.store, 7), await Ticket.get_existing(self.store, 8)
+
+        ticket, missing = run(lookups())
+
+        self.assertEqual(ticket.user_id, "@a:example.com")
+        self.assertIsNone(missing)
+        self.assertEqual(self.store.statements.get("Ticket.get_all_fields").calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, Mock
+
+import nio
+
+from support_bot.copy_jobs import CopyJobs
+from support_bot.models.IncomingEvent import IncomingEvent
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.storage import FETCH_ALL, Storage
+from tests.utils import run
+
+
+class CopyJobsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+        self.store.set_repositories(Repositories(self.store))
+
+        # Received in the order $event0 ... $event4, stored in a different order
+        now = datetime.now()
+        self.store._execute("INSERT INTO Users (user_id) VALUES ('@user:example.com')")
+        for i in (3, 0, 4, 1, 2):
+            self.store._execute(
+                "INSERT INTO IncomingEvents (user_id, room_id, event_id, created_at) "
+                "VALUES ('@user:example.com', '!user:example.com', ?, ?)",
+                (f"$event{i}", now + timedelta(seconds=i)),
+            )
+
+        self.processed = []
+        self.fail_on = None
+
+        async def room_get_event(room_id, event_id):
+            # Later events are fetched faster, they are still sent in order
+            await asyncio.sleep(0.01 * (5 - int(event_id[-1])))
+            if event_id == "$event1":
+                return nio.RoomGetEventError("Not found", "M_NOT_FOUND")
+            return nio.RoomGetEventResponse.from_dict({
+                "type": "m.room.message",
+                "event_id": event_id,
+                "sender": "@user:example.com",
+                "origin_server_ts": 0,
+                "room_id": room_id,
+                "content": {"msgtype": "m.text", "body": event_id},
+            })
+
+        async def message(room, event):
+            if event.event_id == self.fail_on:
+                raise RuntimeError("Interrupted")
+            self.processed.append(event.event_id)
+
+        self.client = Mock(spec=nio.AsyncClient)
+        self.client.rooms = {"!user:example.com": Mock(), "!ticket:example.com": Mock()}
+        self.client.room_get_event = AsyncMock(side_effect=room_get_event)
+        self.client.room_send = AsyncMock(return_value=nio.RoomSendResponse("$report", "!ticket:example.com"))
+        self.client.callbacks = Mock()
+        self.client.callbacks._message = AsyncMock(side_effect=message)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def rows(self, sql: str):
+        return self.store._run(sql, (), FETCH_ALL)
+
+    def test_copy(self):
+        """Tests that events are copied in the order they were received, and consumed"""
+        async def copy():
+            jobs = CopyJobs(self.client, self.store, page_size=2, fetch_concurrency=2)
+            await jobs.start(1, "@user:example.com", "!ticket:example.com", "!management:example.com")
+            await jobs.join()
+            return jobs
+
+        jobs = run(copy())
+
+        self.assertEqual(self.processed, ["$event0", "$event2", "$event3", "$event4"])
+        self.assertEqual(self.rows("SELECT * FROM IncomingEvents"), [])
+        self.assertEqual(self.rows("SELECT * FROM CopyJobs"), [])
+        self.assertEqual(jobs.stats()["completed"], 1)
+        # The failure is reported to the room the ticket was raised from as well
+        self.assertEqual(
+            [call.args[0] for call in self.client.room_send.await_args_list],
+            ["!management:example.com", "!ticket:example.com"],
+        )
+        self.assertIn("Copied 4 messages", self.client.room_send.await_args.args[2]["body"])
+
+    def test_snapshots(self):
+        """Tests that events stored with a snapshot are copied without fetching them"""
+        async def copy():
+            events = {}
+            for i in (0, 2, 3):
+                response = await self.client.room_get_event("!user:example.com", f"$event{i}")
+                events[f"$event{i}"] = IncomingEvent.snapshot(response.event)
+            for event_id, payload in events.items():
+                self.store._execute("UPDATE IncomingEvents SET payload = ? WHERE event_id = ?", (payload, event_id))
+            self.client.room_get_event.reset_mock()
+
+            jobs = CopyJobs(self.client, self.store)
+            await jobs.start(1, "@user:example.com", "!ticket:example.com", "!management:example.com")
+            await jobs.join()
+            return jobs
+
+        jobs = run(copy())
+
+        self.assertEqual(self.processed, ["$event0", "$event2", "$event3", "$event4"])
+        self.assertEqual(
+            sorted(call.args[1] for call in self.client.room_get_event.await_args_list), ["$event1", "$event4"],
+        )
+        self.assertEqual(jobs.stats()["restored"], 3)
+
+    def test_one_job_per_user(self):
+        """Tests that a job started while another runs for the user is stored and runs after it"""
+        async def copy():
+            jobs = CopyJobs(self.client, self.store, page_size=2)
+            first = await jobs.start(1, "@user:example.com", "!ticket:example.com", "!management:example.com")
+            second = await jobs.start(2, "@user:example.com", "!ticket:example.com", "!management:example.com")
+            waiting = [row[0] for row in self.rows("SELECT id FROM CopyJobs ORDER BY id")]
+            stats = jobs.stats()
+            await jobs.join()
+            return [first.id, second.id], waiting, stats, jobs
+
+        job_ids, waiting, stats, jobs = run(copy())
+
+        self.assertEqual(waiting, job_ids)
+        self.assertEqual((stats["running"], stats["waiting"]), (1, 1))
+        self.assertIn("will be copied once the copy job running for the user is done",
+                      self.client.room_send.await_args_list[0].args[2]["body"])
+        self.assertEqual(self.rows("SELECT * FROM CopyJobs"), [])
+        self.assertEqual(jobs.stats()["completed"], 2)
+
+    def test_resume(self):
+        """Tests that an interrupted job resumes with the first event not copied yet"""
+        self.fail_on = "$event3"
+
+        async def interrupted():
+            jobs = CopyJobs(self.client, self.store, page_size=2)
+            await jobs.start(1, "@user:example.com", "!ticket:example.com", "!management:example.com")
+            await jobs.join()
+
+        run(interrupted())
+
+        self.assertEqual(self.processed, ["$event0", "$event2"])
+        self.assertEqual(self.rows("SELECT copied, failed FROM CopyJobs"), [(1, 1)])
+        self.assertEqual(len(self.rows("SELECT * FROM IncomingEvents")), 2)
+
+        # Restarted
+        self.fail_on = None
+
+        async def resumed():
+            jobs = CopyJobs(self.client, self.store, page_size=2)
+            await jobs.sync(Mock())
+            await jobs.join()
+            return jobs
+
+        jobs = run(resumed())
+
+        self.assertEqual(self.processed, ["$event0", "$event2", "$event3", "$event4"])
+        self.assertEqual(self.rows("SELECT * FROM IncomingEvents"), [])
+        self.assertEqual(self.rows("SELECT * FROM CopyJobs"), [])
+        self.assertEqual(jobs.stats()["resumed"], 1)
+        self.assertIn("Copied 3 messages", self.client.room_send.await_args.args[2]["body"])
+
+
+if __name__ == "__main__":
+    unittest.main()
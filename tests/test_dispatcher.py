@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+
+from support_bot.dispatcher import EventDispatcher
+from tests.utils import run
+
+
+class EventDispatcherTestCase(unittest.TestCase):
+    def test_room_order_preserved(self):
+        """Tests that events of a room are processed in the order they were enqueued"""
+        processed = []
+
+        async def callback(room_id, n):
+            # Later events finish faster, so ordering only holds if they are not run in parallel
+            await asyncio.sleep(0.01 * (5 - n))
+            processed.append((room_id, n))
+
+        async def scenario():
+            dispatcher = EventDispatcher(concurrency=4)
+            for n in range(5):
+                await dispatcher.enqueue("!room:example.com", callback, "!room:example.com", n)
+            await dispatcher.join()
+            return dispatcher
+
+        dispatcher = run(scenario())
+
+        self.assertEqual(processed, [("!room:example.com", n) for n in range(5)])
+        self.assertEqual(dispatcher.stats()["processed"], 5)
+
+    def test_rooms_run_in_parallel(self):
+        """Tests that a slow room does not hold back other rooms"""
+        processed = []
+        release_slow_room = None
+
+        async def slow_callback():
+            await release_slow_room.wait()
+            processed.append("slow")
+
+        async def fast_callback():
+            processed.append("fast")
+            release_slow_room.set()
+
+        async def scenario():
+            nonlocal release_slow_room
+            release_slow_room = asyncio.Event()
+            dispatcher = EventDispatcher(concurrency=2)
+            await dispatcher.enqueue("!slow:example.com", slow_callback)
+            await dispatcher.enqueue("!fast:example.com", fast_callback)
+            await asyncio.wait_for(dispatcher.join(), 1)
+
+        run(scenario())
+
+        self.assertEqual(processed, ["fast", "slow"])
+
+    def test_backpressure(self):
+        """Tests that enqueueing waits while the room queue is full"""
+        async def callback():
+            await asyncio.sleep(0.01)
+
+        async def scenario():
+            dispatcher = EventDispatcher(concurrency=1, max_room_queue=1)
+            for _ in range(3):
+                await dispatcher.enqueue("!room:example.com", callback)
+            await dispatcher.join()
+            return dispatcher
+
+        dispatcher = run(scenario())
+
+        self.assertGreater(dispatcher.backpressure_waits, 0)
+        self.assertEqual(dispatcher.processed, 3)
+
+    def test_queue_depths(self):
+        """Tests that the stats report the rooms with the most queued events"""
+        async def scenario():
+            release = asyncio.Event()
+
+            async def callback():
+                await release.wait()
+
+            dispatcher = EventDispatcher(concurrency=4)
+            for room_id, count in (("!a:example.com", 2), ("!b:example.com", 4), ("!c:example.com", 1)):
+                for _ in range(count):
+                    await dispatcher.enqueue(room_id, callback)
+            # Let the workers take their first event
+            await asyncio.sleep(0)
+            stats = dispatcher.stats()
+            release.set()
+            await dispatcher.join()
+            return stats
+
+        stats = run(scenario())
+
+        self.assertEqual(stats["deepest_rooms"], {"!b:example.com": 3, "!a:example.com": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
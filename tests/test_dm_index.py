@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import Mock
+
+import nio
+
+from support_bot.chat_functions import find_private_msg
+from support_bot.dm_index import DirectRoomIndex
+
+BOT = "@bot:example.com"
+
+
+def make_room(room_id: str, *user_ids: str, invited: tuple = ()) -> nio.MatrixRoom:
+    room = nio.MatrixRoom(room_id, BOT)
+    for user_id in (BOT,) + user_ids:
+        room.add_member(user_id, None, None)
+    for user_id in invited:
+        room.add_member(user_id, None, None, invited=True)
+    return room
+
+
+class DirectRoomIndexTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = Mock(spec=nio.AsyncClient)
+        self.client.user_id = BOT
+        self.client.rooms = {
+            "!group:example.com": make_room("!group:example.com", "@a:example.com", "@b:example.com"),
+            "!dm_a:example.com": make_room("!dm_a:example.com", "@a:example.com"),
+            "!dm_b:example.com": make_room("!dm_b:example.com", invited=("@b:example.com",)),
+        }
+        self.client.dm_index = DirectRoomIndex(self.client)
+        self.client.dm_index.rebuild()
+
+    def test_find(self):
+        """Tests that only two member rooms are found, including rooms the user is invited to"""
+        self.assertEqual(find_private_msg(self.client, "@a:example.com").room_id, "!dm_a:example.com")
+        self.assertEqual(find_private_msg(self.client, "@b:example.com").room_id, "!dm_b:example.com")
+        self.assertIsNone(find_private_msg(self.client, "@c:example.com"))
+        # The bot is a member of every room, but has no DM with itself
+        self.assertIsNone(find_private_msg(self.client, BOT))
+
+    def test_membership_changes(self):
+        """Tests that rooms are indexed again as their members change"""
+        index = self.client.dm_index
+
+        # @c joins the DM of @a, making it a group room
+        room = self.client.rooms["!dm_a:example.com"]
+        room.add_member("@c:example.com", None, None)
+        index.update_room(room)
+        self.assertIsNone(index.find("@a:example.com"))
+
+        # @b leaves the group room, which becomes a DM of @a
+        room = self.client.rooms["!group:example.com"]
+        room.remove_member("@b:example.com")
+        index.update_room(room)
+        self.assertEqual(index.find("@a:example.com").room_id, "!group:example.com")
+
+        # Rooms gone from the client are dropped
+        del self.client.rooms["!dm_b:example.com"]
+        self.assertIsNone(index.find("@b:example.com"))
+        self.assertEqual(len(index), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+import nio
+
+from support_bot.chat_functions import get_rx_id_from_reply, send_text_to_room
+from support_bot.event_cache import EventCache
+from tests.utils import run
+
+
+def message(event_id: str, body: str = "Hello") -> dict:
+    return {
+        "type": "m.room.message",
+        "event_id": event_id,
+        "sender": "@user:example.com",
+        "origin_server_ts": 0,
+        "content": {"msgtype": "m.text", "body": body},
+    }
+
+
+def sync_response(room_id: str, *events: dict) -> nio.SyncResponse:
+    return nio.SyncResponse.from_dict({
+        "next_batch": "s1",
+        "rooms": {"join": {room_id: {"timeline": {"events": list(events)}}}},
+    })
+
+
+class EventCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        async def room_get_event(room_id, event_id):
+            return nio.RoomGetEventResponse.from_dict({**message(event_id, "Fetched"), "room_id": room_id})
+
+        self.client = Mock(spec=nio.AsyncClient)
+        self.client.user_id = "@bot:example.com"
+        self.client.room_get_event = AsyncMock(side_effect=room_get_event)
+
+    def test_synced(self):
+        """Tests that synced events are returned without fetching them, and redacted ones dropped"""
+        cache = EventCache(self.client)
+        run(cache.sync(sync_response("!room:example.com", message("$a", "@staff:example.com"), message("$b"))))
+
+        response = run(cache.get_event("!room:example.com", "$a"))
+
+        self.assertIsInstance(response, nio.RoomGetEventResponse)
+        self.assertEqual(response.event.body, "@staff:example.com")
+        self.client.room_get_event.assert_not_awaited()
+        # Not an event of that room
+        run(cache.get_event("!other:example.com", "$b"))
+        self.assertEqual(self.client.room_get_event.await_count, 1)
+
+        run(cache.sync(sync_response("!room:example.com", {
+            "type": "m.room.redaction",
+            "event_id": "$redaction",
+            "sender": "@user:example.com",
+            "origin_server_ts": 0,
+            "redacts": "$b",
+            "content": {},
+        })))
+        response = run(cache.get_event("!room:example.com", "$b"))
+
+        self.assertEqual(response.event.body, "Fetched")
+        self.assertEqual(cache.stats()["hit_ratio"], 1 / 3)
+
+    def test_bounds(self):
+        """Tests that the least recently used events are dropped by count and by size"""
+        cache = EventCache(self.client, max_events=2)
+        for event_id in ("$a", "$b"):
+            cache.add("!room:example.com", nio.Event.parse_event(message(event_id)))
+        cache.get("!room:example.com", "$a")
+        cache.add("!room:example.com", nio.Event.parse_event(message("$c")))
+
+        self.assertIsNotNone(cache.get("!room:example.com", "$a"))
+        self.assertIsNone(cache.get("!room:example.com", "$b"))
+
+        cache = EventCache(self.client, max_bytes=400)
+        for event_id in ("$a", "$b", "$c"):
+            cache.add("!room:example.com", nio.Event.parse_event(message(event_id)))
+
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.stats()["bytes"], 400)
+        self.assertIsNone(cache.get("!room:example.com", "$a"))
+
+    def test_sent(self):
+        """Tests that a reply to a message the bot sent finds the message without fetching it"""
+        self.client.event_cache = EventCache(self.client)
+        self.client.room_send = AsyncMock(return_value=nio.RoomSendResponse("$sent", "!management:example.com"))
+
+        async def reply():
+            await send_text_to_room(self.client, "!management:example.com", "@user:example.com wrote: Hello", False)
+            return await get_rx_id_from_reply(self.client, "!management:example.com", "$sent")
+
+        self.assertEqual(run(reply()), "@user:example.com")
+        self.client.room_get_event.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from support_bot.event_dedup import EventDeduplicator
+
+
+class EventDeduplicatorTestCase(unittest.TestCase):
+    def test_check_and_add(self):
+        """Tests that an event is only processed once"""
+        dedup = EventDeduplicator(10)
+
+        self.assertTrue(dedup.check_and_add("$event1"))
+        self.assertFalse(dedup.check_and_add("$event1"))
+        self.assertTrue(dedup.check_and_add("$event2"))
+
+        self.assertEqual(dedup.hits, 1)
+        self.assertEqual(len(dedup), 2)
+
+    def test_evicts_oldest(self):
+        """Tests that the oldest event IDs are evicted once over capacity"""
+        dedup = EventDeduplicator(3)
+
+        for i in range(5):
+            dedup.check_and_add(f"$event{i}")
+
+        self.assertEqual(len(dedup), 3)
+        self.assertEqual(dedup.evictions, 2)
+        self.assertNotIn("$event0", dedup)
+        self.assertNotIn("$event1", dedup)
+        self.assertIn("$event4", dedup)
+
+    def test_persistence(self):
+        """Tests that saved event IDs are restored in order"""
+        with tempfile.TemporaryDirectory() as store_path:
+            path = os.path.join(store_path, "processed_events.json")
+
+            dedup = EventDeduplicator(3, path)
+            for i in range(4):
+                dedup.check_and_add(f"$event{i}")
+            dedup.save()
+
+            restored = EventDeduplicator(3, path)
+            restored.load()
+
+            self.assertFalse(restored.check_and_add("$event3"))
+            self.assertTrue(restored.check_and_add("$event0"))
+            # Oldest restored event is evicted first
+            self.assertNotIn("$event1", restored)
+
+
+if __name__ == "__main__":
+    unittest.main()
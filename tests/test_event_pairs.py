@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+from support_bot.event_responses import Message
+from support_bot.models.EventPairs import EventPair
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.storage import Storage
+from tests.utils import run
+
+
+class EventPairResolverTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+        self.store.set_repositories(Repositories(self.store))
+        run(EventPair(self.store, "!user:example.com", "$original", "!ticket:example.com", "$clone").store_event_pair())
+        self.statement = self.store.statements.get("EventPairs.get_counterpart")
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def related(self, room_id: str, event_id: str):
+        client = Mock()
+        client.room_get_event = AsyncMock()
+        message = SimpleNamespace(client=client, store=self.store, room=Mock(room_id=room_id))
+
+        related = run(Message.get_related(message, event_id))
+
+        client.room_get_event.assert_not_awaited()
+        return related
+
+    def test_both_directions(self):
+        """Tests that the original resolves to the clone and the clone to the original, with one query each"""
+        # Restarted, nothing cached
+        self.store.set_repositories(Repositories(self.store))
+
+        self.assertEqual(self.related("!user:example.com", "$original"), "$clone")
+        self.assertEqual(self.related("!ticket:example.com", "$clone"), "$original")
+        self.assertEqual(self.statement.calls, 1)
+        self.assertIsNone(self.related("!ticket:example.com", "$original"))
+        self.assertIsNone(self.related("!user:example.com", "$unknown"))
+
+    def test_cached(self):
+        """Tests that stored pairs are answered from the cache, until deleted"""
+        self.assertEqual(self.related("!ticket:example.com", "$clone"), "$original")
+        self.assertEqual(self.related("!user:example.com", "$original"), "$clone")
+        self.assertEqual(self.statement.calls, 0)
+
+        run(EventPair.delete_event(self.store, "!user:example.com", "$original"))
+
+        self.assertIsNone(self.related("!ticket:example.com", "$clone"))
+        self.assertEqual(self.statement.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+import nio
+
+from support_bot.models.IncomingEvent import IncomingEvent, MAX_SNAPSHOT_SIZE
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.storage import FETCH_ALL, Storage
+from tests.utils import run
+
+
+def text_event(event_id: str, body: str) -> nio.Event:
+    return nio.Event.parse_event({
+        "type": "m.room.message",
+        "event_id": event_id,
+        "sender": "@user:example.com",
+        "origin_server_ts": 1700000000000,
+        "unsigned": {"age": 1234},
+        "content": {"msgtype": "m.text", "body": body, "format": "org.matrix.custom.html", "formatted_body": body},
+    })
+
+
+class IncomingEventTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+        self.store.set_repositories(Repositories(self.store))
+        self.store._execute("INSERT INTO Users (user_id) VALUES ('@user:example.com')")
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_snapshot(self):
+        """Tests that a stored snapshot restores the event"""
+        event = text_event("$event", "Hello **world**")
+
+        async def store_and_restore():
+            await IncomingEvent(
+                self.store, "@user:example.com", "!user:example.com", "$event", payload=IncomingEvent.snapshot(event),
+            ).store_incoming_event()
+            return await IncomingEvent.get_oldest_incoming_events(self.store, "@user:example.com", 10)
+
+        incoming, = run(store_and_restore())
+        restored = incoming.restore()
+
+        self.assertIsInstance(restored, nio.RoomMessageText)
+        self.assertEqual(restored.event_id, "$event")
+        self.assertEqual(restored.body, "Hello **world**")
+        self.assertEqual(restored.formatted_body, event.formatted_body)
+        self.assertEqual(restored.server_timestamp, event.server_timestamp)
+        # Only the fields needed to relay the event are kept
+        self.assertNotIn("unsigned", restored.source)
+
+    def test_snapshot_size_cap(self):
+        """Tests that events too large to snapshot are stored without one"""
+        event = text_event("$event", os.urandom(MAX_SNAPSHOT_SIZE).hex())
+
+        self.assertIsNone(IncomingEvent.snapshot(event))
+        self.assertIsNone(IncomingEvent(self.store, "@user:example.com", "!user:example.com", "$event").restore())
+
+    def test_ring_buffer(self):
+        """Tests that only the newest events of a user are kept"""
+        repository = self.store.repositories.incomingEventsRep
+        repository.max_per_user = 5
+        repository.trim_every = 4
+
+        async def store():
+            for i in range(12):
+                await IncomingEvent(self.store, "@user:example.com", "!user:example.com", f"$event{i}").store_incoming_event()
+
+        run(store())
+
+        rows = self.store._run("SELECT event_id FROM IncomingEvents ORDER BY id", (), FETCH_ALL)
+        # Trimmed after the 4th, 8th and 12th event
+        self.assertEqual([row[0] for row in rows], [f"$event{i}" for i in range(7, 12)])
+
+    def test_ring_buffer_disabled(self):
+        """Tests that every event is kept when the per user cap is 0"""
+        repository = self.store.repositories.incomingEventsRep
+        repository.max_per_user = 0
+        repository.trim_every = 1
+
+        async def store():
+            for i in range(3):
+                await IncomingEvent(self.store, "@user:example.com", "!user:example.com", f"$event{i}").store_incoming_event()
+
+        run(store())
+
+        self.assertEqual(self.store._run("SELECT COUNT(*) FROM IncomingEvents", (), FETCH_ALL), [(3,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
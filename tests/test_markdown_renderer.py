@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+
+from commonmark import commonmark
+
+from support_bot.markdown_renderer import MarkdownRenderer, is_plain_text, render_plain_text
+
+
+class MarkdownRendererTestCase(unittest.TestCase):
+    def test_plain_text(self):
+        """Tests that the plain text fast path renders exactly like commonmark"""
+        plain = [
+            "Closed Ticket 5",
+            'Message delivered back to the sender in room !abc:example.com.',
+            'He said "hi" (twice), then left!',
+            "Ticket #12 is open",
+        ]
+        markdown = [
+            "1. first", "- item", "# heading", "> quote", "*bold*", "a_b", "`code`",
+            "[link](https://example.com)", "a & b", "<b>", "two\nlines", "  indented", "",
+        ]
+
+        for text in plain:
+            self.assertTrue(is_plain_text(text), text)
+            self.assertEqual(render_plain_text(text), commonmark(text))
+        for text in markdown:
+            self.assertFalse(is_plain_text(text), text)
+
+    def test_cache(self):
+        """Tests that markdown is rendered once per text, evicting the least recently used"""
+        renderer = MarkdownRenderer(cache_size=2)
+
+        self.assertEqual(renderer.render("**a**"), commonmark("**a**"))
+        renderer.render("**b**")
+        renderer.render("**a**")
+        renderer.render("**c**")
+        renderer.render("**a**")
+        renderer.render("plain text")
+
+        stats = renderer.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["plain"]), (2, 3, 1))
+        self.assertEqual(stats["size"], 2)
+
+    def test_large_text(self):
+        """Tests that long texts are rendered off the event loop and not cached"""
+        renderer = MarkdownRenderer(max_cached_length=100, max_inline_length=100)
+        text = "**long** " * 50
+
+        loop = asyncio.new_event_loop()
+        try:
+            html = loop.run_until_complete(renderer.render_async(text))
+        finally:
+            loop.close()
+
+        self.assertEqual(html, commonmark(text))
+        self.assertEqual(renderer.stats()["offloaded"], 1)
+        self.assertEqual(renderer.stats()["size"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+import nio
+
+from support_bot.membership import invite_all_to_room, kick_all_from_room
+from tests.utils import run
+
+
+class MembershipTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def request(response, room_id, user_id):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            if user_id == "@bad:example.com":
+                return nio.RoomKickError("Forbidden", "M_FORBIDDEN")
+            return response
+
+        async def room_kick(room_id, user_id):
+            return await request(nio.RoomKickResponse(), room_id, user_id)
+
+        async def room_invite(room_id, user_id):
+            return await request(nio.RoomInviteResponse(), room_id, user_id)
+
+        self.client = Mock(spec=nio.AsyncClient)
+        self.client.room_kick = AsyncMock(side_effect=room_kick)
+        self.client.room_invite = AsyncMock(side_effect=room_invite)
+        self.users = [f"@user{i}:example.com" for i in range(10)]
+
+    def test_kick_all(self):
+        """Tests that kicks run concurrently under the limit, with the response of each user"""
+        results = run(kick_all_from_room(self.client, self.users + ["@bad:example.com"], "!room", limit=3))
+
+        self.assertEqual(self.client.room_kick.await_count, 11)
+        self.assertEqual(self.max_in_flight, 3)
+        self.assertEqual(list(results), self.users + ["@bad:example.com"])
+        self.assertEqual(results.succeeded, self.users)
+        self.assertEqual(list(results.failed), ["@bad:example.com"])
+
+    def test_invite_all(self):
+        """Tests that the room keys are shared once, with the invited users"""
+        users = self.users[:3] + ["@bad:example.com", self.users[0]]
+        self.client.membership_concurrency = 2
+
+        with patch("support_bot.membership.send_shared_history_keys", AsyncMock(return_value=None)) as share_keys:
+            results = run(invite_all_to_room(self.client, users, "!room", share_keys=True))
+
+        # Each user is invited once
+        self.assertEqual(self.client.room_invite.await_count, 4)
+        self.assertEqual(self.max_in_flight, 2)
+        share_keys.assert_awaited_once_with(self.client, "!room", self.users[:3])
+        self.assertIsNone(results.keys_error)
+
+    def test_keys_error(self):
+        """Tests that a key sharing failure is reported separately from the invites"""
+        with patch("support_bot.membership.send_shared_history_keys", AsyncMock(side_effect=nio.LocalProtocolError("E2E"))):
+            results = run(invite_all_to_room(self.client, self.users[:2], "!room", share_keys=True))
+
+        self.assertEqual(results.succeeded, self.users[:2])
+        self.assertIsInstance(results.keys_error, nio.ErrorResponse)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,16 @@
 import logging
 import unittest
 import sys
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock
 
 import nio
 
 from support_bot.callbacks import Callbacks
 from support_bot.message_responses import TextMessage
+from support_bot.pending_deliveries import KIND_MESSAGE
 from support_bot.storage import Storage
 
-from tests.utils import make_awaitable, run_coroutine
+from tests.utils import run
 
 
 class MessageResponsesTestCase(unittest.TestCase):
@@ -41,9 +42,12 @@ class MessageResponsesTestCase(unittest.TestCase):
 
         self.fake_message_room = Mock(spec=nio.MatrixRoom)
         self.fake_message_room.room_id = "fake_message_room_id:example.com"
+        self.fake_message_room.name = None
+        self.fake_message_room.canonical_alias = None
         
         self.fake_event = Mock(spec=nio.RoomMessage)
         self.fake_event.room_id = self.fake_message_room.room_id
+        self.fake_event.sender = "@fake_sender:example.com"
         
         self.fake_message_content = "Some fake message content source"
         
@@ -57,51 +61,23 @@ class MessageResponsesTestCase(unittest.TestCase):
             self.fake_message_content
         )
         
-    @patch('support_bot.chat_functions.send_text_to_room')
-    def test_send_message_to_room(self, send_text_to_room):
-        """Tests the send_message_to_room method"""
-        # Tests that the bot successfully sends a text message to the specified room
-
-        send_text_to_room.return_value = Mock(spec=nio.RoomSendResponse)
-        
-        # Create a fake room and invite event to call the 'invite' callback with
-        fake_room = Mock(spec=nio.MatrixRoom)
+    def test_forward_message_to_unknown_room(self):
+        """Tests that a message for a room whose state hasn't arrived yet is queued until it does"""
         fake_room_id = "!abcdefg:example.com"
-        fake_room.room_id = fake_room_id
-
-        fake_text = "Some fake message content that has been filtered by parent methods."
 
-        #fake_invite_event = Mock(spec=nio.InviteMemberEvent)
-        #fake_invite_event.sender = "@some_other_fake_user:example.com"
-        #fake_invite_event.source = {
-        #    "event_id": "$4vk68QCqjeVOcz7X20OwUJe6IidTcl5O3f8EydVTWSU"
-        #}
+        self.text_message.handler = Mock()
+        self.text_message.handler.ticket = None
+        self.text_message.handler.user.current_chat_room_id = None
+        self.text_message.handler.message_logging_room = AsyncMock()
+        self.fake_client.callbacks.pending.add = AsyncMock()
 
-        # Pretend that sending a message to a room is always successful
-        fake_room_send_response_success = Mock(spec=nio.RoomSendResponse)
-        self.fake_client.room_send.return_value = make_awaitable(fake_room_send_response_success)
+        run(self.text_message.forward_message_to_room(fake_room_id))
 
-        # Pretend that we received are sending the message to a room
-        run_coroutine(self.text_message.send_message_to_room(fake_text, fake_room.room_id))
-        expected_task = (
-            self.fake_client.callbacks._message,
-            fake_room_id,
-            self.fake_event.room_id,
-            self.fake_event
+        # Queued to be processed again in the room it came from once the room is ready
+        self.fake_client.callbacks.pending.add.assert_awaited_once_with(
+            KIND_MESSAGE, fake_room_id, self.fake_message_room.room_id, self.fake_event,
         )
-        expected_callback_dict = {
-            fake_room.room_id : [expected_task]
-        }
-
-        self.assertDictEqual(self.fake_client.callbacks.rooms_pending, expected_callback_dict)
-        # Check that we attempted to send the message to the designated room
-        #send_text_to_room.assert_called_once_with(
-        #    self.fake_client,
-        #    fake_room.room_id,
-        #    fake_text,
-        #    )
-        
-    #def test_
+        self.fake_client.room_send.assert_not_called()
 
 
 if __name__ == "__main__":
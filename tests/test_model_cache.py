@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+import unittest
+
+from support_bot.model_cache import ModelCache
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.models.User import User
+from support_bot.storage import Storage
+from tests.utils import run
+
+
+class ModelCacheTestCase(unittest.TestCase):
+    def test_lru_eviction(self):
+        """Tests that the least recently used entry is evicted first"""
+        cache = ModelCache(max_size=2)
+        cache.put("User", "@a:example.com", "a")
+        cache.put("User", "@b:example.com", "b")
+        # Use a, so b is the least recently used
+        cache.lookup("User", "@a:example.com")
+        cache.put("User", "@c:example.com", "c")
+
+        self.assertEqual(cache.lookup("User", "@a:example.com"), (True, "a"))
+        self.assertEqual(cache.lookup("User", "@b:example.com"), (False, None))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl(self):
+        """Tests that entries expire, missing models sooner than existing ones"""
+        cache = ModelCache(ttl=0.05, negative_ttl=0)
+        cache.put("Ticket", 1, "ticket")
+        cache.put("Ticket", 2, None)
+
+        self.assertEqual(cache.lookup("Ticket", 1), (True, "ticket"))
+        self.assertEqual(cache.lookup("Ticket", 2), (False, None))
+        time.sleep(0.06)
+        self.assertEqual(cache.lookup("Ticket", 1), (False, None))
+        self.assertEqual(cache.expirations, 2)
+
+    def test_stats(self):
+        """Tests that hits, negative hits and misses are counted per kind"""
+        cache = ModelCache()
+        cache.put("Staff", "@staff:example.com", None)
+        cache.lookup("Staff", "@staff:example.com")
+        cache.lookup("User", "@user:example.com")
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits_by_kind"], {"Staff": 1})
+        self.assertEqual(stats["misses_by_kind"], {"User": 1})
+        self.assertEqual(stats["negative_hits"], 1)
+
+
+class ModelCacheStorageTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+        self.store.set_repositories(Repositories(self.store))
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_user_lookups(self):
+        """Tests that users are loaded once, and that creating a user replaces the negative entry"""
+        user_id = "@user:example.com"
+
+        async def scenario():
+            missing = await User.get_existing(self.store, user_id)
+            await User.create_new(self.store, user_id)
+            user = await User.get_existing(self.store, user_id)
+            await user.update_communications_room("!room:example.com")
+            return missing, user, await User.get_existing(self.store, user_id)
+
+        missing, user, cached_user = run(scenario())
+
+        self.assertIsNone(missing)
+        self.assertIs(cached_user, user)
+        self.assertEqual(cached_user.room_id, "!room:example.com")
+        # The lookup of the missing user and the load after creating it
+        self.assertEqual(self.store.statements.get("User.get_all_fields").calls, 2)
+        self.assertEqual(self.store.statements.get("User.get_user").calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
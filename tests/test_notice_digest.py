@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+import nio
+
+from support_bot.chat_functions import send_status_notice
+from support_bot.handlers.EventStateHandler import EventStateHandler, LogLevel
+from support_bot.notice_digest import NoticeDigest
+from tests.utils import run
+
+
+class NoticeDigestTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sent = []
+
+        async def room_send(room_id, message_type, content, **kwargs):
+            self.sent.append((room_id, content))
+            return nio.RoomSendResponse(f"$digest{len(self.sent)}", room_id)
+
+        self.client = Mock(spec=nio.AsyncClient)
+        self.client.room_send = AsyncMock(side_effect=room_send)
+        self.config = Mock(management_room_id="!management:example.com")
+        self.client.notice_digest = NoticeDigest(self.client, self.config, window=60, interval=0.01, max_lines=2)
+
+    def test_coalesced_and_edited(self):
+        """Tests that notices are sent as one message, and later notices edit it"""
+        async def notices():
+            for i in range(3):
+                await send_status_notice(self.client, "!management:example.com", f"Notice {i}")
+            await asyncio.sleep(0.05)
+            await send_status_notice(self.client, "!management:example.com", "Notice 3")
+            await asyncio.sleep(0.05)
+
+        run(notices())
+
+        self.assertEqual(len(self.sent), 2)
+        first = self.sent[0][1]
+        self.assertIn("(3)", first["body"])
+        self.assertIn("1 earlier", first["body"])
+        self.assertNotIn("Notice 0", first["body"])
+        self.assertIn("Notice 2", first["body"])
+
+        edit = self.sent[1][1]
+        self.assertEqual(edit["m.relates_to"], {"rel_type": "m.replace", "event_id": "$digest1"})
+        self.assertIn("(4)", edit["m.new_content"]["body"])
+        self.assertIn("Notice 3", edit["m.new_content"]["body"])
+        self.assertEqual(self.client.notice_digest.stats()["edited"], 1)
+
+    def test_window_rollover(self):
+        """Tests that a new digest message is started after the window"""
+        digest = self.client.notice_digest
+
+        async def notices():
+            await send_status_notice(self.client, "!management:example.com", "Notice 0")
+            await digest.flush()
+            digest.window = 0
+            await send_status_notice(self.client, "!management:example.com", "Notice 1")
+            await digest.flush()
+
+        run(notices())
+
+        self.assertEqual(len(self.sent), 2)
+        self.assertNotIn("m.relates_to", self.sent[1][1])
+        self.assertIn("Notice 1", self.sent[1][1]["body"])
+        self.assertNotIn("Notice 0", self.sent[1][1]["body"])
+
+    def test_other_rooms(self):
+        """Tests that notices to other rooms are sent directly"""
+        run(send_status_notice(self.client, "!ticket:example.com", "Notice"))
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0][0], "!ticket:example.com")
+        self.assertEqual(self.client.notice_digest.stats()["added"], 0)
+
+    def test_handler_notices(self):
+        """Tests that management notices are sent on their own unless marked for the digest"""
+        handler = EventStateHandler(self.client, Mock(), self.config, Mock(room_id="!user:example.com"), Mock())
+
+        async def notices():
+            await handler.message_management("@user:example.com is unauthorized to use ticket", LogLevel.INFO)
+            await handler.message_management("Notice", digest=True)
+            await self.client.notice_digest.flush()
+
+        run(notices())
+
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(self.sent[0][1]["body"], "@user:example.com is unauthorized to use ticket")
+        self.assertIn("Notice", self.sent[1][1]["body"])
+        self.assertEqual(self.client.notice_digest.stats()["added"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
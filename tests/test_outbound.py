@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+import nio
+
+from support_bot.outbound import Lane, OutboundScheduler, SHED
+from support_bot.utils import with_ratelimit
+from tests.utils import run
+
+
+class Client(object):
+    """Records the order of sends, answering with the queued responses first"""
+    def __init__(self, outbound: OutboundScheduler, responses=()):
+        self.outbound = outbound
+        self.responses = list(responses)
+        self.sent = []
+
+    async def room_send(self, room_id, message_type, content, **kwargs):
+        self.sent.append(content["body"])
+        if self.responses:
+            return self.responses.pop(0)
+        return nio.RoomSendResponse("$event", room_id)
+
+
+class OutboundSchedulerTestCase(unittest.TestCase):
+    async def sends(self, client, lanes):
+        scheduler = client.outbound
+        try:
+            return await asyncio.gather(*(
+                with_ratelimit(client.room_send, lane)("!room", "m.room.message", {"body": body})
+                for body, lane in lanes
+            ))
+        finally:
+            scheduler._worker.cancel()
+
+    def test_priority(self):
+        """Tests that waiting requests are sent relays first and logging last"""
+        client = Client(OutboundScheduler(rate=100, burst=1, concurrency=1))
+        lanes = [("log", Lane.LOGGING), ("notice", Lane.NOTICE), ("command", Lane.COMMAND), ("relay", Lane.RELAY)]
+
+        responses = run(self.sends(client, lanes))
+
+        self.assertTrue(all(isinstance(response, nio.RoomSendResponse) for response in responses))
+        self.assertEqual(client.sent, ["relay", "command", "notice", "log"])
+        self.assertEqual(client.outbound.stats()["sent"], {"RELAY": 1, "COMMAND": 1, "NOTICE": 1, "LOGGING": 1})
+
+    def test_shedding(self):
+        """Tests that a full queue drops the lowest priority requests"""
+        client = Client(OutboundScheduler(rate=100, burst=1, concurrency=1, max_queued=2))
+        lanes = [("first", Lane.RELAY), ("log", Lane.LOGGING), ("notice", Lane.NOTICE), ("relay", Lane.RELAY),
+                 ("late log", Lane.LOGGING)]
+
+        responses = dict(zip([body for body, _ in lanes], run(self.sends(client, lanes))))
+
+        self.assertEqual(client.sent, ["first", "relay"])
+        for body in ("log", "notice", "late log"):
+            self.assertIsInstance(responses[body], nio.ErrorResponse)
+            self.assertEqual(responses[body].status_code, SHED)
+        self.assertEqual(client.outbound.stats()["shed"], {"LOGGING": 2, "NOTICE": 1})
+
+    def test_rate_limited(self):
+        """Tests that a rate limited request is retried after the pause at a lower rate"""
+        limited = nio.RoomSendError.from_dict({"errcode": "M_LIMIT_EXCEEDED", "error": "Too many", "retry_after_ms": 50}, "!room")
+        client = Client(OutboundScheduler(rate=100, burst=10, concurrency=1), [limited])
+        lanes = [("relay", Lane.RELAY), ("notice", Lane.NOTICE)]
+
+        responses = run(self.sends(client, lanes))
+
+        self.assertTrue(all(isinstance(response, nio.RoomSendResponse) for response in responses))
+        self.assertEqual(client.sent, ["relay", "relay", "notice"])
+        stats = client.outbound.stats()
+        self.assertEqual(stats["rate_limited"], 1)
+        self.assertLess(stats["rate"], 100)
+        self.assertGreaterEqual(stats["max_wait"], 0.05)
+
+    def test_without_scheduler(self):
+        """Tests that clients without a scheduler send directly"""
+        client = Client(None)
+
+        response = run(with_ratelimit(client.room_send, Lane.LOGGING)("!room", "m.room.message", {"body": "log"}))
+
+        self.assertIsInstance(response, nio.RoomSendResponse)
+        self.assertEqual(client.sent, ["log"])
+
+
+if __name__ == "__main__":
+    unittest.main()
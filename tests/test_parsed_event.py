@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import Mock, patch
+
+import nio
+
+from support_bot.parsed_event import ParsedEvent, reply_regex
+
+
+def make_event(body: str, content: dict = None) -> nio.RoomMessageText:
+    event = Mock(spec=nio.RoomMessageText)
+    event.body = body
+    event.source = {"content": dict({"body": body}, **(content or {}))}
+    return event
+
+
+class ParsedEventTestCase(unittest.TestCase):
+    def test_commands(self):
+        """Tests that the command prefix and the edit prefix are stripped"""
+        self.assertEqual(ParsedEvent(make_event("!c claim 1"), "!c ").command, "claim 1")
+        self.assertEqual(ParsedEvent(make_event(" * !c claim 1"), "!c ").command, "claim 1")
+        self.assertEqual(ParsedEvent(make_event("!message !room:example.com hi"), "!c ").command, "message !room:example.com hi")
+        self.assertIsNone(ParsedEvent(make_event("hello"), "!c ").command)
+
+    def test_reply_sections(self):
+        """Tests that the reply and raise sections of an edit come from the new content"""
+        event = make_event(" * !reply thanks", {
+            "m.relates_to": {"rel_type": "m.replace", "event_id": "$original"},
+            "m.new_content": {
+                "body": "!reply thanks",
+                "formatted_body": "<mx-reply><blockquote>quote</blockquote></mx-reply>!reply thanks",
+            },
+        })
+        parsed = ParsedEvent(event)
+
+        self.assertEqual(parsed.replaces, "$original")
+        self.assertIsNone(parsed.in_reply_to)
+        self.assertEqual(parsed.reply_msg, "!reply thanks")
+        self.assertIsNone(parsed.raise_msg)
+
+    def test_parsed_once(self):
+        """Tests that the reply section is parsed once however often it is used"""
+        event = make_event("> quote\n\n!raise now", {
+            "m.relates_to": {"m.in_reply_to": {"event_id": "$question"}},
+            "formatted_body": "<mx-reply><blockquote>quote</blockquote></mx-reply>!raise now",
+        })
+        parsed = ParsedEvent(event)
+
+        with patch("support_bot.parsed_event.reply_regex", wraps=reply_regex) as regex:
+            self.assertIsNone(parsed.reply_msg)
+            self.assertEqual(parsed.raise_msg, "!raise now")
+            self.assertEqual(parsed.reply_section, "!raise now")
+
+        regex.findall.assert_called_once()
+        self.assertEqual(parsed.in_reply_to, "$question")
+
+    def test_mentions(self):
+        """Tests that mentions are only searched for when the user ID is in the text"""
+        with patch("support_bot.parsed_event.user_id_pattern") as pattern:
+            self.assertFalse(ParsedEvent(make_event("hello there")).mentions_user("@bot:example.com"))
+        pattern.finditer.assert_not_called()
+
+        self.assertTrue(ParsedEvent(make_event("hi @bot:example.com")).mentions_user("@bot:example.com"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+import nio
+
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.pending_deliveries import KIND_MESSAGE, KIND_TEXT, PendingDeliveries, TimerWheel
+from support_bot.storage import FETCH_ALL, Storage
+from tests.utils import run
+
+
+def sync_response(room_id: str, *state: dict) -> nio.SyncResponse:
+    return nio.SyncResponse.from_dict({
+        "next_batch": "s1",
+        "rooms": {"join": {room_id: {"state": {"events": list(state)}, "timeline": {"events": []}}}},
+    })
+
+
+ENCRYPTION = {
+    "type": "m.room.encryption",
+    "event_id": "$encryption",
+    "sender": "@bot:example.com",
+    "origin_server_ts": 0,
+    "state_key": "",
+    "content": {"algorithm": "m.megolm.v1.aes-sha2"},
+}
+
+
+class TimerWheelTestCase(unittest.TestCase):
+    def test_expiry(self):
+        """Tests that keys expire after their delay, including delays longer than the wheel, unless cancelled"""
+        async def expire():
+            wheel = TimerWheel(0.01, 4)
+            wheel.schedule("short", 0.02)
+            wheel.schedule("long", 0.1)
+            wheel.schedule("cancelled", 0.02)
+            wheel.cancel("cancelled")
+
+            expired = []
+            while len(wheel):
+                await asyncio.sleep(0.01)
+                expired += wheel.advance()
+            return expired
+
+        self.assertEqual(run(expire()), ["short", "long"])
+
+
+class PendingDeliveriesTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+        self.store.set_repositories(Repositories(self.store))
+
+        self.client = Mock(spec=nio.AsyncClient)
+        self.client.rooms = {"!user:example.com": Mock()}
+        self.client.encrypted_rooms = set()
+        self.client.room_send = AsyncMock(return_value=nio.RoomSendResponse("$sent", "!logging:example.com"))
+        self.client.callbacks = Mock()
+        self.client.callbacks._message = AsyncMock()
+        self.config = Mock(matrix_logging_room="!logging:example.com")
+
+        self.event = nio.Event.parse_event({
+            "type": "m.room.message",
+            "event_id": "$message",
+            "sender": "@user:example.com",
+            "origin_server_ts": 0,
+            "content": {"msgtype": "m.text", "body": "Hello"},
+        })
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def rows(self):
+        return self.store._run("SELECT kind, room_id FROM PendingDeliveries", (), FETCH_ALL)
+
+    def room_ready(self):
+        self.client.rooms["!ticket:example.com"] = Mock()
+        self.client.encrypted_rooms.add("!ticket:example.com")
+
+    def test_woken_by_state(self):
+        """Tests that deliveries are sent when the state of their room changes, and only then"""
+        async def deliver():
+            pending = PendingDeliveries(self.client, self.store, self.config)
+            await pending.sync(sync_response("!other:example.com"))
+            await pending.add(KIND_MESSAGE, "!ticket:example.com", "!user:example.com", self.event)
+            await pending.add(KIND_TEXT, "!ticket:example.com", "!ticket:example.com", text="Welcome")
+            self.assertEqual(self.rows(), [(KIND_MESSAGE, "!ticket:example.com"), (KIND_TEXT, "!ticket:example.com")])
+
+            self.room_ready()
+            # No state of the room in the sync
+            await pending.sync(sync_response("!other:example.com", ENCRYPTION))
+            self.client.callbacks._message.assert_not_awaited()
+
+            await pending.sync(sync_response("!ticket:example.com", ENCRYPTION))
+            pending.close()
+            return pending
+
+        pending = run(deliver())
+
+        self.client.callbacks._message.assert_awaited_once_with(self.client.rooms["!user:example.com"], self.event)
+        self.assertEqual(self.client.room_send.await_args.args[0], "!ticket:example.com")
+        self.assertEqual(self.rows(), [])
+        self.assertEqual(pending.stats()["delivered"], 2)
+        self.assertNotIn("!ticket:example.com", pending)
+
+    def test_expired(self):
+        """Tests that deliveries waiting longer than the timeout are dropped and reported"""
+        async def expire():
+            pending = PendingDeliveries(self.client, self.store, self.config, timeout=0.03, tick=0.01)
+            await pending.add(KIND_MESSAGE, "!ticket:example.com", "!user:example.com", self.event)
+            await asyncio.sleep(0.1)
+            return pending
+
+        pending = run(expire())
+
+        self.assertEqual(pending.stats()["expired"], 1)
+        self.assertEqual(len(pending), 0)
+        self.assertEqual(self.rows(), [])
+        self.assertEqual(self.client.room_send.await_args.args[0], "!logging:example.com")
+        self.assertIn("DROPPING message from @user:example.com - Hello", self.client.room_send.await_args.args[2]["body"])
+
+    def test_restored(self):
+        """Tests that deliveries stored before a restart are restored and sent after the first sync"""
+        async def queue():
+            pending = PendingDeliveries(self.client, self.store, self.config)
+            await pending.add(KIND_MESSAGE, "!ticket:example.com", "!user:example.com", self.event)
+            pending.close()
+
+        run(queue())
+
+        # Restarted, the room arrived with the first sync
+        self.room_ready()
+
+        async def restore():
+            pending = PendingDeliveries(self.client, self.store, self.config)
+            await pending.sync(sync_response("!user:example.com"))
+            pending.close()
+            return pending
+
+        pending = run(restore())
+
+        self.assertEqual(pending.stats()["restored"], 1)
+        self.assertEqual(self.client.callbacks._message.await_args.args[1].body, "Hello")
+        self.assertEqual(self.rows(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
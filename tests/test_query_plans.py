@@ -0,0 +1,114 @@
+import abc
+import os
+import tempfile
+import unittest
+from typing import List
+
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.retention import Retention
+from support_bot.statements import Statement
+from support_bot.storage import FETCH_ALL, Storage
+
+# Statements meant to read a whole table
+FULL_SCAN_ALLOWED = {
+    "Staff.get_all_staff",
+    "TicketLabels.get_all_labels",
+    # Loaded once at startup
+    "Ticket.get_ticket_rooms",
+    "Chat.get_chat_rooms",
+    "Support.get_all_support",
+    "CopyJobs.get_jobs",
+    "PendingDeliveries.get_deliveries",
+    # Periodic background job
+    "Retention.users_over_incoming_events_cap",
+}
+
+# Connection string of an empty postgres database to check the plans on, e.g.
+# "dbname=support_bot_test user=postgres". The postgres checks are skipped without one.
+POSTGRES_ENV = "SUPPORT_BOT_TEST_POSTGRES"
+
+
+class QueryPlanGuard(abc.ABC):
+    """Checks that no registered statement needs a full table scan.
+
+    Every repository statement is planned against the schema built by the migrations,
+    so a new query filtering on an unindexed column fails the test suite instead of
+    slowing down silently as the tables grow.
+    """
+
+    def assert_no_full_scans(self, store: Storage):
+        Repositories(store)
+        Retention(store)
+        self.assertGreater(len(store.statements), 0)
+
+        full_scans = {}
+        for statement in store.statements:
+            if statement.name in FULL_SCAN_ALLOWED:
+                continue
+            scans = self.full_scans(store, statement)
+            if scans:
+                full_scans[statement.name] = scans
+
+        self.assertEqual(full_scans, {}, "Statements scanning whole tables, add an index in a migration")
+
+    @abc.abstractmethod
+    def full_scans(self, store: Storage, statement: Statement) -> List[str]:
+        """The steps of the plan of a statement that scan a whole table"""
+
+
+class SQLiteQueryPlanTestCase(QueryPlanGuard, unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # A fresh database, built by running every migration
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def full_scans(self, store: Storage, statement: Statement) -> List[str]:
+        plan = store._run(f"EXPLAIN QUERY PLAN {statement.text}", (None,) * statement.param_count, FETCH_ALL)
+        # Rows are (id, parent, notused, detail), e.g. "SCAN Tickets" or "SEARCH Tickets USING INDEX ..."
+        return [row[3] for row in plan if row[3].startswith("SCAN ")]
+
+    def test_no_full_scans(self):
+        """Tests that every registered statement is served by an index"""
+        self.assert_no_full_scans(self.store)
+
+
+@unittest.skipUnless(os.environ.get(POSTGRES_ENV), f"{POSTGRES_ENV} is not set")
+class PostgresQueryPlanTestCase(QueryPlanGuard, unittest.TestCase):
+    def setUp(self) -> None:
+        self.store = Storage({
+            "type": "postgres",
+            "connection_string": os.environ[POSTGRES_ENV],
+            "write_buffer": False,
+        })
+
+    def tearDown(self) -> None:
+        self.store.close()
+
+    def full_scans(self, store: Storage, statement: Statement) -> List[str]:
+        with store.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Empty tables are always cheapest to scan, only fall back to one if no index can be used.
+                # The generic plan is the one made for the $n parameters, not for the NULLs passed to EXECUTE
+                cursor.execute("SET enable_seqscan = off")
+                cursor.execute("SET plan_cache_mode = force_generic_plan")
+                store._prepare(cursor, statement)
+                cursor.execute(
+                    f"EXPLAIN {statement.execute_text}".replace("%s", "NULL")
+                )
+                return [row[0].strip() for row in cursor.fetchall() if "Seq Scan" in row[0]]
+            finally:
+                cursor.execute("RESET ALL")
+                cursor.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
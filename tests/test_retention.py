@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from support_bot.retention import Retention
+from support_bot.storage import FETCH_ALL, Storage
+from tests.utils import run
+
+
+class RetentionTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def rows(self, sql: str):
+        return self.store._run(sql, (), FETCH_ALL)
+
+    def test_policies(self):
+        """Tests that expired rows, rows of deleted rooms and rows over the per user cap are deleted"""
+        now = datetime.now()
+        old = now - timedelta(days=40)
+
+        self.store._execute("INSERT INTO Users (user_id) VALUES ('@user:example.com')")
+        self.store._execute(
+            "INSERT INTO Tickets (user_id, user_room_id, status) VALUES "
+            "('@user:example.com', '!deleted:example.com', 'deleted'), "
+            "('@user:example.com', '!open:example.com', 'open')"
+        )
+        for event_id, created_at in (("$old", old), ("$new", now)):
+            self.store._execute(
+                "INSERT INTO encrypted_events (event_id, created_at) VALUES (?, ?)", (event_id, created_at),
+            )
+        for room_id in ("!deleted:example.com", "!open:example.com"):
+            self.store._execute(
+                "INSERT INTO messages (event_id, management_event_id, room_id, created_at) VALUES (?, ?, ?, ?)",
+                (f"$event{room_id}", f"$management{room_id}", room_id, now),
+            )
+            self.store._execute(
+                "INSERT INTO EventPairs (room_id, event_id, clone_room_id, clone_event_id, created_at) "
+                "VALUES ('!staff:example.com', '$staff', ?, ?, ?)",
+                (room_id, f"$clone{room_id}", now),
+            )
+        for i in range(5):
+            self.store._execute(
+                "INSERT INTO IncomingEvents (user_id, room_id, event_id, created_at) "
+                "VALUES ('@user:example.com', '!user:example.com', ?, ?)",
+                (f"$incoming{i}", now),
+            )
+
+        retention = Retention(self.store, batch_size=2, batch_pause=0, policies={
+            "incoming_events": {"max_per_user": 3},
+        })
+        reclaimed = run(retention.run_once())
+
+        self.assertEqual(reclaimed, {"encrypted_events": 1, "messages": 1, "event_pairs": 1, "incoming_events": 2})
+        self.assertEqual(self.rows("SELECT event_id FROM encrypted_events"), [("$new",)])
+        self.assertEqual(self.rows("SELECT room_id FROM messages"), [("!open:example.com",)])
+        self.assertEqual(self.rows("SELECT clone_room_id FROM EventPairs"), [("!open:example.com",)])
+        # The newest ones are kept
+        self.assertEqual(
+            self.rows("SELECT event_id FROM IncomingEvents ORDER BY id"),
+            [("$incoming2",), ("$incoming3",), ("$incoming4",)],
+        )
+
+    def test_unknown_table(self):
+        """Tests that policies for unknown tables are rejected"""
+        with self.assertRaises(ValueError):
+            Retention(self.store, policies={"Tickets": {"max_age_days": 1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from support_bot.models.Repositories.Repositories import Repositories
+from support_bot.room_index import CHAT_ROOM, TICKET_ROOM
+from support_bot.storage import Storage
+from tests.utils import run
+
+
+class RoomIndexTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = Storage({
+            "type": "sqlite",
+            "connection_string": os.path.join(self.tmp_dir.name, "bot.db"),
+            "write_buffer": False,
+        })
+        self.store.set_repositories(Repositories(self.store))
+
+        self.store._execute("INSERT INTO Users (user_id) VALUES ('@user:example.com')")
+        self.store._execute(
+            "INSERT INTO Tickets (id, user_id, user_room_id) VALUES (7, '@user:example.com', '!ticket:example.com')"
+        )
+        self.store._execute("INSERT INTO Chats (chat_room_id, user_id) VALUES ('!chat:example.com', '@user:example.com')")
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def lookup_queries(self) -> int:
+        return sum(self.store.statements.get(name).calls for name in ("Ticket.get_ticket_id", "Chat.get_chat"))
+
+    def test_loaded_rooms(self):
+        """Tests that rooms of existing tickets and chats are classified without querying"""
+        async def scenario():
+            await self.store.room_index.load()
+            return [
+                await self.store.room_index.lookup(room_id)
+                for room_id in ("!ticket:example.com", "!chat:example.com")
+            ]
+
+        entries = run(scenario())
+
+        self.assertEqual(entries, [(TICKET_ROOM, 7), (CHAT_ROOM, "!chat:example.com")])
+        self.assertEqual(self.lookup_queries(), 0)
+
+    def test_unknown_rooms(self):
+        """Tests that rooms not in the index are looked up once, and new ticket rooms are added"""
+        async def scenario():
+            await self.store.room_index.load()
+            first = await self.store.room_index.lookup("!user:example.com")
+            second = await self.store.room_index.lookup("!user:example.com")
+            await self.store.repositories.ticketRep.set_ticket_room_id(7, "!new:example.com")
+            return first, second, await self.store.room_index.lookup("!new:example.com")
+
+        first, second, new_room = run(scenario())
+
+        self.assertEqual(first, (None, None))
+        self.assertEqual(second, (None, None))
+        self.assertEqual(new_room, (TICKET_ROOM, 7))
+        # One miss, looked up as ticket and as chat room
+        self.assertEqual(self.lookup_queries(), 2)
+
+    def test_added_while_looked_up(self):
+        """Tests that a chat room added while it is looked up isn't remembered as neither"""
+        index = self.store.room_index
+        get_ticket_id = self.store.repositories.ticketRep.get_ticket_id
+
+        async def chat_created(room_id):
+            ticket_id = await get_ticket_id(room_id)
+            index.add_chat(room_id)
+            return ticket_id
+
+        async def scenario():
+            with patch.object(self.store.repositories.ticketRep, "get_ticket_id", chat_created), \
+                    patch.object(self.store.repositories.chatRep, "get_chat", return_value=None):
+                return await index.lookup("!new:example.com")
+
+        self.assertEqual(run(scenario()), (CHAT_ROOM, "!new:example.com"))
+        self.assertEqual(run(index.lookup("!new:example.com")), (CHAT_ROOM, "!new:example.com"))
+
+    def test_unclassified_expiry(self):
+        """Tests that rooms that are neither are looked up again once expired"""
+        index = self.store.room_index
+        index.unclassified_ttl = 0
+
+        run(index.lookup("!user:example.com"))
+        run(index.lookup("!user:example.com"))
+
+        self.assertEqual(self.lookup_queries(), 4)
+        self.assertEqual(index.stats()["misses"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from support_bot.statements import Statement
+from support_bot.storage import FETCH_ONE, ConnectionPool, Storage, latest_migration_version, sqlite_profile
+from tests.utils import run
+
+
+class StorageTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "bot.db")
+
+        # Start from an up to date database, so no migrations are run
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("CREATE TABLE migration_version (version INTEGER PRIMARY KEY)")
+        conn.execute("INSERT INTO migration_version (version) VALUES (?)", (latest_migration_version,))
+        conn.execute("CREATE TABLE Items (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.close()
+
+        self.store = Storage({"type": "sqlite", "connection_string": self.db_path, "pool_size": 3})
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_queries_do_not_block_loop(self):
+        """Tests that queries run outside of the event loop thread"""
+        loop_thread = threading.get_ident()
+        query_threads = set()
+
+        original_run = self.store._run
+
+        def recording_run(*args):
+            query_threads.add(threading.get_ident())
+            return original_run(*args)
+
+        self.store._run = recording_run
+
+        async def scenario():
+            await asyncio.gather(*[
+                self.store.execute("INSERT INTO Items (name) VALUES (?)", (f"item{i}",)) for i in range(10)
+            ])
+            return await self.store.fetchall("SELECT name FROM Items ORDER BY id")
+
+        rows = run(scenario())
+
+        self.assertEqual(len(rows), 10)
+        self.assertNotIn(loop_thread, query_threads)
+
+    def test_fetchone(self):
+        """Tests fetching a single row, or None if there is none"""
+        async def scenario():
+            await self.store.execute("INSERT INTO Items (name) VALUES (?)", ("item",))
+            found = await self.store.fetchone("SELECT name FROM Items WHERE name = ?", ("item",))
+            missing = await self.store.fetchone("SELECT name FROM Items WHERE name = ?", ("missing",))
+            return found, missing
+
+        found, missing = run(scenario())
+
+        self.assertEqual(found, ("item",))
+        self.assertIsNone(missing)
+
+
+    def test_registered_statements(self):
+        """Tests that registered statements are executed and timed"""
+        sql = self.store.statements.register("Items", {
+            "put_item": "INSERT INTO Items (name) VALUES (?)",
+            "get_item": "SELECT name FROM Items WHERE name = ?",
+        })
+
+        async def scenario():
+            await self.store.execute(sql["put_item"], ("item",))
+            return await self.store.fetchone(sql["get_item"], ("item",))
+
+        row = run(scenario())
+
+        self.assertEqual(row, ("item",))
+        stats = self.store.statements.stats()
+        self.assertEqual(stats["Items.get_item"]["calls"], 1)
+        self.assertEqual(stats["Items.put_item"]["calls"], 1)
+        # Registering again returns the same statements
+        self.assertIs(self.store.statements.register("Items", {"get_item": ""})["get_item"], sql["get_item"])
+
+    def test_buffered_writes(self):
+        """Tests that buffered writes are visible while pending and committed in one batch"""
+        sql = self.store.statements.register("Items", {
+            "put_item": "INSERT INTO Items (name) VALUES (?)",
+        })
+
+        async def scenario():
+            for i in range(5):
+                await self.store.write(sql["put_item"], (f"item{i}",))
+            pending = self.store.pending_writes(sql["put_item"])
+            await self.store.flush_writes()
+            return pending, await self.store.fetchall("SELECT name FROM Items ORDER BY id")
+
+        pending, rows = run(scenario())
+
+        self.assertEqual(pending, [(f"item{i}",) for i in range(5)])
+        self.assertEqual(rows, [(f"item{i}",) for i in range(5)])
+        self.assertEqual(self.store.writes.flushes, 1)
+        self.assertEqual(self.store.pending_writes(sql["put_item"]), [])
+
+    def test_failed_batch_written_one_by_one(self):
+        """Tests that a failing row does not lose the rest of its batch"""
+        sql = self.store.statements.register("Items", {
+            "put_item_with_id": "INSERT INTO Items (id, name) VALUES (?, ?)",
+        })
+
+        async def scenario():
+            await self.store.write(sql["put_item_with_id"], (1, "first"))
+            await self.store.write(sql["put_item_with_id"], (1, "duplicate"))
+            await self.store.write(sql["put_item_with_id"], (2, "second"))
+            await self.store.flush_writes()
+            return await self.store.fetchall("SELECT name FROM Items ORDER BY id")
+
+        rows = run(scenario())
+
+        self.assertEqual(rows, [("first",), ("second",)])
+        self.assertEqual(self.store.writes.failed_rows, 1)
+
+    def test_close_commits_buffered_writes(self):
+        """Tests that writes still buffered when the loop stops are committed on close"""
+        sql = self.store.statements.register("Items", {
+            "put_item": "INSERT INTO Items (name) VALUES (?)",
+        })
+
+        async def scenario():
+            await self.store.write(sql["put_item"], ("item",))
+
+        run(scenario())
+        self.store.close()
+
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("SELECT name FROM Items").fetchall()
+        conn.close()
+        self.assertEqual(rows, [("item",)])
+
+    def test_sqlite_profile(self):
+        """Tests that the performance profile is applied to every pooled connection"""
+        async def scenario():
+            return await asyncio.gather(*[
+                self.store.fetchone("PRAGMA synchronous") for _ in range(3)
+            ])
+
+        rows = run(scenario())
+
+        # 1 is NORMAL
+        self.assertEqual(rows, [(1,)] * 3)
+        self.assertEqual(self.store._run("PRAGMA journal_mode", fetch=FETCH_ONE), ("wal",))
+
+    def test_maintenance(self):
+        """Tests that maintenance checkpoints the WAL"""
+        run(self.store.execute("INSERT INTO Items (name) VALUES (?)", ("item",)))
+        self.assertTrue(os.path.getsize(self.db_path + "-wal"))
+
+        self.store._maintain()
+
+        self.assertEqual(os.path.getsize(self.db_path + "-wal"), 0)
+
+
+class InMemoryStorageTestCase(unittest.TestCase):
+    def test_in_memory(self):
+        """Tests that an in-memory database is migrated and queried, although not every pragma applies to it"""
+        store = Storage({"type": "sqlite", "connection_string": ":memory:"})
+        try:
+            with self.assertLogs("support_bot.storage") as logs:
+                store._log_sqlite_profile()
+            version = run(store.fetchone("SELECT MAX(version) FROM migration_version"))
+        finally:
+            store.close()
+
+        self.assertIn("mmap_size=n/a", logs.output[0])
+        self.assertEqual(version, (latest_migration_version,))
+
+
+class SQLiteProfileTestCase(unittest.TestCase):
+    def test_overrides(self):
+        """Tests that configured pragmas override the defaults"""
+        profile = sqlite_profile({"journal_mode": "DELETE", "cache_size": "-2000"})
+
+        self.assertEqual(profile["journal_mode"], "delete")
+        self.assertEqual(profile["cache_size"], -2000)
+        self.assertEqual(profile["synchronous"], "normal")
+
+    def test_invalid(self):
+        """Tests that unknown pragmas and values are rejected, as they are put into the SQL"""
+        with self.assertRaises(ValueError):
+            sqlite_profile({"journal_mode": "wal; DROP TABLE Tickets"})
+        with self.assertRaises(ValueError):
+            sqlite_profile({"foreign_keys": 1})
+
+
+class StatementTestCase(unittest.TestCase):
+    def test_postgres_translation(self):
+        """Tests that statements are translated to postgres placeholders and prepared form"""
+        statement = Statement("EventPairs.get_room_event", """
+            SELECT clone_event_id FROM EventPairs WHERE room_id = ? AND event_id = ?;
+        """, "postgres")
+
+        self.assertIn("room_id = %s AND event_id = %s", statement.text)
+        self.assertEqual(
+            statement.prepare_text,
+            "PREPARE stmt_eventpairs_get_room_event AS "
+            "SELECT clone_event_id FROM EventPairs WHERE room_id = $1 AND event_id = $2",
+        )
+        self.assertEqual(statement.execute_text, "EXECUTE stmt_eventpairs_get_room_event (%s, %s)")
+
+    def test_sqlite_untouched(self):
+        """Tests that SQLite statements keep their ? placeholders"""
+        statement = Statement("Staff.get_staff", "SELECT user_id FROM Staff WHERE user_id= ?;", "sqlite")
+
+        self.assertEqual(statement.text, "SELECT user_id FROM Staff WHERE user_id= ?;")
+        self.assertIsNone(statement.prepared_name)
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def test_reuses_connections(self):
+        """Tests that released connections are reused instead of opening new ones"""
+        opened = []
+
+        def connect():
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            opened.append(conn)
+            return conn
+
+        pool = ConnectionPool(connect, 2)
+        for _ in range(5):
+            with pool.connection():
+                pass
+
+        self.assertEqual(len(opened), 1)
+        pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,6 +11,19 @@ def run_coroutine(result: Awaitable[Any]) -> Any:
     return result
 
 
+def run(coroutine: Awaitable[Any]) -> Any:
+    """Run a coroutine on a loop of its own
+
+    asyncio.run would unset the current loop, which the tests using `make_awaitable` and
+    `run_coroutine` rely on.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
 def make_awaitable(result: Any) -> Awaitable[Any]:
     """
     Makes an awaitable, suitable for mocking an `async` function.